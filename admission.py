@@ -0,0 +1,211 @@
+"""
+Admission control: per-client rate limits and a global cap on LLM calls.
+
+- RateLimiter keeps a token bucket per client, keyed on the remote address.
+  Only a proxy listed in CAMPUS_TRUSTED_PROXIES may name the client, with
+  X-Client-Id or else the last X-Forwarded-For hop; a header from anyone else
+  is ignored, so clients can't get a fresh bucket by changing it.
+  install_rate_limiter() wraps the Flask app as WSGI middleware when
+  CAMPUS_RATE_LIMIT_RPS is set. Requests over the limit get 429 with
+  Retry-After before any work is done.
+- ConcurrencyLimiter caps LLM calls in flight across the process. Extra calls
+  wait in a bounded queue; when the queue is full, or the wait would outlast
+  the request's deadline, the call is shed. ResilientLLM then answers from its
+  local fallback, so the user gets a templated answer instead of a timeout.
+
+Configuration (environment):
+    CAMPUS_RATE_LIMIT_RPS        sustained requests/s per client   (default 0 = off)
+    CAMPUS_RATE_LIMIT_BURST      bucket size                       (default 2 x rps, min 1)
+    CAMPUS_TRUSTED_PROXIES       comma-separated proxy addresses   (default none)
+    CAMPUS_LLM_MAX_CONCURRENCY   LLM calls in flight               (default 16, 0 = unlimited)
+    CAMPUS_LLM_MAX_QUEUE         calls allowed to wait for a slot  (default 32)
+    CAMPUS_LLM_QUEUE_WAIT_S      longest wait for a slot           (default 5)
+
+Queue depth, in-flight calls, shed/limited counts and queue wait times are
+published through metrics.metrics.
+"""
+
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from metrics import metrics
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+class RateLimiter:
+    """Token bucket per client key, keeping at most `max_clients` buckets (LRU)."""
+
+    def __init__(self, rate: float, burst: float, max_clients: int = 100000):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.max_clients = max_clients
+        # client key -> (tokens, last refill time)
+        self._buckets: 'OrderedDict[str, Tuple[float, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def allow(self, key: str) -> Tuple[bool, float]:
+        """(allowed, seconds until the next token)."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            allowed = tokens >= 1.0
+            if allowed:
+                tokens -= 1.0
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1.0 - tokens) / self.rate
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class RateLimitMiddleware:
+    """WSGI middleware answering 429 for clients over their rate limit on /api paths."""
+
+    EXEMPT_PATHS = ('/api/health',)
+
+    def __init__(self, wsgi_app, limiter: RateLimiter, trusted_proxies: Iterable[str] = ()):
+        self.wsgi_app = wsgi_app
+        self.limiter = limiter
+        self.trusted_proxies = frozenset(trusted_proxies)
+
+    def client_key(self, environ) -> str:
+        remote = environ.get('REMOTE_ADDR') or 'unknown'
+        if remote not in self.trusted_proxies:
+            return remote
+        client = environ.get('HTTP_X_CLIENT_ID', '').strip()
+        if client:
+            return client
+        # The hop the proxy appended; earlier entries come from the client
+        forwarded = environ.get('HTTP_X_FORWARDED_FOR', '').split(',')[-1].strip()
+        return forwarded or remote
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if (not path.startswith('/api') or path in self.EXEMPT_PATHS
+                or environ.get('REQUEST_METHOD') == 'OPTIONS'):
+            return self.wsgi_app(environ, start_response)
+
+        allowed, retry_after = self.limiter.allow(self.client_key(environ))
+        if allowed:
+            return self.wsgi_app(environ, start_response)
+
+        metrics.incr('http.rate_limited')
+        body = json.dumps({'success': False, 'error': 'Rate limit exceeded'}).encode('utf-8')
+        start_response('429 Too Many Requests', [
+            ('Content-Type', 'application/json'),
+            ('Content-Length', str(len(body))),
+            ('Retry-After', str(max(1, int(retry_after + 0.999)))),
+        ])
+        return [body]
+
+
+def install_rate_limiter(app) -> Optional[RateLimiter]:
+    """Wrap `app.wsgi_app` with per-client rate limiting if CAMPUS_RATE_LIMIT_RPS is set.
+
+    Returns the limiter, or None when rate limiting is off (the app is left untouched).
+    """
+    rate = _env_float('CAMPUS_RATE_LIMIT_RPS', 0.0)
+    if rate <= 0:
+        return None
+    limiter = RateLimiter(rate, _env_float('CAMPUS_RATE_LIMIT_BURST', max(1.0, 2 * rate)))
+    proxies = [p.strip() for p in os.environ.get('CAMPUS_TRUSTED_PROXIES', '').split(',') if p.strip()]
+    app.wsgi_app = RateLimitMiddleware(app.wsgi_app, limiter, proxies)
+    return limiter
+
+
+class ConcurrencyLimiter:
+    """Caps concurrent LLM calls; extra callers wait in a bounded queue or are shed."""
+
+    def __init__(self, max_concurrent: int = 16, max_queue: int = 32, max_wait_s: float = 5.0):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait_s = max_wait_s
+        self.in_flight = 0
+        self.waiting = 0
+        self.shed = 0
+        self._cond = threading.Condition()
+        metrics.register_collector('llm_admission', self.snapshot)
+
+    @classmethod
+    def from_env(cls) -> 'ConcurrencyLimiter':
+        return cls(
+            max_concurrent=int(_env_float('CAMPUS_LLM_MAX_CONCURRENCY', 16)),
+            max_queue=int(_env_float('CAMPUS_LLM_MAX_QUEUE', 32)),
+            max_wait_s=_env_float('CAMPUS_LLM_QUEUE_WAIT_S', 5.0),
+        )
+
+    def acquire(self, deadline: Optional[float] = None) -> bool:
+        """Take a slot, waiting up to max_wait_s (and never past `deadline`); False if shed."""
+        if self.max_concurrent <= 0:
+            return True
+        started = time.monotonic()
+        wait_until = started + self.max_wait_s
+        if deadline is not None:
+            wait_until = min(wait_until, deadline)
+        with self._cond:
+            if self.in_flight >= self.max_concurrent:
+                if self.waiting >= self.max_queue:
+                    return self._shed()
+                self.waiting += 1
+                metrics.gauge('llm.queue.depth', self.waiting)
+                try:
+                    while self.in_flight >= self.max_concurrent:
+                        remaining = wait_until - time.monotonic()
+                        if remaining <= 0:
+                            return self._shed()
+                        self._cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+                    metrics.gauge('llm.queue.depth', self.waiting)
+            self.in_flight += 1
+            metrics.gauge('llm.inflight', self.in_flight)
+        metrics.observe('llm.queue.wait_ms', (time.monotonic() - started) * 1000)
+        return True
+
+    def try_acquire(self) -> bool:
+        """Take a slot only if one is free right now (no queueing, not counted as shed)."""
+        if self.max_concurrent <= 0:
+            return True
+        with self._cond:
+            if self.in_flight >= self.max_concurrent:
+                return False
+            self.in_flight += 1
+            metrics.gauge('llm.inflight', self.in_flight)
+        return True
+
+    def _shed(self) -> bool:
+        # Called with the condition held
+        self.shed += 1
+        metrics.incr('llm.shed')
+        return False
+
+    def release(self):
+        if self.max_concurrent <= 0:
+            return
+        with self._cond:
+            self.in_flight -= 1
+            metrics.gauge('llm.inflight', self.in_flight)
+            self._cond.notify()
+
+    def snapshot(self) -> Dict:
+        with self._cond:
+            return {
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'in_flight': self.in_flight,
+                'queue_depth': self.waiting,
+                'shed': self.shed,
+            }
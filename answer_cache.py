@@ -0,0 +1,253 @@
+"""
+Precomputed answers for canonical (building x intent) questions.
+
+Most questions are "where is X", "when is X open", "tell me about X" or "how
+do I get from A to B" for a place in the catalog. The batch job generates
+those answers ahead of time through the configured LLM and stores them in an
+`answer_cache` table:
+
+    python answer_cache.py --workers 4            # build / refresh
+    python answer_cache.py --intents hours info   # only some intents
+
+Each row is keyed by (building_id, from_building_id, intent) and carries a
+fingerprint of the answer prompt, i.e. of the facts the answer was written
+from. The job is incremental: rows whose fingerprint still matches are
+skipped, so only buildings and routes whose data changed are regenerated, and
+rows for buildings or routes that no longer exist are deleted.
+
+At request time AnswerCache.lookup() recomputes the fingerprint from the
+current catalog rows, so an answer is never served after its facts change.
+
+The table lives in its own SQLite file (CAMPUS_ANSWER_CACHE_DB, default
+answer_cache.db next to the campus database). Writing it therefore doesn't
+change the campus database's version and reload the catalog.
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from metrics import metrics
+from prompts import build_answer_prompt
+
+INTENTS = ('location', 'hours', 'info', 'directions')
+
+# The question each cached answer is written for
+CANONICAL_QUESTIONS = {
+    'location': "Where is {name}?",
+    'hours': "When is {name} open?",
+    'info': "Tell me about {name}.",
+    'directions': "How do I get from {start} to {name}?",
+}
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS answer_cache (
+    building_id INTEGER NOT NULL,
+    from_building_id INTEGER NOT NULL DEFAULT 0,
+    intent TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    catalog_version TEXT,
+    model TEXT,
+    created_at TEXT,
+    PRIMARY KEY (building_id, from_building_id, intent)
+)
+'''
+
+Key = Tuple[int, int, str]
+
+
+def default_cache_path(db_path: str) -> str:
+    return os.environ.get('CAMPUS_ANSWER_CACHE_DB') or os.path.join(
+        os.path.dirname(os.path.abspath(db_path)), 'answer_cache.db')
+
+
+def canonical_prompt(intent: str, building: Dict, route: Optional[Dict] = None,
+                     from_building: Optional[Dict] = None) -> Tuple[str, str]:
+    """(system, user) answer prompt for the canonical question of an intent."""
+    question = CANONICAL_QUESTIONS[intent].format(name=building.get('name'),
+                                                  start=(from_building or {}).get('name'))
+    query_data = {'query_type': intent, 'original_query': question}
+    system, user, _ = build_answer_prompt(query_data, building, route, from_building)
+    return system, user
+
+
+def fingerprint(intent: str, building: Dict, route: Optional[Dict] = None,
+                from_building: Optional[Dict] = None) -> str:
+    system, user = canonical_prompt(intent, building, route, from_building)
+    return hashlib.sha1(f"{system}\n{user}".encode('utf-8')).hexdigest()
+
+
+def cache_key(query_data: Dict, building: Dict, route: Optional[Dict] = None,
+              from_building: Optional[Dict] = None) -> Optional[Key]:
+    intent = query_data.get('query_type', 'info')
+    if intent == 'directions' and not route:
+        intent = 'location'
+    if intent not in INTENTS:
+        return None
+    from_id = from_building['id'] if intent == 'directions' and from_building else 0
+    return building['id'], from_id, intent
+
+
+class AnswerCache:
+    """Read side of the answer_cache table, loaded into memory and reloaded when the file changes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._rows: Dict[Key, Tuple[str, str]] = {}
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _file_version(self) -> Optional[str]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+    def _current(self) -> Dict[Key, Tuple[str, str]]:
+        version = self._file_version()
+        if version == self._version:
+            return self._rows
+        with self._lock:
+            if version != self._version:
+                rows: Dict[Key, Tuple[str, str]] = {}
+                if version is not None:
+                    conn = sqlite3.connect(self.path)
+                    try:
+                        for b, f, intent, answer, fp in conn.execute(
+                                'SELECT building_id, from_building_id, intent, answer, fingerprint FROM answer_cache'):
+                            rows[(b, f, intent)] = (fp, answer)
+                    except sqlite3.DatabaseError as e:
+                        print(f"Answer cache {self.path} unreadable: {e}", file=sys.stderr)
+                    finally:
+                        conn.close()
+                self._rows = rows
+                self._version = version
+        return self._rows
+
+    def __len__(self) -> int:
+        return len(self._current())
+
+    def __contains__(self, key: Key) -> bool:
+        return key in self._current()
+
+    def lookup(self, query_data: Dict, building: Optional[Dict], route: Optional[Dict] = None,
+               from_building: Optional[Dict] = None) -> Optional[str]:
+        """The stored answer for this building/intent if its facts haven't changed, else None."""
+        if not building:
+            return None
+        rows = self._current()
+        if not rows:
+            return None
+        key = cache_key(query_data, building, route, from_building)
+        entry = rows.get(key) if key else None
+        if entry is None:
+            metrics.incr('answer_cache.misses')
+            return None
+        if entry[0] != fingerprint(key[2], building, route, from_building):
+            metrics.incr('answer_cache.stale')
+            return None
+        metrics.incr('answer_cache.hits')
+        return entry[1]
+
+
+def plan_jobs(catalog, intents=INTENTS) -> List[Tuple[Key, str, Dict, Optional[Dict], Optional[Dict]]]:
+    """(key, intent, building, route, from_building) for every canonical question in the catalog."""
+    jobs = []
+    for building in catalog.buildings.values():
+        for intent in ('location', 'hours', 'info'):
+            if intent not in intents:
+                continue
+            if intent == 'hours' and not building.get('building_hours'):
+                continue
+            jobs.append(((building['id'], 0, intent), intent, building, None, None))
+    if 'directions' in intents:
+        for route in catalog.routes:
+            to_building = catalog.building(route.get('to_building_id'))
+            from_building = catalog.building(route.get('from_building_id'))
+            if to_building and from_building and route.get('route_description'):
+                jobs.append(((to_building['id'], from_building['id'], 'directions'), 'directions',
+                             to_building, route, from_building))
+    return jobs
+
+
+def build_cache(navigator, cache_path: str, intents=INTENTS, workers: int = 4, force: bool = False) -> Dict:
+    """Generate missing or outdated answers with bounded parallelism; returns counts."""
+    catalog = navigator.catalog()
+    conn = sqlite3.connect(cache_path)
+    conn.execute(SCHEMA)
+    existing = {(b, f, i): fp for b, f, i, fp in conn.execute(
+        'SELECT building_id, from_building_id, intent, fingerprint FROM answer_cache')}
+
+    jobs = plan_jobs(catalog, intents)
+    wanted = {job[0] for job in jobs}
+    todo = []
+    for key, intent, building, route, from_building in jobs:
+        fp = fingerprint(intent, building, route, from_building)
+        if force or existing.get(key) != fp:
+            todo.append((key, intent, building, route, from_building, fp))
+
+    removed = [key for key in existing if key not in wanted and key[2] in intents]
+    conn.executemany('DELETE FROM answer_cache WHERE building_id = ? AND from_building_id = ? AND intent = ?', removed)
+    conn.commit()
+
+    def generate(job):
+        key, intent, building, route, from_building, fp = job
+        system, user = canonical_prompt(intent, building, route, from_building)
+        return job, navigator.query_llm(user, system, task='answer')
+
+    stats = {'planned': len(jobs), 'generated': 0, 'unchanged': len(jobs) - len(todo),
+             'failed': 0, 'removed': len(removed)}
+    started = time.perf_counter()
+    # The router and model name are only set once the LLM client exists
+    navigator._ensure_llm()
+    model = navigator.router.model_for('answer') if navigator.router else navigator.model_name
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [pool.submit(generate, job) for job in todo]
+        for future in as_completed(futures):
+            job, resp = future.result()
+            key, intent, building, route, from_building, fp = job
+            if not resp.get('ok') or not resp.get('text'):
+                # Leave the old row (if any) in place; it stays unused until regenerated
+                stats['failed'] += 1
+                continue
+            conn.execute('INSERT OR REPLACE INTO answer_cache (building_id, from_building_id, intent, answer, '
+                         'fingerprint, catalog_version, model, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                         (key[0], key[1], key[2], resp['text'].strip(), fp, catalog.version, model,
+                          datetime.utcnow().isoformat() + 'Z'))
+            stats['generated'] += 1
+            if stats['generated'] % 50 == 0:
+                conn.commit()
+                print(f"  {stats['generated']}/{len(todo)} answers", file=sys.stderr)
+    conn.commit()
+    conn.close()
+    stats['seconds'] = round(time.perf_counter() - started, 2)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or refresh the precomputed answer cache")
+    parser.add_argument('--db', default=os.environ.get('CAMPUS_DB_PATH', 'campus_navigator.db'))
+    parser.add_argument('--cache-db', default=None, help="default: CAMPUS_ANSWER_CACHE_DB or answer_cache.db")
+    parser.add_argument('--intents', nargs='+', choices=INTENTS, default=list(INTENTS))
+    parser.add_argument('--workers', type=int, default=4, help="LLM calls in parallel")
+    parser.add_argument('--force', action='store_true', help="regenerate every answer")
+    args = parser.parse_args()
+
+    from campus_navigator_groq import CampusNavigator
+    navigator = CampusNavigator(args.db)
+    cache_path = args.cache_db or default_cache_path(args.db)
+    stats = build_cache(navigator, cache_path, tuple(args.intents), args.workers, args.force)
+    print(f"Answer cache {cache_path}: {stats}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
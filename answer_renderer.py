@@ -0,0 +1,199 @@
+"""
+Local natural-language answers for hours, location and simple directions.
+
+The navigator already has every fact these answers need in `buildings`,
+`poi` and `routes`, so AnswerRenderer phrases them with a few varied templates
+instead of spending an LLM call. The variant is chosen from a hash of the query
+and building, so the same question always gets the same wording.
+
+How it is used is set by CAMPUS_ANSWER_MODE:
+    llm       always ask the LLM for the answer
+    fallback  ask the LLM; answer locally when the LLM call fails (default)
+    local     answer locally whenever possible; the LLM is only used for other intents
+    polish    draft locally, then have the LLM rephrase the draft
+"""
+
+import os
+import zlib
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from hours import DAY_LABELS, describe_status, hours_by_weekday, is_closed_text
+
+ANSWER_MODES = ('llm', 'fallback', 'local', 'polish')
+LOCAL_INTENTS = ('hours', 'location', 'directions', 'info')
+
+LOCATION_TEMPLATES = (
+    "{name} is at {address}.",
+    "You'll find {name} at {address}.",
+    "{name} is located at {address}.",
+)
+HOURS_TODAY_TEMPLATES = (
+    "{name} is open {span} today ({day}).",
+    "Today ({day}) {name} is open {span}.",
+    "{name}'s hours today ({day}) are {span}.",
+)
+CLOSED_TODAY_TEMPLATES = (
+    "{name} is closed today ({day}).",
+    "Sorry, {name} is closed today ({day}).",
+)
+DIRECTIONS_TEMPLATES = (
+    "From {start}: {steps}. It's about a {minutes}-minute walk ({meters} m) to {name}.",
+    "To get from {start} to {name}, {steps_lc}. Expect roughly {minutes} minutes on foot ({meters} m).",
+    "{steps} and you'll reach {name} - about {minutes} minutes ({meters} m) from {start}.",
+)
+CATEGORY_TEMPLATES = (
+    "Here's where you can find {label}: {places}.",
+    "For {label}, try {places}.",
+)
+NOT_FOUND_TEMPLATES = (
+    "Sorry, I couldn't find \"{query}\" on campus. Did you mean another building? I can also list all the locations I know.",
+    "I don't know a place called \"{query}\" on campus. Could you try another name, or ask me for the list of buildings?",
+)
+
+
+def answer_mode() -> str:
+    mode = os.environ.get('CAMPUS_ANSWER_MODE', 'fallback').strip().lower()
+    return mode if mode in ANSWER_MODES else 'fallback'
+
+
+def _pick(templates, *keys) -> str:
+    key = "|".join(str(k) for k in keys).encode('utf-8')
+    return templates[zlib.crc32(key) % len(templates)]
+
+
+def _sentence(text: str) -> str:
+    text = text.strip()
+    return text if text.endswith(('.', '!', '?')) else text + "."
+
+
+def _week_summary(by_day: Dict[int, str]) -> str:
+    """Collapse per-day hours into runs: "Mon-Fri 7:00 AM - 11:00 PM; Sat-Sun 9:00 AM - 9:00 PM"."""
+    runs: List[str] = []
+    day = 0
+    while day < 7:
+        span = by_day.get(day)
+        end = day
+        while end + 1 < 7 and by_day.get(end + 1) == span:
+            end += 1
+        if span is not None:
+            label = DAY_LABELS[day][:3] if end == day else f"{DAY_LABELS[day][:3]}-{DAY_LABELS[end][:3]}"
+            runs.append(f"{label} {span}")
+        day = end + 1
+    return "; ".join(runs)
+
+
+class AnswerRenderer:
+    """Formats answers from building, POI and route rows without an LLM."""
+
+    def __init__(self, clock: Callable[[], datetime] = datetime.now):
+        self.clock = clock
+
+    def can_render(self, query_type: str, building: Optional[Dict], route: Optional[Dict] = None) -> bool:
+        if not building or query_type not in LOCAL_INTENTS:
+            return False
+        if query_type == 'directions':
+            return bool(route and route.get('route_description'))
+        if query_type == 'hours':
+            return bool(building.get('building_hours'))
+        return bool(building.get('address') or building.get('description'))
+
+    def render(self, query_data: Dict, building: Optional[Dict], route: Optional[Dict] = None,
+               from_building: Optional[Dict] = None, pois: Optional[List[Dict]] = None,
+               now: Optional[datetime] = None) -> Optional[str]:
+        """Answer text, or None when this intent/data can't be answered locally."""
+        query_type = query_data.get('query_type', 'info')
+        query = query_data.get('original_query', '')
+        if not building:
+            return self.render_not_found(query_data.get('location') or query)
+        if query_type == 'directions' and not route:
+            query_type = 'location'
+        if not self.can_render(query_type, building, route):
+            return None
+
+        if query_type == 'hours':
+            return self.render_hours(building, query, now, query_data.get('open_now'))
+        if query_type == 'directions':
+            return self.render_directions(building, route, from_building, query)
+        return self.render_location(building, query, pois, now)
+
+    def render_location(self, building: Dict, query: str = '', pois: Optional[List[Dict]] = None,
+                        now: Optional[datetime] = None) -> str:
+        name = building.get('name')
+        parts = []
+        if building.get('address'):
+            parts.append(_pick(LOCATION_TEMPLATES, query, name).format(name=name, address=building['address']))
+        else:
+            parts.append(f"Here's what I know about {name}.")
+        if building.get('description'):
+            parts.append(_sentence(building['description']))
+        if pois:
+            names = list(dict.fromkeys(p.get('name') for p in pois if p.get('name')))[:4]
+            if names:
+                parts.append(f"Inside you'll find {', '.join(names[:-1]) + ' and ' + names[-1] if len(names) > 1 else names[0]}.")
+        today = self.today_hours(building, now)
+        if today:
+            parts.append(today)
+        return " ".join(parts)
+
+    def today_hours(self, building: Dict, now: Optional[datetime] = None) -> Optional[str]:
+        by_day = hours_by_weekday(building.get('building_hours'))
+        if not by_day:
+            return None
+        now = now or self.clock()
+        span = by_day.get(now.weekday())
+        if span is None:
+            return None
+        return "It's closed today." if is_closed_text(span) else f"Today it's open {span}."
+
+    def render_hours(self, building: Dict, query: str = '', now: Optional[datetime] = None,
+                     status: Optional[Dict] = None) -> str:
+        name = building.get('name')
+        by_day = hours_by_weekday(building.get('building_hours'))
+        if not by_day:
+            return f"I don't have opening hours for {name}."
+        now = now or self.clock()
+        day = DAY_LABELS[now.weekday()]
+        span = by_day.get(now.weekday())
+        if span is None:
+            first = f"I don't have {name}'s hours for {day}."
+        elif is_closed_text(span):
+            first = _pick(CLOSED_TODAY_TEMPLATES, query, name).format(name=name, day=day)
+        else:
+            first = _pick(HOURS_TODAY_TEMPLATES, query, name).format(name=name, day=day, span=span)
+        if status:
+            first = f"{first} It's {describe_status(status)}."
+        return f"{first} Full hours: {_week_summary(by_day)}."
+
+    def render_directions(self, building: Dict, route: Dict, from_building: Optional[Dict], query: str = '') -> str:
+        steps = route.get('route_description', '').strip().rstrip('.')
+        start = (from_building or {}).get('name', 'your starting point')
+        return _pick(DIRECTIONS_TEMPLATES, query, building.get('name'), start).format(
+            name=building.get('name'),
+            start=start,
+            steps=steps,
+            steps_lc=steps[:1].lower() + steps[1:],
+            minutes=route.get('walk_time_minutes', '?'),
+            meters=route.get('distance_meters', '?'),
+        )
+
+    def render_category(self, poi_type: str, pois: List[Dict], query: str = '') -> str:
+        """List the places of one POI type, e.g. "For dining, try Food Court (Student Center, floor 1)."."""
+        label = poi_type.replace('_', ' ')
+        if not pois:
+            return f"Sorry, I don't know of any {label} places on campus."
+        places = []
+        for poi in pois[:4]:
+            where = [poi['building_name']] if poi.get('building_name') else []
+            if poi.get('floor'):
+                where.append(f"floor {poi['floor']}")
+            if poi.get('room_number'):
+                where.append(f"room {poi['room_number']}")
+            if poi.get('distance_meters') is not None:
+                where.append(f"{poi['distance_meters']} m away")
+            places.append(f"{poi.get('name')} ({', '.join(where)})" if where else poi.get('name'))
+        joined = ', '.join(places[:-1]) + ' and ' + places[-1] if len(places) > 1 else places[0]
+        return _pick(CATEGORY_TEMPLATES, query, poi_type).format(label=label, places=joined)
+
+    def render_not_found(self, query: str) -> str:
+        return _pick(NOT_FOUND_TEMPLATES, query).format(query=query.strip().rstrip('?.!') or "that place")
@@ -0,0 +1,138 @@
+"""
+Generate a large synthetic campus database for benchmarking.
+
+Uses the same schema as campus_db_setup.py. Buildings are laid out on a grid
+around the UWI Mona coordinates, every building gets a handful of POIs, and
+routes connect each building to its grid neighbours so the route graph is
+connected.
+
+Usage:
+    python benchmarks/generate_campus_db.py --buildings 5000 --out bench_campus.db
+"""
+
+import os
+import sys
+import json
+import math
+import random
+import sqlite3
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from campus_db_setup import create_schema
+
+BASE_LAT = 18.0179
+BASE_LNG = -76.7495
+GRID_STEP = 0.0004  # roughly 45m between neighbouring buildings
+
+KINDS = ['Hall', 'Library', 'Science Building', 'Engineering Hall', 'Student Center',
+         'Athletics Center', 'Administration Building', 'Lecture Theatre', 'Medical Centre', 'Residence']
+POI_TYPES = ['service', 'study_space', 'dining', 'lab', 'computer_lab', 'facility', 'office', 'printer']
+HOURS = [
+    {"mon-fri": "7:00 AM - 11:00 PM", "sat-sun": "9:00 AM - 9:00 PM"},
+    {"mon-sun": "6:00 AM - 12:00 AM"},
+    {"mon-fri": "8:00 AM - 10:00 PM", "sat": "9:00 AM - 5:00 PM", "sun": "Closed"},
+    {"mon-fri": "8:00 AM - 5:00 PM", "sat-sun": "Closed"},
+]
+
+
+def building_name(i: int) -> str:
+    return f"{KINDS[i % len(KINDS)]} {i:05d}"
+
+
+def generate(db_path: str, n_buildings: int = 5000, pois_per_building: int = 4, seed: int = 42) -> dict:
+    """Create `db_path` populated with `n_buildings` buildings. Returns summary counts."""
+    rng = random.Random(seed)
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    create_schema(cursor)
+
+    side = max(1, int(math.ceil(math.sqrt(n_buildings))))
+    buildings = []
+    for i in range(n_buildings):
+        row, col = divmod(i, side)
+        kind = KINDS[i % len(KINDS)]
+        code = f"B{i:05d}"
+        buildings.append((
+            building_name(i),
+            f"{kind.lower()} {i}, {code.lower()}",
+            BASE_LAT + row * GRID_STEP,
+            BASE_LNG + col * GRID_STEP,
+            f"{100 + i} Campus Drive",
+            f"Synthetic {kind.lower()} number {i} with classrooms, offices and study areas",
+            json.dumps(HOURS[i % len(HOURS)]),
+            f"/images/{code.lower()}.jpg",
+            code,
+        ))
+    cursor.executemany('''
+    INSERT INTO buildings (name, aliases, latitude, longitude, address, description, building_hours, image_url, building_code)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', buildings)
+
+    pois = []
+    for i in range(n_buildings):
+        for j in range(pois_per_building):
+            poi_type = POI_TYPES[(i + j) % len(POI_TYPES)]
+            pois.append((
+                f"{poi_type.replace('_', ' ').title()} {i}-{j}",
+                i + 1,
+                str(1 + j % 3),
+                f"{1 + j % 3}{j:02d}",
+                poi_type,
+                f"Synthetic {poi_type} in {building_name(i)}",
+                json.dumps(HOURS[(i + j) % len(HOURS)]) if j % 2 == 0 else None,
+            ))
+    cursor.executemany('''
+    INSERT INTO poi (name, building_id, floor, room_number, poi_type, description, hours)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', pois)
+
+    routes = []
+    for i in range(n_buildings):
+        row, col = divmod(i, side)
+        neighbours = []
+        if col + 1 < side and i + 1 < n_buildings:
+            neighbours.append(i + 1)
+        if i + side < n_buildings:
+            neighbours.append(i + side)
+        for j in neighbours:
+            a, b = buildings[i], buildings[j]
+            distance = int(rng.uniform(40, 120))
+            routes.append((
+                i + 1,
+                j + 1,
+                distance,
+                max(1, round(distance / 80)),
+                f"Exit {a[0]}, walk {distance}m to {b[0]}",
+                json.dumps([[a[2], a[3]], [(a[2] + b[2]) / 2, (a[3] + b[3]) / 2], [b[2], b[3]]]),
+            ))
+    cursor.executemany('''
+    INSERT INTO routes (from_building_id, to_building_id, distance_meters, walk_time_minutes, route_description, waypoints)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ''', routes)
+
+    conn.commit()
+    conn.close()
+    return {'buildings': len(buildings), 'pois': len(pois), 'routes': len(routes)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic campus database")
+    parser.add_argument('--buildings', type=int, default=5000)
+    parser.add_argument('--pois-per-building', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', default='bench_campus.db')
+    args = parser.parse_args()
+
+    counts = generate(args.out, args.buildings, args.pois_per_building, args.seed)
+    print(f"Created {args.out}: {counts['buildings']} buildings, {counts['pois']} POIs, {counts['routes']} routes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Startup-time budget check.
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter for each
+module, reads the cumulative import time of the module itself and exits non-zero
+when any module is over its budget. Use it in CI to catch cold-start regressions:
+
+    python benchmarks/import_budget.py
+    python benchmarks/import_budget.py --budget campus_navigator_groq=30 --repeat 5
+
+A module that fails to import fails the check; pass --allow-missing to skip it
+instead (e.g. flask_api where Flask isn't installed).
+"""
+
+import os
+import sys
+import argparse
+import subprocess
+from typing import Dict, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cumulative import time budgets in milliseconds. These leave headroom over the
+# stdlib modules each one needs (re, json, sqlite3, typing) but fail as soon as
+# an SDK such as groq or requests lands on the import path again.
+DEFAULT_BUDGETS_MS = {
+    'llm_backends': 60,
+    'campus_navigator_groq': 100,
+    'flask_api': 500,
+}
+
+
+def import_time_ms(module: str) -> Optional[float]:
+    """Cumulative import time of `module` in a fresh interpreter, in milliseconds."""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                          cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        print(f"  could not import {module}:\n{proc.stderr.strip().splitlines()[-1] if proc.stderr else ''}", file=sys.stderr)
+        return None
+    for line in proc.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:'):
+            continue
+        parts = [p.strip() for p in line[len('import time:'):].split('|')]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1]) / 1000.0
+    return None
+
+
+def check(budgets: Dict[str, float], repeat: int = 3, allow_missing: bool = False) -> bool:
+    ok = True
+    for module, budget in budgets.items():
+        samples = [t for t in (import_time_ms(module) for _ in range(repeat)) if t is not None]
+        if not samples:
+            # An unimportable module hasn't been measured, so it can't pass
+            print(f"{'SKIP' if allow_missing else 'FAIL'} {module:<24} (import failed)")
+            ok = ok and allow_missing
+            continue
+        best = min(samples)  # least noisy estimate of the real cost
+        status = "OK  " if best <= budget else "FAIL"
+        ok = ok and best <= budget
+        print(f"{status} {module:<24} {best:8.1f} ms  (budget {budget:.0f} ms)")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail if module import time exceeds its budget")
+    parser.add_argument('--budget', action='append', default=[], metavar='MODULE=MS',
+                        help="override or add a budget, e.g. flask_api=300")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--allow-missing', action='store_true',
+                        help="skip modules that fail to import instead of failing")
+    args = parser.parse_args()
+
+    budgets = dict(DEFAULT_BUDGETS_MS)
+    for item in args.budget:
+        module, _, ms = item.partition('=')
+        budgets[module.strip()] = float(ms)
+
+    sys.exit(0 if check(budgets, args.repeat, args.allow_missing) else 1)
+
+
+if __name__ == "__main__":
+    main()
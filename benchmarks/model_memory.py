@@ -0,0 +1,98 @@
+"""
+Memory footprint of catalog rows: dict(sqlite3.Row) copies vs the slotted models.
+
+Generates a synthetic campus (generate_campus_db.py), loads the buildings, POIs
+and routes both ways under tracemalloc and prints bytes per row and the total
+for each table:
+
+    python benchmarks/model_memory.py --buildings 100000 --pois-per-building 1
+"""
+
+import os
+import sys
+import gc
+import json
+import sqlite3
+import argparse
+import tempfile
+import tracemalloc
+from typing import Callable, Dict
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+for path in (HERE, ROOT):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from generate_campus_db import generate
+from models import POI, Building, Route
+
+TABLES = (('buildings', Building), ('poi', POI), ('routes', Route))
+
+
+def measure(load: Callable[[], object]) -> int:
+    """Bytes still allocated by what `load` returns."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        rows = load()
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del rows
+    return after - before
+
+
+def run(db_path: str) -> Dict[str, Dict]:
+    conn = sqlite3.connect(db_path)
+    try:
+        results = {}
+        for table, model in TABLES:
+            count = conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+            def load_dicts():
+                conn.row_factory = sqlite3.Row
+                try:
+                    return [dict(row) for row in conn.execute(f'SELECT * FROM {table}')]
+                finally:
+                    conn.row_factory = None
+
+            def load_models():
+                return [model(*row) for row in conn.execute(model.select_sql())]
+
+            dict_bytes = measure(load_dicts)
+            model_bytes = measure(load_models)
+            results[table] = {
+                'rows': count,
+                'dict_bytes_per_row': round(dict_bytes / max(1, count), 1),
+                'model_bytes_per_row': round(model_bytes / max(1, count), 1),
+                'dict_mb': round(dict_bytes / 1e6, 2),
+                'model_mb': round(model_bytes / 1e6, 2),
+                'saved_pct': round(100.0 * (1 - model_bytes / dict_bytes), 1) if dict_bytes else None,
+            }
+        return results
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare row memory: dicts vs slotted models")
+    parser.add_argument('--buildings', type=int, default=100000)
+    parser.add_argument('--pois-per-building', type=int, default=1)
+    parser.add_argument('--db', default=None, help="existing database to measure instead of generating one")
+    args = parser.parse_args()
+
+    if args.db:
+        print(json.dumps(run(args.db), indent=2))
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'model_memory.db')
+        counts = generate(db_path, args.buildings, args.pois_per_building)
+        print(f"Generated {counts}", file=sys.stderr)
+        print(json.dumps(run(db_path), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Replay captured traffic from the query log against a running API server.
+
+Reads the entries written by query_log.py (CAMPUS_QUERY_LOG) and re-issues
+each query to POST /api, keeping the original gaps between requests divided
+by --speedup (0 sends them back to back). Reports throughput, latency
+percentiles, status counts and how far the dispatcher fell behind schedule:
+
+    python benchmarks/replay_queries.py --log logs/queries.jsonl --url http://127.0.0.1:5000 --speedup 10
+    python benchmarks/replay_queries.py --log logs/queries.jsonl --speedup 0 --limit 5000 --out replay.json
+
+Session ids are kept, so follow-up questions replay with their context, and
+queries logged for a campus go to /api/<campus>.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+for path in (HERE, ROOT):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from run_benchmarks import _http, _percentile
+from query_log import read_entries
+
+
+def load_requests(log_path: str, limit: Optional[int] = None) -> List[Dict]:
+    """(offset_s, body) for each logged query, offsets relative to the first one."""
+    entries = [e for e in read_entries(log_path) if e.get('query') and e.get('ts') is not None]
+    entries.sort(key=lambda e: e['ts'])
+    if limit:
+        entries = entries[:limit]
+    if not entries:
+        return []
+    first = entries[0]['ts']
+    requests = []
+    for entry in entries:
+        body = {'query': entry['query']}
+        if entry.get('near'):
+            body['near'] = {'lat': entry['near'][0], 'lng': entry['near'][1]}
+        if entry.get('session_id'):
+            body['session_id'] = entry['session_id']
+        requests.append({'offset_s': entry['ts'] - first, 'campus': entry.get('campus'), 'body': body})
+    return requests
+
+
+def replay(base_url: str, requests: List[Dict], speedup: float, concurrency: int, timeout: float) -> Dict:
+    latencies: List[float] = []
+    lags: List[float] = []
+    statuses: Dict[int, int] = {}
+    errors = [0]
+    lock = threading.Lock()
+    api_url = f"{base_url.rstrip('/')}/api"
+
+    def issue(campus, body):
+        started = time.perf_counter()
+        try:
+            status, _ = _http('POST', f"{api_url}/{campus}" if campus else api_url, body, timeout=timeout)
+        except Exception:
+            status = 0
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == 0 or status >= 500:
+                errors[0] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        for req in requests:
+            if speedup > 0:
+                due = started + req['offset_s'] / speedup
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                lags.append(max(0.0, time.perf_counter() - due))
+            pool.submit(issue, req['campus'], req['body'])
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    lags.sort()
+    count = len(latencies)
+    span = requests[-1]['offset_s'] if requests else 0.0
+    return {
+        'requests': count,
+        'errors': errors[0],
+        'status_counts': {str(k): v for k, v in sorted(statuses.items())},
+        'speedup': speedup,
+        'captured_span_s': round(span, 3),
+        'elapsed_s': round(elapsed, 3),
+        'rps': round(count / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(_percentile(latencies, 50) * 1000, 2) if count else None,
+        'p90_ms': round(_percentile(latencies, 90) * 1000, 2) if count else None,
+        'p99_ms': round(_percentile(latencies, 99) * 1000, 2) if count else None,
+        'max_ms': round(latencies[-1] * 1000, 2) if count else None,
+        'mean_ms': round(sum(latencies) / count * 1000, 2) if count else None,
+        # How late requests were sent; large values mean the replay couldn't keep the schedule
+        'dispatch_lag_p99_ms': round(_percentile(lags, 99) * 1000, 2) if lags else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay logged queries against a running server")
+    parser.add_argument('--log', default=os.environ.get('CAMPUS_QUERY_LOG'),
+                        help="query log path (default CAMPUS_QUERY_LOG); {pid} matches every process's file")
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--speedup', type=float, default=1.0, help="divide captured gaps by this; 0 = no gaps")
+    parser.add_argument('--concurrency', type=int, default=64, help="most requests in flight")
+    parser.add_argument('--limit', type=int, default=None, help="replay only the first N queries")
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--out', default=None, help="also write the report JSON here")
+    args = parser.parse_args()
+    if not args.log:
+        parser.error("no log path: pass --log or set CAMPUS_QUERY_LOG")
+
+    requests = load_requests(args.log, args.limit)
+    if not requests:
+        parser.error(f"no queries in {args.log}")
+    print(f"Replaying {len(requests)} queries against {args.url} at {args.speedup}x...", file=sys.stderr)
+    report = replay(args.url, requests, args.speedup, args.concurrency, args.timeout)
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""
+End-to-end throughput benchmark for the Campus Navigator API.
+
+Starts, in order:
+1. a generated synthetic campus database (benchmarks/generate_campus_db.py)
+2. the stub Groq-compatible LLM server (benchmarks/stub_llm_server.py)
+3. the Flask app in a subprocess pointed at both
+
+then drives each endpoint at a fixed concurrency and reports req/s, p50/p99
+latency and server memory. Results are written as JSON so runs can be compared
+between commits:
+
+    python benchmarks/run_benchmarks.py --buildings 5000 --concurrency 16 --duration 10
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/<older>.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+if HERE not in sys.path:
+    sys.path.insert(0, HERE)
+
+from generate_campus_db import generate, building_name
+from stub_llm_server import start_server
+
+DEFAULT_SCENARIOS = ['chat', 'search', 'route', 'buildings', 'directions']
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _http(method: str, url: str, body: Optional[dict] = None, timeout: float = 60.0) -> Tuple[int, int]:
+    """Issue one request and return (status, response bytes)."""
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    req = urllib.request.Request(url, data=data, method=method)
+    if data is not None:
+        req.add_header('Content-Type', 'application/json')
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status, len(resp.read())
+    except urllib.error.HTTPError as e:
+        return e.code, len(e.read() or b'')
+
+
+def _rss_kb(pid: int) -> Dict[str, Optional[int]]:
+    """Current and peak resident set size of a process, in KiB."""
+    result = {'rss_kb': None, 'peak_kb': None}
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    result['rss_kb'] = int(line.split()[1])
+                elif line.startswith('VmHWM:'):
+                    result['peak_kb'] = int(line.split()[1])
+        return result
+    except OSError:
+        pass
+    try:
+        import psutil
+        result['rss_kb'] = psutil.Process(pid).memory_info().rss // 1024
+    except Exception:
+        pass
+    return result
+
+
+def _percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    k = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * (len(sorted_values) - 1)))))
+    return sorted_values[k]
+
+
+def build_scenarios(base_url: str, n_buildings: int, seed: int) -> Dict[str, Callable[[random.Random], Tuple[int, int]]]:
+    """Request factories per scenario; each call issues one request."""
+    def pick(rng: random.Random) -> int:
+        return rng.randint(0, n_buildings - 1)
+
+    def chat(rng):
+        i = pick(rng)
+        roll = rng.random()
+        if roll < 0.5:
+            query = f"Where is the {building_name(i)}?"
+        elif roll < 0.75:
+            query = f"What time does {building_name(i)} close?"
+        else:
+            query = f"How do I get from {building_name(i)} to {building_name(min(i + 1, n_buildings - 1))}?"
+        return _http('POST', f"{base_url}/api", {'query': query})
+
+    def search(rng):
+        return _http('GET', f"{base_url}/api/search?q={urllib.request.quote(building_name(pick(rng)).split()[-1])}")
+
+    def route(rng):
+        i = pick(rng)
+        return _http('POST', f"{base_url}/api/route", {'from_id': i + 1, 'to_id': min(i + 2, n_buildings)})
+
+    def buildings(rng):
+        return _http('GET', f"{base_url}/api/buildings")
+
+    def directions(rng):
+        return _http('POST', f"{base_url}/api/directions", {
+            'origin': {'lat': 18.0179, 'lng': -76.7495},
+            'destination': {'lat': 18.0185 + rng.random() / 1000, 'lng': -76.7500},
+        })
+
+    return {'chat': chat, 'search': search, 'route': route, 'buildings': buildings, 'directions': directions}
+
+
+def run_scenario(name: str, fn: Callable, concurrency: int, duration: float, seed: int) -> Dict:
+    """Drive `fn` from `concurrency` threads for `duration` seconds."""
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    bytes_total = [0]
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(worker_id: int):
+        rng = random.Random(seed * 1000 + worker_id)
+        local_lat, local_status, local_bytes, local_err = [], {}, 0, 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                status, size = fn(rng)
+            except Exception:
+                status, size = 0, 0
+            local_lat.append(time.perf_counter() - started)
+            local_status[status] = local_status.get(status, 0) + 1
+            local_bytes += size
+            if status == 0 or status >= 500:
+                local_err += 1
+        with lock:
+            latencies.extend(local_lat)
+            for k, v in local_status.items():
+                statuses[k] = statuses.get(k, 0) + v
+            bytes_total[0] += local_bytes
+            errors[0] += local_err
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    count = len(latencies)
+    return {
+        'requests': count,
+        'errors': errors[0],
+        'status_counts': {str(k): v for k, v in sorted(statuses.items())},
+        'elapsed_s': round(elapsed, 3),
+        'rps': round(count / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(_percentile(latencies, 50) * 1000, 2) if count else None,
+        'p90_ms': round(_percentile(latencies, 90) * 1000, 2) if count else None,
+        'p99_ms': round(_percentile(latencies, 99) * 1000, 2) if count else None,
+        'mean_ms': round(sum(latencies) / count * 1000, 2) if count else None,
+        'avg_response_bytes': round(bytes_total[0] / count, 1) if count else None,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def _wait_for_server(base_url: str, proc: subprocess.Popen, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"API server exited early with code {proc.returncode}")
+        try:
+            status, _ = _http('GET', f"{base_url}/api/health", timeout=1.0)
+            if status == 200:
+                return
+        except Exception:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("API server did not become healthy in time")
+
+
+def run(args) -> Dict:
+    workdir = args.workdir or tempfile.mkdtemp(prefix='campus-bench-')
+    db_path = os.path.join(workdir, 'bench_campus.db')
+    print(f"Generating {args.buildings} buildings into {db_path}...", file=sys.stderr)
+    counts = generate(db_path, args.buildings, seed=args.seed)
+
+    stub = start_server(latency_ms=args.llm_latency_ms, jitter_ms=args.llm_jitter_ms, seed=args.seed)
+    stub_url = f"http://127.0.0.1:{stub.server_address[1]}"
+
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ)
+    env.update({
+        'CAMPUS_DB_PATH': db_path,
+        'GROQ_API_KEY': 'stub-key',
+        'GROQ_BASE_URL': stub_url,
+        'GOOGLE_MAPS_API_KEY': 'stub-key',
+        'GOOGLE_DIRECTIONS_URL': f"{stub_url}/maps/api/directions/json",
+    })
+    log = open(os.path.join(workdir, 'server.log'), 'w')
+    proc = subprocess.Popen([sys.executable, os.path.join(HERE, 'serve_app.py'), '--port', str(port)],
+                            cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        _wait_for_server(base_url, proc)
+        memory = {'startup': _rss_kb(proc.pid)}
+        scenarios = build_scenarios(base_url, args.buildings, args.seed)
+        results = {}
+        for name in args.scenarios:
+            print(f"Running {name} (concurrency={args.concurrency}, {args.duration}s)...", file=sys.stderr)
+            results[name] = run_scenario(name, scenarios[name], args.concurrency, args.duration, args.seed)
+            memory[name] = _rss_kb(proc.pid)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        log.close()
+        stub.shutdown()
+
+    return {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat() + 'Z',
+            'git_commit': _git_commit(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'dataset': counts,
+            'concurrency': args.concurrency,
+            'duration_s': args.duration,
+            'llm_latency_ms': args.llm_latency_ms,
+            'llm_jitter_ms': args.llm_jitter_ms,
+            'workdir': workdir,
+        },
+        'scenarios': results,
+        'memory': memory,
+    }
+
+
+def print_report(report: Dict, baseline: Optional[Dict] = None):
+    print(f"\nCommit {report['meta'].get('git_commit')}  dataset={report['meta']['dataset']}")
+    header = f"{'scenario':<12}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}"
+    if baseline:
+        header += f"{'d req/s':>10}{'d p99':>10}"
+    print(header)
+    for name, r in report['scenarios'].items():
+        line = f"{name:<12}{r['rps']:>10}{r['p50_ms'] or '-':>10}{r['p99_ms'] or '-':>10}{r['errors']:>8}"
+        old = (baseline or {}).get('scenarios', {}).get(name)
+        if old:
+            line += f"{_delta(old.get('rps'), r['rps']):>10}{_delta(old.get('p99_ms'), r['p99_ms']):>10}"
+        print(line)
+    last = list(report['memory'].values())[-1]
+    print(f"Server RSS: {last.get('rss_kb')} KiB (peak {last.get('peak_kb')} KiB)")
+
+
+def _delta(old, new) -> str:
+    if not old or new is None:
+        return '-'
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end Campus Navigator API benchmark")
+    parser.add_argument('--buildings', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds per scenario")
+    parser.add_argument('--scenarios', nargs='+', default=DEFAULT_SCENARIOS, choices=DEFAULT_SCENARIOS)
+    parser.add_argument('--llm-latency-ms', type=float, default=300.0)
+    parser.add_argument('--llm-jitter-ms', type=float, default=100.0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workdir', default=None, help="where to put the generated DB and server log")
+    parser.add_argument('--out', default=None, help="results JSON path (default benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument('--compare', default=None, help="previous results JSON to diff against")
+    args = parser.parse_args()
+
+    report = run(args)
+
+    out = args.out
+    if not out:
+        stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S')
+        out = os.path.join(HERE, 'results', f"{stamp}-{report['meta'].get('git_commit') or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    print(f"\nResults saved to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+"""
+Run flask_api's app without the debug reloader, for benchmarks.
+
+Configuration comes from the environment (CAMPUS_DB_PATH, GROQ_BASE_URL, ...)
+exactly as for `python flask_api.py`.
+"""
+
+import os
+import sys
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the Campus Navigator API for benchmarking")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5001)
+    args = parser.parse_args()
+
+    import flask_api
+    flask_api.create_app().run(host=args.host, port=args.port, debug=False, use_reloader=False, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Local fake Groq / OpenAI-compatible chat completions server for benchmarks.
+
+Answers POST .../chat/completions with a canned completion after a configurable
+latency (+/- jitter). Location-extraction prompts get a JSON answer derived from
+the user query, everything else gets a short fixed sentence, so the navigator
+follows its normal code paths without any network access.
+
+It also answers GET /maps/api/directions/json with a minimal Google Directions
+payload so /api/directions can be benchmarked offline.
+
+Usage:
+    python benchmarks/stub_llm_server.py --port 8900 --latency-ms 300 --jitter-ms 100
+    $env:GROQ_BASE_URL = 'http://127.0.0.1:8900'
+"""
+
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DIRECTIONS_PATTERN = re.compile(r"from\s+(?:the\s+)?(.+?)\s+to\s+(?:the\s+)?(.+?)[?.!]*$", re.IGNORECASE)
+LOCATION_PATTERN = re.compile(r"(?:where is|find|about|does|is)\s+(?:the\s+)?(.+?)(?:\s+(?:open|close|located))?[?.!]*$", re.IGNORECASE)
+
+
+def extract_answer(query: str) -> dict:
+    """Mimic the extraction model well enough for the navigator's code paths."""
+    query = query.strip()
+    lowered = query.lower()
+    match = DIRECTIONS_PATTERN.search(query)
+    if match:
+        return {"location": match.group(2), "from_location": match.group(1), "query_type": "directions"}
+    query_type = "hours" if any(w in lowered for w in ("open", "close", "hours", "time")) else "location"
+    match = LOCATION_PATTERN.search(query)
+    location = match.group(1) if match else query.rstrip('?.!')
+    return {"location": location, "query_type": query_type}
+
+
+class StubState:
+    def __init__(self, latency_ms: float = 300.0, jitter_ms: float = 100.0, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def delay(self) -> float:
+        with self.lock:
+            self.requests += 1
+            jitter = self.rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(0.0, self.latency_ms + jitter) / 1000.0
+
+
+def make_handler(state: StubState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def _send_json(self, status: int, payload: dict):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.startswith('/maps/api/directions/json'):
+                self._send_json(200, {
+                    "status": "OK",
+                    "routes": [{
+                        "overview_polyline": {"points": "_p~iF~ps|U_ulLnnqC_mqNvxq`@"},
+                        "legs": [{
+                            "distance": {"text": "0.3 km"},
+                            "duration": {"text": "4 mins"},
+                            "start_address": "Stub origin",
+                            "end_address": "Stub destination",
+                            "steps": [{"html_instructions": "Head <b>north</b>",
+                                       "distance": {"text": "0.3 km"},
+                                       "duration": {"text": "4 mins"}}],
+                        }],
+                    }],
+                })
+                return
+            if self.path.rstrip('/') in ('', '/health'):
+                self._send_json(200, {"status": "ok", "requests": state.requests})
+                return
+            self._send_json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            raw = self.rfile.read(length) if length else b''
+            if not self.path.rstrip('/').endswith('/chat/completions'):
+                self._send_json(404, {"error": {"message": "not found"}})
+                return
+            try:
+                payload = json.loads(raw or b'{}')
+            except ValueError:
+                self._send_json(400, {"error": {"message": "invalid JSON"}})
+                return
+
+            messages = payload.get('messages') or []
+            system = next((m.get('content', '') for m in messages if m.get('role') == 'system'), '')
+            user = next((m.get('content', '') for m in reversed(messages) if m.get('role') == 'user'), '')
+
+            if system.startswith('Extract'):
+                content = json.dumps(extract_answer(user))
+            else:
+                content = "Here's what I found on campus. Follow the signs and you'll be there in a few minutes."
+
+            time.sleep(state.delay())
+            prompt_tokens = (len(system) + len(user)) // 4
+            completion_tokens = len(content) // 4
+            self._send_json(200, {
+                "id": f"chatcmpl-stub-{state.requests}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": payload.get('model', 'stub'),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            })
+
+    return Handler
+
+
+def start_server(host: str = '127.0.0.1', port: int = 0, latency_ms: float = 300.0,
+                 jitter_ms: float = 100.0, seed: int = 0) -> ThreadingHTTPServer:
+    """Start the stub server on a background thread and return it (port 0 = pick a free port)."""
+    server = ThreadingHTTPServer((host, port), make_handler(StubState(latency_ms, jitter_ms, seed)))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Groq-compatible LLM server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency-ms', type=float, default=300.0)
+    parser.add_argument('--jitter-ms', type=float, default=100.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    server = start_server(args.host, args.port, args.latency_ms, args.jitter_ms, args.seed)
+    print(f"Stub LLM server on http://{args.host}:{server.server_address[1]} "
+          f"(latency={args.latency_ms}ms, jitter={args.jitter_ms}ms)", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
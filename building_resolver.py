@@ -0,0 +1,235 @@
+"""
+Typo-tolerant building lookup over names, aliases and building codes.
+
+search_building and /api/search match substrings with SQL LIKE, so "libary",
+"enginering hall" or "admisions" find nothing and the request ends in an
+apology from the LLM. BuildingResolver is the fallback. It is built once per
+catalog snapshot (`building_resolver(catalog)`) and works word by word:
+
+- a SymSpell-style deletion index finds vocabulary words within a small
+  Damerau-Levenshtein distance of a query word (MAX_EDITS by word length)
+  without scanning the vocabulary;
+- a Soundex index catches misspellings that sound right but are further away
+  ("admishuns" -> "admissions");
+- a query word of 3+ letters also matches the words it starts ("eng").
+
+Each query word gets its best similarity against each building, weighted by
+how rare the matched word is (IDF), so "hall" counts for less than
+"engineering". A building's score (0-1) is the weighted mean over the query
+words, scaled down a little when the query covers only part of its name.
+
+`mentions()` finds a building named somewhere inside a whole question ("is
+the libary open late?") by scoring each run of up to MAX_SPAN non-question
+words.
+"""
+
+import math
+import heapq
+from bisect import bisect_left
+from typing import Dict, List, Optional, Set
+
+from poi_index import tokenize
+
+# Edits allowed for a query word of at least this many characters
+MAX_EDITS = ((5, 2), (3, 1))
+MIN_PREFIX = 3
+PHONETIC_SCORE = 0.6
+# Minimum score for search_building to accept a fuzzy match
+DEFAULT_MIN_SCORE = 0.7
+# Longest run of words mentions() tries as a building name
+MAX_SPAN = 4
+# Question words mentions() skips; short ones would otherwise prefix-match names ("the" -> "theater")
+STOP_WORDS = frozenset((
+    'a', 'about', 'an', 'and', 'any', 'are', 'at', 'by', 'can', 'close', 'closes', 'do', 'does', 'far', 'for',
+    'from', 'get', 'go', 'hours', 'how', 'i', 'in', 'inside', 'is', 'it', 'its', 'me', 'my', 'near', 'of', 'on',
+    'open', 'or', 'place', 'that', 'the', 'there', 'this', 'to', 'walk', 'what', 'when', 'where', 'which', 'with',
+))
+
+_EMPTY: Set[int] = frozenset()
+
+_SOUNDEX_CODES = {c: str(d) for d, letters in enumerate(
+    ('aeiouyhw', 'bfpv', 'cgjkqsxz', 'dt', 'l', 'mn', 'r')) for c in letters}
+
+
+def soundex(word: str) -> str:
+    """American Soundex code ("Ashcraft" -> "A261"); '' for words without letters."""
+    letters = [c for c in word.lower() if c.isalpha()]
+    if not letters:
+        return ''
+    code = letters[0].upper()
+    previous = _SOUNDEX_CODES.get(letters[0], '')
+    for c in letters[1:]:
+        digit = _SOUNDEX_CODES.get(c, '')
+        if digit and digit != '0' and digit != previous:
+            code += digit
+        # h and w don't separate equal codes; vowels do
+        if c not in 'hw':
+            previous = digit
+    return (code + '000')[:4]
+
+
+def max_edits(word: str) -> int:
+    for length, edits in MAX_EDITS:
+        if len(word) >= length:
+            return edits
+    return 0
+
+
+def _deletes(word: str, edits: int) -> Set[str]:
+    """`word` with up to `edits` characters removed (including `word` itself)."""
+    result = {word}
+    frontier = {word}
+    for _ in range(edits):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))} - result
+        result |= frontier
+    return result
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Damerau-Levenshtein (optimal string alignment) distance, or limit + 1 once it exceeds `limit`."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class BuildingResolver:
+    """Fuzzy word index from building names, aliases and codes to building ids."""
+
+    def __init__(self):
+        self.names: Dict[int, str] = {}
+        # word -> buildings using it in their name, aliases or code
+        self.postings: Dict[str, Set[int]] = {}
+        # word -> buildings using it in their name, and name lengths in words, for coverage
+        self.name_postings: Dict[str, Set[int]] = {}
+        self.name_sizes: Dict[int, int] = {}
+        self.weights: Dict[str, float] = {}
+        self.deletes: Dict[str, Set[str]] = {}
+        self.phonetic: Dict[str, Set[str]] = {}
+        self._sorted_words: List[str] = []
+        # Weight of the rarest word; a query word matching nothing counts this much
+        self.max_weight = 1.0
+
+    @classmethod
+    def build(cls, catalog) -> 'BuildingResolver':
+        resolver = cls()
+        for building in catalog.buildings.values():
+            resolver.names[building.id] = building.name
+            name_words = set(tokenize(building.name))
+            resolver.name_sizes[building.id] = len(name_words)
+            for word in name_words:
+                resolver.name_postings.setdefault(word, set()).add(building.id)
+            words = name_words | set(tokenize(building.building_code))
+            for alias in building.alias_list:
+                words.update(tokenize(alias))
+            for word in words:
+                resolver.postings.setdefault(word, set()).add(building.id)
+        total = max(1, len(resolver.names))
+        for word, ids in resolver.postings.items():
+            resolver.weights[word] = math.log(1 + total / len(ids))
+            for deleted in _deletes(word, max_edits(word)):
+                resolver.deletes.setdefault(deleted, set()).add(word)
+            key = soundex(word)
+            if key:
+                resolver.phonetic.setdefault(key, set()).add(word)
+        resolver._sorted_words = sorted(resolver.postings)
+        resolver.max_weight = max(resolver.weights.values(), default=1.0)
+        return resolver
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _word_matches(self, word: str) -> Dict[str, float]:
+        """Vocabulary words similar to `word`, with a similarity in (0, 1]."""
+        if word in self.postings:
+            # A correctly spelled word isn't also read as a typo of another one
+            return {word: 1.0}
+        matches: Dict[str, float] = {}
+        edits = max_edits(word)
+        if edits:
+            candidates: Set[str] = set()
+            for deleted in _deletes(word, edits):
+                candidates |= self.deletes.get(deleted, set())
+            for candidate in candidates:
+                distance = edit_distance(word, candidate, edits)
+                if distance <= edits:
+                    matches[candidate] = 1.0 - distance / (len(candidate) + 1)
+        if len(word) >= MIN_PREFIX:
+            lo = bisect_left(self._sorted_words, word)
+            for candidate in self._sorted_words[lo:lo + 50]:
+                if not candidate.startswith(word):
+                    break
+                score = 0.75 + 0.25 * len(word) / len(candidate)
+                matches[candidate] = max(matches.get(candidate, 0.0), score)
+        key = soundex(word)
+        if key and len(word) >= MIN_PREFIX:
+            for candidate in self.phonetic.get(key, ()):
+                matches.setdefault(candidate, PHONETIC_SCORE)
+        return matches
+
+    def resolve(self, query: str, limit: int = 5, min_score: float = 0.0) -> List[Dict]:
+        """Best matching buildings for `query`, highest score first: [{'id', 'name', 'score'}]."""
+        words = tokenize(query)
+        if not words:
+            return []
+        scores: Dict[int, float] = {}
+        # Query words matching a word of the building's name, for coverage
+        hits: Dict[int, int] = {}
+        total_weight = 0.0
+        for word in words:
+            matches = self._word_matches(word)
+            # Unmatched words count at full weight so extra words lower every score
+            total_weight += max((self.weights[c] for c in matches), default=self.max_weight)
+            ranked = sorted(((similarity * self.weights[c], c) for c, similarity in matches.items()), reverse=True)
+            # Each building scores its best match for the word
+            assigned: Set[int] = set()
+            for value, candidate in ranked:
+                new = self.postings[candidate] - assigned
+                if not new:
+                    continue
+                assigned |= new
+                for building_id in new:
+                    scores[building_id] = scores.get(building_id, 0.0) + value
+                for building_id in new & self.name_postings.get(candidate, _EMPTY):
+                    hits[building_id] = hits.get(building_id, 0) + 1
+        results = []
+        for building_id, score in scores.items():
+            size = self.name_sizes[building_id]
+            coverage = min(1.0, hits.get(building_id, 0) / size) if size else 0.0
+            final = score / total_weight * (0.85 + 0.15 * coverage)
+            if final >= min_score:
+                results.append((final, building_id))
+        results = heapq.nsmallest(limit, results, key=lambda r: (-r[0], r[1]))
+        return [{'id': building_id, 'name': self.names[building_id], 'score': round(final, 3)}
+                for final, building_id in results]
+
+    def best(self, query: str, min_score: float = DEFAULT_MIN_SCORE) -> Optional[Dict]:
+        results = self.resolve(query, limit=1, min_score=min_score)
+        return results[0] if results else None
+
+    def mentions(self, text: str, min_score: float = DEFAULT_MIN_SCORE) -> Optional[Dict]:
+        """The best building named by a run of words inside `text`, or None."""
+        words = [word for word in tokenize(text) if word not in STOP_WORDS]
+        found = None
+        for start in range(len(words)):
+            for end in range(start + 1, min(len(words), start + MAX_SPAN) + 1):
+                match = self.best(' '.join(words[start:end]), min_score)
+                if match is not None and (found is None or match['score'] > found['score']):
+                    found = match
+        return found
+
+
+def building_resolver(catalog) -> BuildingResolver:
+    """The BuildingResolver for a catalog snapshot, built on first use."""
+    return catalog.derived('building_resolver', BuildingResolver.build)
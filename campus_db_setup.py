@@ -1,15 +1,10 @@
 import sqlite3
 import json
 
-def setup_database():
-    """Create and populate the campus database with sample data"""
-    # DEBUG: Starting campus_db_setup
-    print("DEBUG: Starting campus_db_setup...")
-    
-    conn = sqlite3.connect('campus_navigator.db')
-    print("DEBUG: Database connected to campus_navigator.db")
-    cursor = conn.cursor()
-    
+from changes import SCHEMA_SQL as CHANGES_SCHEMA_SQL
+
+def create_schema(cursor):
+    """Create the buildings, poi and routes tables if they don't exist"""
     # Create Buildings table
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS buildings (
@@ -55,6 +50,21 @@ def setup_database():
         FOREIGN KEY (to_building_id) REFERENCES buildings(id)
     )
     ''')
+
+    # Log of admin edits (changes.py); created up front so the first edit doesn't alter the schema
+    cursor.execute(CHANGES_SCHEMA_SQL)
+
+
+def setup_database():
+    """Create and populate the campus database with sample data"""
+    # DEBUG: Starting campus_db_setup
+    print("DEBUG: Starting campus_db_setup...")
+    
+    conn = sqlite3.connect('campus_navigator.db')
+    print("DEBUG: Database connected to campus_navigator.db")
+    cursor = conn.cursor()
+    
+    create_schema(cursor)
     print("DEBUG: Completed table creation.")
     
     # Insert sample buildings
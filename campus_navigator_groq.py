@@ -1,243 +1,443 @@
-import sqlite3
 import json
 import sys
 import os
 import uuid
 import traceback
 from datetime import datetime
-from typing import Dict, List, Optional
-import importlib
+from typing import Dict, List, Optional, Tuple
+import threading
+import time
+
+from llm_backends import TemplateBackend, create_backend
+from llm_resilience import ResilientLLM
+from model_router import ModelRouter
+from metrics import metrics
+from answer_renderer import AnswerRenderer, answer_mode
+from prompts import (EXTRACT_SYSTEM_PROMPT, MIN_ANSWER_PROMPT_TOKENS, build_answer_prompt,
+                     build_polish_prompt, estimate_tokens, request_token_budget)
+from llm_traces import RequestTrace, TraceBuffer
+from catalog import Catalog, CatalogCache
+from open_now import OpenNowIndex, open_now_index
+from poi_index import POIIndex, category_for, is_category_question, poi_index
+from building_resolver import BuildingResolver, building_resolver
+from route_graph import RouteGraph, route_graph
+from reachable import Reachability, reachability
+from map_bundle import MapBundle, map_bundle
+from retrieval import RetrievalIndex, default_vector_dir, retrieval_index, retrieval_k, retrieval_mode
+from session_store import PRONOUN_RE, SessionStore, resolve_followup, session_state
+from answer_cache import AnswerCache, cache_key, default_cache_path
+from hours import describe_status
+from query_log import QueryLog, normalize_query
+from db_pool import SQLitePool
 
-# Default Groq model can be overridden with env var; but read API key at init time
-# === Configuration ===
-# === Configuration (Hardcoded) ===
-GROQ_API_KEY = "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"  # 🔒 Replace with your actual API key
-GROQ_MODEL = "openai/gpt-oss-20b"   # or another model you want to use
 
-print("DEBUG: module load - sys.executable:", sys.executable)
-print("DEBUG: module load - sys.version:", sys.version)
-print("DEBUG: module load - sys.path:\n", "\n".join(sys.path))
-
-# Try to locate groq package at import time
-try:
-    import groq as _groq
-    print("DEBUG: groq import succeeded at module load. groq file:", getattr(_groq, '__file__', 'no __file__'))
-except Exception as e:
-    print("DEBUG: groq import failed at module load:", repr(e))
+class CampusNavigator:
+    # Set by init_llm; navigators created with `shared=` reuse the shared navigator's values
+    LLM_ATTRIBUTES = ('llm_backend', 'llm', 'router', 'llm_client', 'model_name', 'model_version', 'llm_type',
+                      '_init_error', '_init_traceback', '_api_key', '_model')
 
-# DEBUG: Starting campus_navigator_groq module
-print("DEBUG: Entering campus_navigator_groq module...")
+    def __init__(self, db_path='campus_navigator.db', campus: Optional[str] = None,
+                 shared: Optional['CampusNavigator'] = None):
+        """Navigator for one campus database.
 
-class CampusNavigator:
-    def __init__(self, db_path='campus_navigator.db'):
+        With `shared`, the LLM client, trace buffer, session store and query
+        log are those of the shared navigator, so many campuses (see
+        campuses.py) cost one of each.
+        """
         self.db_path = db_path
+        self.campus = campus
+        self._shared = shared
+        # In-memory snapshot of the database plus indexes derived from it (see catalog.py)
+        self.catalog_cache = CatalogCache(db_path)
+        # Connections for the SQL lookups (search_building, get_route, get_pois)
+        self.db = SQLitePool(db_path)
+        self.llm_backend = None
+        self.llm = None
+        self.router = None
         self.llm_client = None
         self.model_name = None
         self.model_version = None
-        self.llm_type = "groq"
-        self._last_llm = None
+        self.llm_type = None
+        # Bounded buffer of recent LLM calls across all requests (debug only)
+        self.traces = shared.traces if shared else TraceBuffer()
         # Store any initialization error so query_llm can provide better diagnostics
         self._init_error = None
         self._init_traceback = None
         # API key and model used for this instance (populated at init)
         self._api_key = None
         self._model = None
-        self.init_llm()
+        # Local phrasing of hours/location/directions answers (see answer_renderer.py)
+        self.renderer = AnswerRenderer()
+        self.answer_mode = answer_mode()
+        # Passages from buildings, POIs and routes added to LLM answer prompts (see retrieval.py)
+        self.retrieval_mode = retrieval_mode()
+        self.retrieval_k = retrieval_k()
+        self.retrieval_dir = default_vector_dir(db_path)
+        # Last resolved buildings per client session, for follow-up questions
+        self.sessions = shared.sessions if shared else SessionStore.from_env()
+        # Answers generated offline for canonical questions (python answer_cache.py)
+        self.answer_cache = AnswerCache(default_cache_path(db_path))
+        # Captured traffic for tuning caches and replaying load (None unless CAMPUS_QUERY_LOG is set)
+        self.query_log = shared.query_log if shared else QueryLog.from_env()
+        # The LLM client is created on first use (see _ensure_llm) to keep startup fast
+        self._llm_ready = False
+        self._llm_lock = threading.Lock()
+
+    def _ensure_llm(self):
+        if self._llm_ready:
+            return
+        with self._llm_lock:
+            if not self._llm_ready:
+                self.init_llm()
+                self._llm_ready = True
+
+    def warm_up(self):
+        """Create the LLM client, load the catalog and build its indexes before the first request."""
+        self._ensure_llm()
+        self.preload()
+
+    def preload(self) -> Catalog:
+        """Load the catalog and build every index derived from it (no network clients).
+
+        The production server calls this in its master process before forking
+        so workers share one copy of the data.
+        """
+        catalog = self.catalog()
+        self.open_index()
+        self.poi_index()
+        self.building_resolver()
+        if self.retrieval_mode != 'off':
+            self.retrieval_index()
+        self.route_graph().precompute()
+        self.map_bundle()
+        return catalog
 
-    def init_llm(self):
-        """Initialize Groq client using the official `groq` package (v0.32.0 usage)."""
-        print("DEBUG: Initializing Groq client in init_llm...")
-        print("DEBUG: init_llm - sys.executable:", sys.executable)
-        print("DEBUG: init_llm - sys.version:", sys.version)
-        print("DEBUG: init_llm - sys.path:\n", "\n".join(sys.path))
-
-        # Read API key from environment
-        api_key = os.environ.get("GROQ_API_KEY")
-        if api_key:
-            print("DEBUG: API key successfully read.")
-        else:
-            print("DEBUG: API key NOT found in environment.")
+    def catalog(self) -> Catalog:
+        """Current catalog snapshot (reloaded when the database file changes)."""
+        return self.catalog_cache.get()
 
-        # Attempt to import groq here and print details
-        try:
-            groq = importlib.import_module('groq')
-            print("DEBUG: groq import succeeded in init_llm. Location:", getattr(groq, '__file__', 'no __file__'))
-            # Print a couple attributes if present
-            print("DEBUG: groq attributes available:", [a for a in dir(groq) if not a.startswith('_')][:20])
-        except Exception as e:
-            import traceback
-            print("DEBUG: groq import failed in init_llm:", repr(e))
-            print(traceback.format_exc())
+    def open_index(self) -> OpenNowIndex:
+        return open_now_index(self.catalog())
 
-        # Proceed with Groq client initialization
-        try:
-            print("DEBUG: Attempting to instantiate Groq client...")
-            from groq import Groq
+    def poi_index(self) -> POIIndex:
+        return poi_index(self.catalog())
 
-            # Use the hardcoded values
-            api_key = GROQ_API_KEY
-            model = GROQ_MODEL
+    def building_resolver(self) -> BuildingResolver:
+        return building_resolver(self.catalog())
 
-            # Read API key from environment
-            api_key = os.environ.get("GROQ_API_KEY")
-            if api_key:
-                print("DEBUG: API key successfully read.")
-            else:
-                print("DEBUG: API key NOT found in environment.")
-
-            print("DEBUG: Attempting to instantiate Groq client...")
-            client = Groq(api_key=api_key)
-            self.llm_client = client
-            self._api_key = api_key
-            self._model = model
-            self.model_name = model
+    def route_graph(self) -> RouteGraph:
+        return route_graph(self.catalog())
+
+    def reachability(self) -> Reachability:
+        return reachability(self.catalog())
+
+    def map_bundle(self) -> MapBundle:
+        return map_bundle(self.catalog())
+
+    def retrieval_index(self) -> RetrievalIndex:
+        vector_dir = self.retrieval_dir if self.retrieval_mode == 'hybrid' else None
+        return retrieval_index(self.catalog(), vector_dir)
+
+    def retrieve(self, query_data: Dict, building_data: Optional[Dict], route_data: Optional[Dict] = None,
+                 trace: Optional[RequestTrace] = None) -> List[str]:
+        """Texts of the passages most relevant to the question, for the answer prompt.
+
+        Used when no building was resolved and for location/info questions;
+        hours and directions answers already have every fact they need. The
+        resolved building and route are left out since the prompt has them.
+        """
+        if self.retrieval_mode == 'off':
+            return []
+        if building_data and query_data.get('query_type') not in ('location', 'info'):
+            return []
+        started = time.perf_counter()
+        exclude = []
+        if building_data:
+            exclude.append(('building', building_data['id']))
+        if route_data and route_data.get('id') is not None:
+            exclude.append(('route', route_data['id']))
+        passages = self.retrieval_index().search(query_data.get('original_query', ''), k=self.retrieval_k,
+                                                 exclude=exclude)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        metrics.observe('retrieval.ms', elapsed_ms)
+        if trace is not None:
+            trace.retrieval = {
+                'ms': round(elapsed_ms, 2),
+                'passages': [f"{p['kind']}:{p['id']}" for p in passages],
+            }
+        return [p['text'] for p in passages]
+
+    def find_category(self, user_query: str, near: Optional[Tuple[float, float]] = None,
+                      limit: int = 5) -> Optional[Tuple[str, List[Dict]]]:
+        """(poi_type, matching POIs) for category questions that don't name a building, else None."""
+        poi_type = category_for(user_query)
+        if not poi_type or not is_category_question(user_query):
+            return None
+        guess = TemplateBackend.extract(user_query)
+        if guess.get('location') and self.search_building(guess['location']):
+            return None
+        return poi_type, self.poi_index().search(poi_type=poi_type, near=near, limit=limit)
+
+    def init_llm(self):
+        """Initialize the configured LLM backend (see llm_backends.create_backend)."""
+        if self._shared is not None:
+            self._shared._ensure_llm()
+            for name in self.LLM_ATTRIBUTES:
+                setattr(self, name, getattr(self._shared, name))
+            return
+        try:
+            backend = create_backend()
+            self.llm_backend = backend
+            # Timeouts, retries, hedging and circuit breaking; the template backend
+            # answers locally when the real backend is failing
+            fallback = None if isinstance(backend, TemplateBackend) else TemplateBackend()
+            self.llm = ResilientLLM.from_env(backend, fallback=fallback)
+            self.llm_client = getattr(backend, 'client', backend)
+            self.llm_type = backend.name
+            self._api_key = getattr(backend, 'api_key', None)
+            self._model = backend.model
+            self.model_name = backend.model
             self.model_version = None
-            print(f"Using Groq client (model={self.model_name})", file=sys.stderr)
-        except ImportError:
-            print("Groq client not installed. Install with: pip install groq", file=sys.stderr)
+            # Small fast model for extraction, answer model for replies
+            self.router = ModelRouter.from_env(backend.name, backend.model)
+            print(f"Using {backend.name} LLM backend (models={self.router.snapshot()['models']})", file=sys.stderr)
+        except ImportError as e:
+            print(f"LLM backend dependency not installed: {e}. Install with: pip install groq", file=sys.stderr)
+            self.llm_backend = None
             self.llm_client = None
-            self._init_error = "Groq client not installed"
+            self._init_error = f"LLM backend dependency not installed: {e}"
         except Exception as e:
             tb = traceback.format_exc()
-            print(f"Error initializing Groq client: {e}\n{tb}", file=sys.stderr)
+            print(f"Error initializing LLM backend: {e}\n{tb}", file=sys.stderr)
+            self.llm_backend = None
             self.llm_client = None
             self._init_error = str(e)
             self._init_traceback = tb
 
+    def _record_llm_call(self, call: Dict, trace: Optional[RequestTrace]):
+        """Attach an LLM call record to the request's trace and the debug ring buffer."""
+        if trace is not None:
+            call['request_id'] = trace.request_id
+            trace.add(call)
+        self.traces.record(call)
 
-
-    def query_llm(self, prompt: str, system_prompt: str) -> dict:
-        """Send query to Groq and get response.
+    def query_llm(self, prompt: str, system_prompt: str, task: str = 'chat',
+                  trace: Optional[RequestTrace] = None, stage: Optional[str] = None) -> dict:
+        """Send query to the configured LLM backend and get response.
 
         This function returns a dict with keys: { 'text', 'raw', 'ok', 'error' }.
-        Replace the NotImplemented section with the exact SDK call for your Groq client.
+        `task` ('extract' or 'answer') lets backends such as the template backend
+        pick the right behaviour; `stage` (defaults to `task`) picks the model via
+        the router, e.g. stage='escalate' for a retried extraction. The call is
+        recorded in `trace` (the request's own RequestTrace) and in the
+        navigator's ring buffer of recent calls.
         """
-        full_prompt = f"{system_prompt}\n\nUser Query: {prompt}"
-
-        # If the client wasn't configured, return a clear error for debugging
-        if not self.llm_client:
+        stage = stage or task
+        self._ensure_llm()
+        if trace is not None and trace.deadline is None and self.llm is not None:
+            trace.deadline = self.llm.new_deadline()
+        started_at = datetime.utcnow().isoformat() + 'Z'
+        started = time.perf_counter()
+
+        # If the backend wasn't configured, return a clear error for debugging
+        if not self.llm_backend:
             # Provide actionable diagnostics: was init the problem? is the key missing?
-            key_present = bool(self._api_key)
-            err_parts = ["Groq client not configured. Set GROQ_API_KEY and install the Groq SDK."]
+            key_present = bool(self._api_key or os.environ.get("GROQ_API_KEY"))
+            err_parts = ["LLM backend not configured. Set CAMPUS_LLM_BACKEND (or GROQ_API_KEY) and install the backend's SDK."]
             if self._init_error:
                 err_parts.append(f"Init error: {self._init_error}")
             err_parts.append(f"GROQ_API_KEY set: {key_present}")
             err = " | ".join(err_parts)
             print(err, file=sys.stderr)
-            self._last_llm = {
+            self._record_llm_call({
+                'task': task,
+                'stage': stage,
+                'started_at': started_at,
+                'duration_ms': 0.0,
+                'backend': None,
+                'model': None,
                 'text': None,
                 'raw': None,
+                'usage': None,
                 'ok': False,
                 'error': err,
                 'init_error': self._init_error,
                 'init_traceback': self._init_traceback,
-            }
+            }, trace)
             return {'text': "I'm having trouble processing that right now. Please try again.", 'raw': None, 'ok': False, 'error': err}
 
         try:
-            # Use the Groq chat completions API. We send a system message then the user message.
+            # We send a system message then the user message.
             messages = [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": prompt},
             ]
 
-            completion = self.llm_client.chat.completions.create(
-                messages=messages,
-                model=self.model_name,
-            )
-
-            # Extract text from the first choice (defensive parsing)
-            text = None
-            try:
-                # According to the Groq client, `completion.choices[0].message.content` holds the text
-                text = completion.choices[0].message.content
-            except Exception:
-                try:
-                    # Fallback for other shapes
-                    text = completion.choices[0].message["content"]
-                except Exception:
-                    text = str(completion)
-
-            # Raw representation: prefer to_dict() if available
-            try:
-                raw_repr = completion.to_dict() if hasattr(completion, 'to_dict') else str(completion)
-            except Exception:
-                raw_repr = str(completion)
-
-            self._last_llm = {'text': text, 'raw': raw_repr, 'ok': True}
-            return {'text': text, 'raw': raw_repr, 'ok': True, 'error': None}
+            model = self.router.model_for(stage) if self.router else self.model_name
+            result = self.llm.complete(messages, model=model, task=task,
+                                       deadline=trace.deadline if trace is not None else None)
+            duration_ms = round((time.perf_counter() - started) * 1000, 2)
+            text = result.get('text')
+            raw_repr = result.get('raw')
+            ok = not result.get('fallback')
+            err = None
+            if not ok:
+                err = f"Answered by local fallback ({result.get('fallback_reason')})"
+                if result.get('error'):
+                    err += f": {result['error']}"
+
+            usage = result.get('usage')
+            if not usage:
+                # Backend didn't report usage (template/fallback); record a local estimate
+                usage = {
+                    'prompt_tokens': estimate_tokens(system_prompt) + estimate_tokens(prompt),
+                    'completion_tokens': estimate_tokens(text),
+                    'estimated': True,
+                }
+            ModelRouter.record(stage, duration_ms, usage)
+            self._record_llm_call({
+                'task': task,
+                'stage': stage,
+                'started_at': started_at,
+                'duration_ms': duration_ms,
+                'backend': self.llm_type if ok else 'template',
+                'model': result.get('model', model),
+                'text': text,
+                'raw': raw_repr,
+                'usage': usage,
+                'attempts': result.get('attempts', 0),
+                'fallback': not ok,
+                'ok': ok,
+                'error': err,
+            }, trace)
+            return {'text': text, 'raw': raw_repr, 'ok': ok, 'error': err}
         except Exception as e:
             err = str(e)
             tb = traceback.format_exc()
-            print(f"Groq LLM Error: {err}\n{tb}", file=sys.stderr)
-            self._last_llm = {'text': None, 'raw': None, 'ok': False, 'error': err, 'error_trace': tb}
+            print(f"LLM Error ({self.llm_type}): {err}\n{tb}", file=sys.stderr)
+            self._record_llm_call({
+                'task': task,
+                'stage': stage,
+                'started_at': started_at,
+                'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+                'backend': self.llm_type,
+                'model': self.model_name,
+                'text': None,
+                'raw': None,
+                'usage': None,
+                'ok': False,
+                'error': err,
+                'error_trace': tb,
+            }, trace)
             return {'text': "I'm having trouble processing that right now. Please try again.", 'raw': None, 'ok': False, 'error': err}
 
-    def extract_location(self, user_query: str) -> Dict:
-        """Use LLM to extract location information from user query"""
-        system_prompt = """You are a campus navigation assistant. Extract the location or building name from the user's query.
-Return ONLY a JSON object with these fields:
-- "location": the main location/building mentioned
-- "query_type": one of ["location", "directions", "hours", "info"]
-- "from_location": if asking for directions (optional)
-
-Examples:
-"Where is the library?" -> {"location": "library", "query_type": "location"}
-"How do I get from library to student center?" -> {"location": "student center", "from_location": "library", "query_type": "directions"}
-"What time does the gym close?" -> {"location": "gym", "query_type": "hours"}
-"""
-
-        response = self.query_llm(user_query, system_prompt)
-        text = response.get('text') if isinstance(response, dict) else str(response)
+    @staticmethod
+    def _parse_extraction(text: Optional[str]) -> Optional[Dict]:
+        """Pull the JSON object out of an extraction reply; None if there isn't one."""
+        if not text:
+            return None
         try:
-            # Extract JSON from response
             start = text.find('{')
             end = text.rfind('}') + 1
             if start != -1 and end > start:
-                return json.loads(text[start:end])
-            return {"location": "", "query_type": "info"}
+                parsed = json.loads(text[start:end])
+                return parsed if isinstance(parsed, dict) else None
         except Exception:
-            return {"location": "", "query_type": "info"}
+            pass
+        return None
+
+    def cached_extraction(self, user_query: str) -> Optional[Dict]:
+        """Local extraction of a simple question, if the answer cache has its answer."""
+        if not len(self.answer_cache):
+            return None
+        guess = TemplateBackend.extract(user_query)
+        if guess.get('confidence', 0) < 0.8 or not guess.get('location'):
+            return None
+        building = self.search_building(guess['location'])
+        from_building = self.search_building(guess['from_location']) if guess.get('from_location') else None
+        if not building or (guess.get('from_location') and not from_building):
+            return None
+        route = None
+        if from_building and guess.get('query_type') == 'directions':
+            route = self.get_route(from_building['id'], building['id'])
+        key = cache_key(guess, building, route, from_building)
+        if key is None or key not in self.answer_cache:
+            return None
+        metrics.incr('llm.extract.cached')
+        return guess
+
+    def extract_location(self, user_query: str, trace: Optional[RequestTrace] = None) -> Dict:
+        """Use LLM to extract location information from user query.
+
+        Runs on the router's extraction model and retries once on the escalation
+        model when the reply isn't valid JSON or reports low confidence.
+        """
+        if self.answer_mode == 'local':
+            # Simple phrasings ("where is X", "from X to Y") that resolve to known
+            # buildings don't need the LLM at all
+            local = TemplateBackend.extract(user_query)
+            if (local.get('confidence', 0) >= 0.8 and self.search_building(local['location'])
+                    and (not local.get('from_location') or self.search_building(local['from_location']))):
+                metrics.incr('llm.extract.local')
+                return local
+
+        system_prompt = EXTRACT_SYSTEM_PROMPT
+
+        response = self.query_llm(user_query, system_prompt, task='extract', trace=trace)
+        parsed = self._parse_extraction(response.get('text') if isinstance(response, dict) else str(response))
+
+        router = self.router
+        if router and response.get('ok') and router.should_escalate(parsed) \
+                and router.model_for('escalate') != router.model_for('extract'):
+            metrics.incr('llm.extract.escalations')
+            retry = self.query_llm(user_query, system_prompt, task='extract', trace=trace, stage='escalate')
+            escalated = self._parse_extraction(retry.get('text'))
+            if escalated and (not parsed or not router.should_escalate(escalated)):
+                parsed = escalated
+
+        return parsed or {"location": "", "query_type": "info"}
 
     def search_building(self, location_name: str) -> Optional[Dict]:
         """Search for building in database"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-
-        cursor.execute('''
-        SELECT * FROM buildings 
-        WHERE LOWER(name) LIKE ? OR LOWER(aliases) LIKE ?
-        ''', (f'%{location_name.lower()}%', f'%{location_name.lower()}%'))
-
-        row = cursor.fetchone()
-        conn.close()
+        with self.db.connection() as conn:
+            row = conn.execute('''
+            SELECT * FROM buildings 
+            WHERE LOWER(name) LIKE ? OR LOWER(aliases) LIKE ?
+            ''', (f'%{location_name.lower()}%', f'%{location_name.lower()}%')).fetchone()
 
         if row:
             return dict(row)
-        return None
+        # Misspelled names ("libary") miss the substring match; try the typo-tolerant resolver
+        match = self.building_resolver().best(location_name) if location_name.strip() else None
+        if match is None:
+            metrics.incr('resolver.misses')
+            return None
+        metrics.incr('resolver.fuzzy_hits')
+        return dict(self.catalog().building(match['id']))
+
+    def named_building(self, text: str) -> Optional[Dict]:
+        """The building a sentence names by name, alias, code or a close misspelling, if any."""
+        match = self.building_resolver().mentions(text)
+        return dict(self.catalog().building(match['id'])) if match else None
 
     def get_route(self, from_building_id: int, to_building_id: int) -> Optional[Dict]:
         """Get route between two buildings"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-
-        cursor.execute('''
-        SELECT * FROM routes 
-        WHERE from_building_id = ? AND to_building_id = ?
-        ''', (from_building_id, to_building_id))
+        with self.db.connection() as conn:
+            cursor = conn.cursor()
 
-        row = cursor.fetchone()
-
-        if not row:
             cursor.execute('''
             SELECT * FROM routes 
             WHERE from_building_id = ? AND to_building_id = ?
-            ''', (to_building_id, from_building_id))
+            ''', (from_building_id, to_building_id))
+
             row = cursor.fetchone()
 
-        conn.close()
+            if not row:
+                cursor.execute('''
+                SELECT * FROM routes 
+                WHERE from_building_id = ? AND to_building_id = ?
+                ''', (to_building_id, from_building_id))
+                row = cursor.fetchone()
 
         if row:
             return dict(row)
@@ -245,99 +445,174 @@ Examples:
 
     def get_pois(self, building_id: int) -> List[Dict]:
         """Get points of interest in a building"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-
-        cursor.execute('SELECT * FROM poi WHERE building_id = ?', (building_id,))
-        rows = cursor.fetchall()
-        conn.close()
+        with self.db.connection() as conn:
+            rows = conn.execute('SELECT * FROM poi WHERE building_id = ?', (building_id,)).fetchall()
 
         return [dict(row) for row in rows]
 
     def generate_response(self, query_data: Dict, building_data: Optional[Dict], 
-                         route_data: Optional[Dict] = None, from_building: Optional[Dict] = None) -> str:
-        """Use LLM to generate natural language response"""
-
-        if not building_data:
-            system_prompt = "You are a helpful campus navigation assistant."
-            prompt = f"The user asked: '{query_data.get('original_query', '')}'. We couldn't find that location on campus. Apologize politely and ask if they meant something else or if they'd like to see all available locations."
-            resp = self.query_llm(prompt, system_prompt)
-            return resp.get('text') if isinstance(resp, dict) else str(resp)
-
-        context = f"""Building Information:
-Name: {building_data['name']}
-Description: {building_data['description']}
-Address: {building_data['address']}
-Hours: {building_data.get('building_hours')}
-"""
-
-        if route_data:
-            context += f"""
-
-Route Information:
-From: {from_building['name']}
-To: {building_data['name']}
-Distance: {route_data.get('distance_meters')} meters
-Walking Time: {route_data.get('walk_time_minutes')} minutes
-Directions: {route_data.get('route_description')}
-"""
-
-        system_prompt = """You are a friendly campus navigation assistant. Provide helpful, conversational responses about campus locations.
-- Be concise but informative (2-3 sentences max)
-- Use natural language
-- Include relevant details like hours and directions
-- Be encouraging and helpful"""
-
-        query_type = query_data.get('query_type', 'info')
-        original_query = query_data.get('original_query', '')
-
-        if query_type == "hours":
-            prompt = f"The user asked: '{original_query}'. Tell them the hours for {building_data['name']} in a friendly way. Hours: {building_data.get('building_hours')}"
-        elif query_type == "directions" and route_data:
-            prompt = f"The user asked: '{original_query}'. Give them clear walking directions from {from_building['name']} to {building_data['name']}. Use this info: {context}"
+                         route_data: Optional[Dict] = None, from_building: Optional[Dict] = None,
+                         trace: Optional[RequestTrace] = None, pois: Optional[List[Dict]] = None) -> str:
+        """Generate the natural language response.
+
+        Depending on CAMPUS_ANSWER_MODE the answer comes from the local renderer
+        (local), a locally drafted answer rephrased by the LLM (polish), or the
+        LLM with the local renderer as fallback (fallback/llm). LLM prompts only
+        carry the facts the query_type needs and are trimmed to what is left of
+        the request's token budget (see prompts.py).
+        """
+        mode = self.answer_mode
+        local = None
+        if mode in ('local', 'polish'):
+            local = self.renderer.render(query_data, building_data, route_data, from_building, pois)
+            if local is not None and mode == 'local':
+                metrics.incr('answer.local')
+                if trace is not None:
+                    trace.answer_source = 'template'
+                return local
+
+        if local is not None:
+            system_prompt, prompt, meta = build_polish_prompt(query_data, local)
         else:
-            prompt = f"The user asked: '{original_query}'. Tell them about {building_data['name']} location and what's there. Use this info: {context}"
-
-        resp = self.query_llm(prompt, system_prompt)
+            max_tokens = None
+            if trace is not None:
+                used = trace.total_tokens()
+                max_tokens = max(MIN_ANSWER_PROMPT_TOKENS,
+                                 request_token_budget() - used['prompt_tokens'] - used['completion_tokens'])
+            related = self.retrieve(query_data, building_data, route_data, trace=trace)
+            system_prompt, prompt, meta = build_answer_prompt(query_data, building_data, route_data, from_building,
+                                                              max_tokens=max_tokens, related=related)
+            if meta['dropped']:
+                metrics.incr('prompt.trimmed')
+            if trace is not None and trace.retrieval is not None:
+                # Context size: passages that fit the budget and the prompt they ended up in
+                trace.retrieval['used'] = meta['related']
+                trace.retrieval['prompt_tokens_est'] = meta['prompt_tokens_est']
+                metrics.observe('retrieval.passages', meta['related'])
+                metrics.observe('retrieval.prompt_tokens', meta['prompt_tokens_est'])
+
+        resp = self.query_llm(prompt, system_prompt, task='answer', trace=trace)
+        if not resp.get('ok') and mode != 'llm':
+            # LLM unavailable: the local renderer gives a better answer than a generic apology
+            local = local or self.renderer.render(query_data, building_data, route_data, from_building, pois)
+            if local is not None:
+                metrics.incr('answer.local_fallback')
+                if trace is not None:
+                    trace.answer_source = 'template'
+                return local
         return resp.get('text') if isinstance(resp, dict) else str(resp)
 
-    def process_query(self, user_query: str, debug: bool = False) -> Dict:
-        """Main function to process user query"""
-        print(f"Processing query: {user_query}", file=sys.stderr)
-
-        # Extract location from query
-        query_data = self.extract_location(user_query)
-        query_data['original_query'] = user_query
-
-        print(f"Extracted data: {query_data}", file=sys.stderr)
-
-        location = query_data.get('location', '')
-        from_location = query_data.get('from_location', '')
+    def _session_key(self, session_id: str) -> str:
+        # Campuses share one session store; a session only carries over within its campus
+        return f"{self.campus}:{session_id}" if self.campus else session_id
 
-        # Search for building
-        building_data = self.search_building(location)
-        from_building = self.search_building(from_location) if from_location else None
+    def process_query(self, user_query: str, debug: bool = False,
+                      near: Optional[Tuple[float, float]] = None, session_id: Optional[str] = None) -> Dict:
+        """Main function to process user query.
 
-        # Get route if needed
-        route_data = None
-        if building_data and from_building and query_data['query_type'] == 'directions':
-            route_data = self.get_route(from_building['id'], building_data['id'])
+        `near` is the user's (lat, lng), used to rank places for category questions.
+        With a `session_id`, follow-ups ("when does it close?") are resolved
+        against the session's previous turn before falling back to the LLM.
+        Each query is appended to the query log when one is configured.
+        """
+        print(f"Processing query: {user_query}", file=sys.stderr)
+        started = time.perf_counter()
+        timings = {}
+        cache_hits = {}
 
-        # Get POIs
-        pois = []
-        if building_data:
-            pois = self.get_pois(building_data['id'])
+        # LLM calls for this request are carried here, never on shared state
+        request_id = uuid.uuid4().hex
+        trace = RequestTrace(request_id)
+
+        # Category questions ("where can I get food?") are answered from the POI index
+        category = self.find_category(user_query, near)
+        open_now = None
+        if category is not None:
+            poi_type, pois = category
+            query_data = {'location': '', 'query_type': 'category', 'poi_type': poi_type,
+                          'original_query': user_query}
+            building_data = from_building = route_data = None
+            response_text = self.renderer.render_category(poi_type, pois, user_query)
+            trace.answer_source = 'template'
+            metrics.incr('answer.category')
+            path = 'category'
+            timings['answer'] = (time.perf_counter() - started) * 1000
+        else:
+            # Resolve follow-ups from the session, otherwise extract location from query
+            query_data = resolve_followup(user_query, self.sessions.get(self._session_key(session_id)),
+                                          self.named_building) if session_id else None
+            if session_id:
+                cache_hits['session'] = query_data is not None
+            if query_data is not None:
+                metrics.incr('session.followups')
+                path = 'followup'
+            else:
+                # A precomputed answer for the question's obvious reading skips the LLM entirely
+                query_data = self.cached_extraction(user_query)
+                if query_data is not None:
+                    path = 'cached'
+                else:
+                    query_data = self.extract_location(user_query, trace=trace)
+                    path = 'llm' if trace.last('extract') else 'local'
+            query_data['original_query'] = user_query
+            stage_started = time.perf_counter()
+            timings['extract'] = (stage_started - started) * 1000
+
+            print(f"Extracted data: {query_data}", file=sys.stderr)
+
+            location = query_data.get('location', '')
+            from_location = query_data.get('from_location', '')
+            if from_location and PRONOUN_RE.fullmatch(from_location.strip()):
+                # An origin the session couldn't resolve ("from it"); LIKE would match any name containing it
+                from_location = ''
+
+            # Search for building
+            building_data = self.search_building(location)
+            from_building = self.search_building(from_location) if from_location else None
+
+            # Get route if needed
+            route_data = None
+            if building_data and from_building and query_data['query_type'] == 'directions':
+                route_data = self.get_route(from_building['id'], building_data['id'])
+
+            # Get POIs
+            pois = []
+            if building_data:
+                pois = self.get_pois(building_data['id'])
+
+            # Open/closed right now for hours questions, from the precompiled hours index
+            if building_data and query_data.get('query_type') in ('hours', 'info'):
+                open_now = self.open_index().status('building', building_data['id'], datetime.now())
+                query_data['open_now'] = open_now
+
+            answer_started = time.perf_counter()
+            timings['resolve'] = (answer_started - stage_started) * 1000
+
+            # Precomputed answer (see answer_cache.py), else generate one; the
+            # answer call is recorded on this request's trace
+            response_text = self.answer_cache.lookup(query_data, building_data, route_data, from_building)
+            if building_data:
+                cache_hits['answer_cache'] = response_text is not None
+            if response_text is not None:
+                trace.answer_source = 'cache'
+                if open_now is not None and query_data.get('query_type') == 'hours':
+                    response_text = f"{response_text.rstrip()} It's {describe_status(open_now)}."
+            else:
+                response_text = self.generate_response(query_data, building_data, route_data, from_building,
+                                                       trace=trace, pois=pois)
+            timings['answer'] = (time.perf_counter() - answer_started) * 1000
 
-        # Generate response (this will update self._last_llm with the final LLM result if any)
-        response_text = self.generate_response(query_data, building_data, route_data, from_building)
+        if session_id and building_data:
+            self.sessions.put(self._session_key(session_id), session_state(query_data, building_data, from_building))
 
         # Determine provenance
-        request_id = uuid.uuid4().hex
         timestamp = datetime.utcnow().isoformat() + 'Z'
 
-        llm_info = getattr(self, '_last_llm', None)
-        if llm_info and llm_info.get('ok'):
+        llm_info = trace.last('answer')
+        if trace.answer_source:
+            response_source = trace.answer_source
+            llm_info = None
+        elif llm_info and llm_info.get('ok'):
             response_source = 'llm'
         else:
             response_source = 'fallback'
@@ -348,16 +623,65 @@ Directions: {route_data.get('route_description')}
             'timestamp': timestamp,
             'response': response_text,
             'response_source': response_source,
-            'model': getattr(self, 'model_name', None),
+            'model': llm_info.get('model') if llm_info else (None if trace.answer_source else getattr(self, 'model_name', None)),
             'model_version': getattr(self, 'model_version', None),
             'building': building_data,
             'route': route_data,
             'pois': pois
         }
+        if open_now is not None:
+            result['open_now'] = open_now
+        if category is not None:
+            result['category'] = category[0]
+        if session_id:
+            result['session_id'] = session_id
 
         # Include raw llm payload only in debug mode
+        # Token usage for this request across all its LLM calls
+        usage = trace.total_tokens()
+        result['usage'] = usage
+        metrics.observe('llm.request.prompt_tokens', usage['prompt_tokens'])
+        metrics.observe('llm.request.completion_tokens', usage['completion_tokens'])
+
         if debug and llm_info and llm_info.get('raw'):
             result['llm_raw'] = llm_info.get('raw')
+        if debug:
+            result['llm_trace'] = trace.summary()
+
+        if trace.retrieval is not None:
+            # Part of the answer stage
+            timings['retrieve'] = trace.retrieval['ms']
+        timings['total'] = (time.perf_counter() - started) * 1000
+        timings = {stage: round(ms, 2) for stage, ms in timings.items()}
+        if debug:
+            result['timings_ms'] = timings
+            if trace.retrieval is not None:
+                result['retrieval'] = trace.retrieval
+        if self.query_log is not None:
+            self.query_log.record({
+                'ts': time.time(),
+                'request_id': request_id,
+                'campus': self.campus,
+                'query': user_query,
+                'normalized': normalize_query(user_query),
+                'near': list(near) if near else None,
+                'session_id': session_id,
+                'query_type': query_data.get('query_type'),
+                'location': query_data.get('location') or None,
+                'from_location': query_data.get('from_location') or None,
+                'building_id': building_data['id'] if building_data else None,
+                'from_building_id': from_building['id'] if from_building else None,
+                'route_id': route_data.get('id') if route_data else None,
+                'resolved': bool(building_data or (category is not None and pois)),
+                'path': path,
+                'response_source': response_source,
+                'model': result['model'],
+                'llm_calls': len(trace.calls),
+                'tokens': usage,
+                'cache': cache_hits,
+                'timings_ms': timings,
+                'retrieval': trace.retrieval,
+            })
 
         return result
 
@@ -0,0 +1,212 @@
+"""
+Multi-campus hosting: one database, catalog and set of indexes per campus.
+
+With CAMPUS_CAMPUSES_DIR set, every sub-directory that holds a
+campus_navigator.db is a campus named after the directory:
+
+    campuses/
+        mona/campus_navigator.db
+        western/campus_navigator.db
+
+A request picks its campus with a path prefix (/api/mona/buildings) or the
+X-Campus-Id header. CampusRouter strips the prefix, so the API's routes don't
+change. Requests without a campus are served from CAMPUS_DB_PATH as before.
+
+CampusRegistry creates a campus's navigator (connection pool, catalog and
+indexes) on that campus's first request. Campus navigators share the default
+navigator's LLM client, sessions and query log. Loaded campuses are kept in
+LRU order. Each time a campus is loaded, if their estimated memory is over
+CAMPUS_MEMORY_BUDGET_MB or there are more than CAMPUS_MAX_LOADED, the least
+recently used are dropped and loaded again on their next request. A campus's answer_cache.db sits next
+to its database, so leave CAMPUS_ANSWER_CACHE_DB unset.
+
+Configuration (environment):
+    CAMPUS_CAMPUSES_DIR        one sub-directory per campus          (default unset = single campus)
+    CAMPUS_MEMORY_BUDGET_MB    estimated memory for loaded campuses  (default 1024)
+    CAMPUS_MAX_LOADED          campuses loaded at once               (default 256)
+"""
+
+import os
+import re
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+from metrics import metrics
+
+CAMPUS_DB_FILENAME = 'campus_navigator.db'
+CAMPUS_HEADER = 'HTTP_X_CAMPUS_ID'
+# WSGI environ key carrying the request's campus to the Flask handlers
+ENVIRON_KEY = 'campus_navigator.campus'
+
+_NAME_RE = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$')
+
+# Bytes per catalog row as measured by benchmarks/model_memory.py, doubled for
+# the indexes derived from the rows (open-now, POI search, ...)
+ROW_BYTES = {'buildings': 700, 'pois': 400, 'routes': 450}
+INDEX_OVERHEAD = 2.0
+# Cached shortest-path entries (route_graph.py), per building per cached source
+PATH_ENTRY_BYTES = 250
+# Navigator, answer cache and idle connections of a campus before its catalog loads
+BASE_BYTES = 256 * 1024
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def estimate_bytes(navigator) -> int:
+    """Rough memory held by a navigator's catalog and what has been derived from it."""
+    catalog = navigator.catalog_cache.peek()
+    if catalog is None:
+        return BASE_BYTES
+    rows = (len(catalog.buildings) * ROW_BYTES['buildings'] + len(catalog.pois) * ROW_BYTES['pois']
+            + len(catalog.routes) * ROW_BYTES['routes'])
+    total = BASE_BYTES + int(rows * INDEX_OVERHEAD)
+    graph = catalog.peek('route_graph')
+    if graph is not None:
+        total += graph.cached_sources() * len(catalog.buildings) * PATH_ENTRY_BYTES
+    bundle = catalog.peek('map_bundle')
+    if bundle is not None:
+        total += len(bundle.body) + len(bundle.gzipped)
+    return total
+
+
+class CampusRegistry:
+    """Lazily loaded navigators per campus, evicted LRU under a memory budget."""
+
+    def __init__(self, root: str, default, memory_budget_bytes: int = 1024 * 1024 * 1024,
+                 max_loaded: int = 256):
+        self.root = os.path.abspath(root)
+        # Requests without a campus; campus navigators share its LLM client and stores
+        self.default = default
+        self.memory_budget_bytes = memory_budget_bytes
+        self.max_loaded = max(1, max_loaded)
+        self.loads = 0
+        self.evictions = 0
+        self._loaded: 'OrderedDict[str, object]' = OrderedDict()
+        self._lock = threading.Lock()
+        metrics.register_collector('campuses', self.snapshot)
+
+    @classmethod
+    def from_env(cls, default) -> Optional['CampusRegistry']:
+        """A registry for CAMPUS_CAMPUSES_DIR, or None when hosting a single campus."""
+        root = os.environ.get('CAMPUS_CAMPUSES_DIR', '').strip()
+        if not root:
+            return None
+        return cls(
+            root,
+            default,
+            memory_budget_bytes=int(_env_number('CAMPUS_MEMORY_BUDGET_MB', 1024) * 1024 * 1024),
+            max_loaded=int(_env_number('CAMPUS_MAX_LOADED', 256)),
+        )
+
+    def db_path(self, campus: str) -> Optional[str]:
+        """The campus's database file, or None for an unknown (or invalid) campus name."""
+        if not campus or not _NAME_RE.match(campus):
+            return None
+        path = os.path.join(self.root, campus, CAMPUS_DB_FILENAME)
+        return path if os.path.isfile(path) else None
+
+    def exists(self, campus: str) -> bool:
+        return campus in self._loaded or self.db_path(campus) is not None
+
+    def navigator(self, campus: str):
+        """The campus's navigator, loading it (and evicting others) as needed; KeyError if unknown."""
+        with self._lock:
+            navigator = self._loaded.get(campus)
+            if navigator is not None:
+                # Only loads add memory worth checking; hits just refresh the LRU order
+                self._loaded.move_to_end(campus)
+                return navigator
+        path = self.db_path(campus)
+        if path is None:
+            raise KeyError(campus)
+        navigator = type(self.default)(path, campus=campus, shared=self.default)
+        # Load the catalog now so the memory estimate below includes it
+        navigator.catalog()
+        with self._lock:
+            existing = self._loaded.get(campus)
+            if existing is not None:
+                # Another thread loaded it first
+                navigator.db.close()
+                return existing
+            self._loaded[campus] = navigator
+            self.loads += 1
+            metrics.incr('campus.loads')
+            self._evict(keep=campus)
+        return navigator
+
+    def _evict(self, keep: str):
+        # Called with the lock held
+        estimated = {name: estimate_bytes(nav) for name, nav in self._loaded.items()}
+        total = sum(estimated.values())
+        for name in list(self._loaded):
+            if len(self._loaded) <= 1 or (len(self._loaded) <= self.max_loaded
+                                          and total <= self.memory_budget_bytes):
+                break
+            if name == keep:
+                continue
+            # Requests still using it keep their references; the pool closes as they finish
+            self._loaded.pop(name).db.close()
+            total -= estimated[name]
+            self.evictions += 1
+            metrics.incr('campus.evictions')
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            loaded = {name: estimate_bytes(nav) for name, nav in self._loaded.items()}
+        return {
+            'root': self.root,
+            'loaded': list(loaded),
+            'estimated_mb': round(sum(loaded.values()) / 1e6, 1),
+            'memory_budget_mb': round(self.memory_budget_bytes / 1e6, 1),
+            'max_loaded': self.max_loaded,
+            'loads': self.loads,
+            'evictions': self.evictions,
+        }
+
+
+class CampusRouter:
+    """WSGI middleware mapping /api/<campus>/... and X-Campus-Id onto the API's routes."""
+
+    def __init__(self, wsgi_app, registry: CampusRegistry, reserved: Iterable[str] = ()):
+        self.wsgi_app = wsgi_app
+        self.registry = registry
+        # First path segments of the API's own routes; never read as campus names
+        self.reserved = frozenset(reserved)
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        campus = None
+        if path.startswith('/api/'):
+            segment, slash, rest = path[len('/api/'):].partition('/')
+            if segment and segment not in self.reserved and self.registry.exists(segment):
+                campus = segment
+                environ['PATH_INFO'] = '/api' + slash + rest
+        if campus is None and path.startswith('/api'):
+            header = environ.get(CAMPUS_HEADER, '').strip()
+            if header:
+                if not self.registry.exists(header):
+                    body = json.dumps({'success': False, 'error': f"Unknown campus '{header}'"}).encode('utf-8')
+                    start_response('404 Not Found', [('Content-Type', 'application/json'),
+                                                     ('Content-Length', str(len(body)))])
+                    return [body]
+                campus = header
+        environ[ENVIRON_KEY] = campus
+        return self.wsgi_app(environ, start_response)
+
+
+def install_campus_router(app) -> Optional[CampusRegistry]:
+    """Serve the campuses under CAMPUS_CAMPUSES_DIR; returns the registry, or None if not configured."""
+    registry = CampusRegistry.from_env(app.extensions['campus_navigator'])
+    if registry is None:
+        return None
+    reserved = {rule.rule.split('/')[2] for rule in app.url_map.iter_rules()
+                if rule.rule.startswith('/api/')}
+    app.wsgi_app = CampusRouter(app.wsgi_app, registry, reserved)
+    return registry
@@ -0,0 +1,196 @@
+"""
+In-memory snapshot of the campus database.
+
+A Catalog holds every building, POI and route row loaded once from SQLite as
+slotted row models (models.py), plus a `version` string that changes whenever the database file changes.
+Indexes derived from the data (open-now, POI search, ...) are built lazily
+with `catalog.derived(name, factory)` and live exactly as long as the snapshot,
+so they never go stale.
+
+CatalogCache hands out the current snapshot and refreshes it when the database
+file's mtime/size changes. Edits logged by changes.py are applied to a copy
+of the current snapshot (Catalog.apply), which keeps the unchanged rows and
+updates derived indexes in place of rebuilding them; anything else, including
+a replaced file or altered tables, reloads the whole database.
+"""
+
+import os
+import sqlite3
+import threading
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from changes import changes_since, current_version, row_from_change
+from metrics import metrics
+from models import POI, Building, Route
+
+# Above this many logged changes a full reload is cheaper than applying them
+MAX_INCREMENTAL_CHANGES = 5000
+
+
+def _db_version(db_path: str) -> str:
+    try:
+        stat = os.stat(db_path)
+    except OSError:
+        return 'missing'
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+def _db_origin(conn: sqlite3.Connection, db_path: str) -> Tuple[int, int, int]:
+    """(device, inode, schema version): changes when the file is replaced or its tables are altered."""
+    schema = conn.execute('PRAGMA schema_version').fetchone()[0]
+    try:
+        stat = os.stat(db_path)
+    except OSError:
+        return (0, 0, schema)
+    return (stat.st_dev, stat.st_ino, schema)
+
+
+class Catalog:
+    """Immutable snapshot of buildings, POIs and routes."""
+
+    def __init__(self, buildings: Dict[int, Building], pois: Dict[int, POI], routes: List[Route], version: str,
+                 change_version: int = 0, origin: Tuple[int, int, int] = (0, 0, 0)):
+        self.buildings = buildings
+        self.pois = pois
+        self.routes = routes
+        self.version = version
+        # Last entry of the changes log (changes.py) included in this snapshot
+        self.change_version = change_version
+        # File and schema the rows were read from; the changes log only applies while they are the same
+        self.origin = origin
+        self.pois_by_building: Dict[int, List[POI]] = {}
+        for poi in pois.values():
+            self.pois_by_building.setdefault(poi.building_id, []).append(poi)
+        self._derived: Dict[str, object] = {}
+        self._derived_lock = threading.Lock()
+
+    @classmethod
+    def load(cls, db_path: str) -> 'Catalog':
+        version = _db_version(db_path)
+        conn = sqlite3.connect(db_path)
+        try:
+            # One read transaction, so the rows and the change version agree
+            conn.execute('BEGIN')
+            origin = _db_origin(conn, db_path)
+            change_version = current_version(conn)
+            buildings = {row[0]: Building(*row) for row in conn.execute(Building.select_sql('ORDER BY id'))}
+            pois = {row[0]: POI(*row) for row in conn.execute(POI.select_sql('ORDER BY id'))}
+            routes = [Route(*row) for row in conn.execute(Route.select_sql('ORDER BY id'))]
+        finally:
+            conn.close()
+        return cls(buildings, pois, routes, version, change_version, origin)
+
+    def apply(self, changes: List[Dict], version: str) -> 'Catalog':
+        """A new snapshot with logged changes (changes.changes_since) applied.
+
+        Rows that didn't change are shared with this snapshot. Derived
+        structures with an `updated(catalog, changed)` method are carried over
+        through it, touching only the changed ids; the others are rebuilt on
+        first use.
+        """
+        touched = {change['entity'] for change in changes}
+        buildings = dict(self.buildings) if 'building' in touched else self.buildings
+        pois = dict(self.pois) if 'poi' in touched else self.pois
+        routes = {route.id: route for route in self.routes} if 'route' in touched else None
+        tables = {'building': buildings, 'poi': pois, 'route': routes}
+        changed: Dict[str, Set[int]] = {entity: set() for entity in tables}
+        for change in changes:
+            rows = tables[change['entity']]
+            if change['op'] == 'delete':
+                rows.pop(change['entity_id'], None)
+            else:
+                rows[change['entity_id']] = row_from_change(change)
+            changed[change['entity']].add(change['entity_id'])
+        route_list = sorted(routes.values(), key=lambda r: r.id) if routes is not None else self.routes
+        catalog = Catalog(buildings, pois, route_list, version, changes[-1]['version'], self.origin)
+        # Insertion order puts a structure after the ones it is built on (route_graph before reachability)
+        for name, value in self._derived.items():
+            if name in catalog._derived:
+                continue
+            updated = getattr(value, 'updated', None)
+            value = updated(catalog, changed) if updated else None
+            if value is not None:
+                catalog._derived[name] = value
+        return catalog
+
+    def derived(self, name: str, factory: Callable[['Catalog'], object]):
+        """Build (once) and return a structure derived from this snapshot."""
+        value = self._derived.get(name)
+        if value is None:
+            with self._derived_lock:
+                value = self._derived.get(name)
+                if value is None:
+                    value = factory(self)
+                    self._derived[name] = value
+        return value
+
+    def peek(self, name: str):
+        """The derived structure `name` if it has been built, else None (never builds it)."""
+        return self._derived.get(name)
+
+    def building(self, building_id: int) -> Optional[Building]:
+        return self.buildings.get(building_id)
+
+
+def _row_counts(conn: sqlite3.Connection) -> Tuple[int, int, int]:
+    return tuple(conn.execute(f"SELECT COUNT(*) FROM {model.TABLE}").fetchone()[0]
+                 for model in (Building, POI, Route))
+
+
+class CatalogCache:
+    """Current Catalog for a database file, reloaded when the file changes."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._catalog: Optional[Catalog] = None
+        self._lock = threading.Lock()
+        # How the snapshot was last refreshed: 'load' or 'incremental'
+        self.last_refresh: Optional[str] = None
+
+    def get(self) -> Catalog:
+        catalog = self._catalog
+        if catalog is not None and catalog.version == _db_version(self.db_path):
+            return catalog
+        with self._lock:
+            catalog = self._catalog
+            if catalog is None or catalog.version != _db_version(self.db_path):
+                catalog = self._refresh(catalog)
+                self._catalog = catalog
+        return catalog
+
+    def _refresh(self, current: Optional[Catalog]) -> Catalog:
+        """Apply the logged changes to `current` when they account for the new file, else reload."""
+        if current is not None:
+            version = _db_version(self.db_path)
+            conn = sqlite3.connect(self.db_path)
+            try:
+                conn.execute('BEGIN')
+                origin = _db_origin(conn, self.db_path)
+                changes = changes_since(conn, current.change_version, MAX_INCREMENTAL_CHANGES + 1)
+                counts = _row_counts(conn)
+            finally:
+                conn.close()
+            # A replaced file or altered schema makes the log's versions meaningless for this snapshot
+            if origin == current.origin and changes and len(changes) <= MAX_INCREMENTAL_CHANGES:
+                catalog = current.apply(changes, version)
+                # Rows added or removed outside the log show up as a count mismatch
+                if (len(catalog.buildings), len(catalog.pois), len(catalog.routes)) == counts:
+                    metrics.incr('catalog.incremental_updates')
+                    self.last_refresh = 'incremental'
+                    return catalog
+        metrics.incr('catalog.reloads')
+        self.last_refresh = 'load'
+        return Catalog.load(self.db_path)
+
+    def peek(self) -> Optional[Catalog]:
+        """The snapshot loaded so far, without loading or reloading it."""
+        return self._catalog
+
+    def stale(self) -> bool:
+        """Whether the database file changed since the current snapshot was loaded."""
+        catalog = self._catalog
+        return catalog is None or catalog.version != _db_version(self.db_path)
+
+    def invalidate(self):
+        with self._lock:
+            self._catalog = None
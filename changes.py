@@ -0,0 +1,203 @@
+"""
+Admin edits to the campus database, logged for delta sync.
+
+upsert() and delete() write a building, POI or route and, in the same
+transaction, append one row per changed record to the `changes` table:
+
+    version     INTEGER PRIMARY KEY AUTOINCREMENT   (never reused, so always increasing)
+    entity      'building' | 'poi' | 'route'
+    entity_id   id of the changed row
+    op          'upsert' | 'delete'
+    data        the row as JSON after an upsert, NULL for a delete
+    changed_at  ISO timestamp
+
+Deleting a building also deletes its POIs and the routes touching it, each
+logged as its own change.
+
+Clients remember the highest version they have seen and fetch what came after
+it with GET /api/changes?since=<version> (changes_since) instead of reloading
+/api/buildings.
+
+The log also keeps the server's snapshot current. When the database file
+changes, CatalogCache (catalog.py) applies the changes after its snapshot's
+`change_version` to a copy of the snapshot, so only the changed rows and the
+index entries built from them are touched. Edits that bypass the log
+(campus_db_setup.py, a SQL shell) cause a full reload when the log has nothing
+new or the row counts don't add up. Restart after editing rows in place by
+hand while admin edits are also being made.
+"""
+
+import json
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from models import POI, Building, Route, Row
+
+ENTITIES = {'building': Building, 'poi': POI, 'route': Route}
+# Columns stored as JSON text; dicts and lists are encoded on the way in
+JSON_FIELDS = ('building_hours', 'hours', 'waypoints')
+# Columns that must be set on every row
+REQUIRED = {
+    'building': ('name',),
+    'poi': ('name', 'building_id'),
+    'route': ('from_building_id', 'to_building_id'),
+}
+
+SCHEMA_SQL = '''
+CREATE TABLE IF NOT EXISTS changes (
+    version INTEGER PRIMARY KEY AUTOINCREMENT,
+    entity TEXT NOT NULL,
+    entity_id INTEGER NOT NULL,
+    op TEXT NOT NULL,
+    data TEXT,
+    changed_at TEXT
+)
+'''
+
+
+class ChangeError(ValueError):
+    """An admin edit that can't be applied (unknown entity or field, missing reference, ...)."""
+
+
+class UnknownRowError(ChangeError):
+    """The row to delete doesn't exist."""
+
+
+def ensure_schema(conn: sqlite3.Connection):
+    conn.execute(SCHEMA_SQL)
+
+
+def current_version(conn: sqlite3.Connection) -> int:
+    """Highest logged change version, 0 when nothing has been logged."""
+    try:
+        row = conn.execute('SELECT MAX(version) FROM changes').fetchone()
+    except sqlite3.OperationalError:
+        # No changes table yet
+        return 0
+    return row[0] or 0
+
+
+def _model(entity: str):
+    model = ENTITIES.get(entity)
+    if model is None:
+        raise ChangeError(f"Unknown entity '{entity}' (expected one of: {', '.join(ENTITIES)})")
+    return model
+
+
+def _column_values(model, data: Dict[str, Any]) -> Dict[str, Any]:
+    unknown = sorted(set(data) - set(model.FIELDS))
+    if unknown:
+        raise ChangeError(f"Unknown {model.TABLE} field(s): {', '.join(unknown)}")
+    values = {}
+    for name, value in data.items():
+        if name in JSON_FIELDS and isinstance(value, (dict, list)):
+            value = json.dumps(value)
+        elif name == 'aliases' and isinstance(value, list):
+            value = ', '.join(str(alias) for alias in value)
+        values[name] = value
+    return values
+
+
+def _check_references(conn: sqlite3.Connection, entity: str, row: Dict[str, Any]):
+    for name in REQUIRED[entity]:
+        if row.get(name) in (None, ''):
+            raise ChangeError(f"'{name}' is required")
+    for name in ('building_id', 'from_building_id', 'to_building_id'):
+        if name in row and conn.execute('SELECT 1 FROM buildings WHERE id = ?', (row[name],)).fetchone() is None:
+            raise ChangeError(f"{name} {row[name]} is not a building")
+
+
+def _log(conn: sqlite3.Connection, entity: str, entity_id: int, op: str, data: Optional[Dict]) -> int:
+    cursor = conn.execute(
+        'INSERT INTO changes (entity, entity_id, op, data, changed_at) VALUES (?, ?, ?, ?, ?)',
+        (entity, entity_id, op, json.dumps(data) if data is not None else None,
+         datetime.now().isoformat(timespec='seconds')))
+    return cursor.lastrowid
+
+
+def upsert(conn: sqlite3.Connection, entity: str, data: Dict[str, Any]) -> Tuple[Dict, int]:
+    """Insert a row, or update the given fields of row `data['id']`; returns (row, change version)."""
+    model = _model(entity)
+    values = _column_values(model, data)
+    row_id = values.pop('id', None)
+    ensure_schema(conn)
+    # Take the write lock up front so the existence checks hold until commit
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        existing = None
+        if row_id is not None:
+            existing = conn.execute(model.select_sql('WHERE id = ?'), (row_id,)).fetchone()
+        row = dict(zip(model.FIELDS, existing)) if existing else {name: None for name in model.FIELDS}
+        row.update(values)
+        _check_references(conn, entity, row)
+        if existing:
+            if not values:
+                raise ChangeError("No fields to update")
+            assignments = ', '.join(f"{name} = ?" for name in values)
+            conn.execute(f"UPDATE {model.TABLE} SET {assignments} WHERE id = ?", (*values.values(), row_id))
+        else:
+            if row_id is not None:
+                values['id'] = row_id
+            columns = ', '.join(values)
+            placeholders = ', '.join('?' for _ in values)
+            cursor = conn.execute(f"INSERT INTO {model.TABLE} ({columns}) VALUES ({placeholders})",
+                                  tuple(values.values()))
+            row_id = cursor.lastrowid
+        stored = dict(zip(model.FIELDS, conn.execute(model.select_sql('WHERE id = ?'), (row_id,)).fetchone()))
+        version = _log(conn, entity, row_id, 'upsert', stored)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return stored, version
+
+
+def delete(conn: sqlite3.Connection, entity: str, row_id: int) -> Tuple[List[Dict], int]:
+    """Delete a row (a building with its POIs and routes); returns (deleted rows, last change version)."""
+    model = _model(entity)
+    ensure_schema(conn)
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        if conn.execute(f"SELECT 1 FROM {model.TABLE} WHERE id = ?", (row_id,)).fetchone() is None:
+            raise UnknownRowError(f"No {entity} with id {row_id}")
+        doomed = [(entity, row_id)]
+        if entity == 'building':
+            doomed += [('poi', r[0]) for r in conn.execute('SELECT id FROM poi WHERE building_id = ?', (row_id,))]
+            doomed += [('route', r[0]) for r in conn.execute(
+                'SELECT id FROM routes WHERE from_building_id = ? OR to_building_id = ?', (row_id, row_id))]
+        # Dependants first, so the log never refers to a building that is already gone
+        version = 0
+        for kind, kind_id in reversed(doomed):
+            conn.execute(f"DELETE FROM {ENTITIES[kind].TABLE} WHERE id = ?", (kind_id,))
+            version = _log(conn, kind, kind_id, 'delete', None)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return [{'entity': kind, 'id': kind_id} for kind, kind_id in doomed], version
+
+
+def changes_since(conn: sqlite3.Connection, since: int, limit: int) -> List[Dict]:
+    """Logged changes with version > since, oldest first, at most `limit`."""
+    try:
+        rows = conn.execute(
+            'SELECT version, entity, entity_id, op, data, changed_at FROM changes '
+            'WHERE version > ? ORDER BY version LIMIT ?', (since, limit)).fetchall()
+    except sqlite3.OperationalError:
+        return []
+    return [{
+        'version': version,
+        'entity': entity,
+        'entity_id': entity_id,
+        'op': op,
+        'data': json.loads(data) if data else None,
+        'changed_at': changed_at,
+    } for version, entity, entity_id, op, data, changed_at in rows]
+
+
+def row_from_change(change: Dict) -> Row:
+    """The row model an upsert change describes."""
+    model = ENTITIES[change['entity']]
+    data = change['data'] or {}
+    return model(*(data.get(name) for name in model.FIELDS))
@@ -0,0 +1,71 @@
+"""
+Small pool of SQLite connections for one database file.
+
+SQL lookups (search_building, get_route, ...) used to open and close a
+connection per call. Each navigator, i.e. each campus, now keeps up to
+`size` idle connections for its database and hands them out one request at a
+time:
+
+    with navigator.db.connection() as conn:
+        conn.execute(...)
+
+Connections are made with check_same_thread=False because they move between
+request threads, but a connection is only ever used by one thread at a time.
+A pool is bound to the process that created its connections, so a forked
+worker starts with an empty pool.
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+DEFAULT_POOL_SIZE = 8
+
+
+class SQLitePool:
+    def __init__(self, db_path: str, size: int = DEFAULT_POOL_SIZE):
+        self.db_path = db_path
+        self.size = max(1, size)
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._pid = os.getpid()
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    # Connections inherited over fork() belong to the parent; drop them unclosed
+                    self._idle = queue.LifoQueue()
+                    self._pid = os.getpid()
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        except BaseException:
+            conn.close()
+            raise
+        if self._closed or self._idle.qsize() >= self.size:
+            conn.close()
+        else:
+            self._idle.put(conn)
+
+    def close(self):
+        """Close idle connections; connections in use are closed when returned."""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
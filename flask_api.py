@@ -3,13 +3,25 @@ Flask API for Campus Navigator Mobile App
 Alternative to PHP backend - pure Python solution
 """
 
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, Response, current_app, request, jsonify
 from flask_cors import CORS
-import sqlite3
 import json
 import sys
 import os
-import requests
+import hmac
+import hashlib
+from datetime import datetime
+
+from admission import install_rate_limiter
+from campuses import ENVIRON_KEY as CAMPUS_ENVIRON_KEY, install_campus_router
+from changes import ChangeError, UnknownRowError, changes_since, current_version
+from changes import delete as delete_row, upsert as upsert_row
+from metrics import metrics
+from models import Building
+from poi_index import parse_point
+from request_profiler import install_profiler
+from response_views import VIEWS, compact, parse_fields, select_fields
+from tour import TourError, UnreachableError, plan_tour
 
 # Import the navigator class (try Groq first, then generic)
 try:
@@ -22,16 +34,71 @@ except Exception:
             "Could not import CampusNavigator. Make sure one of: 'campus_navigator_groq.py' or 'campus_navigator.py' exists and is importable."
         )
 
-app = Flask(__name__)
-CORS(app)  # Enable CORS for mobile app
+# Default database and external service locations (overridable for benchmarks/deployments)
+DB_PATH = os.environ.get('CAMPUS_DB_PATH', 'campus_navigator.db')
+DIRECTIONS_URL = os.environ.get('GOOGLE_DIRECTIONS_URL', 'https://maps.googleapis.com/maps/api/directions/json')
 
-# Initialize navigator
-navigator = CampusNavigator()
+api = Blueprint('api', __name__)
 
-# DEBUG: Starting Flask API module
-print("DEBUG: Flask API module starting...")
+# Lowest resolver score /api/search lists as a suggestion when nothing matches exactly
+FUZZY_SEARCH_MIN_SCORE = 0.5
 
-@app.route('/api', methods=['POST', 'OPTIONS'])
+
+def _env_flag(name: str) -> bool:
+    return os.environ.get(name, '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def create_app(config: dict = None) -> Flask:
+    """Build the Flask app.
+
+    Construction is cheap: the navigator creates its LLM client on first use.
+    Set CAMPUS_WARMUP=1 (or config['CAMPUS_WARMUP']) to initialize the LLM
+    client and open the database before the first request instead.
+    """
+    app = Flask(__name__)
+    app.config.update(
+        CAMPUS_DB_PATH=DB_PATH,
+        GOOGLE_DIRECTIONS_URL=DIRECTIONS_URL,
+        CAMPUS_WARMUP=_env_flag('CAMPUS_WARMUP'),
+    )
+    if config:
+        app.config.update(config)
+
+    CORS(app)  # Enable CORS for mobile app
+    app.register_blueprint(api)
+
+    app.extensions['campus_navigator'] = CampusNavigator(app.config['CAMPUS_DB_PATH'])
+    # Optional per-request profiling (no-op unless CAMPUS_PROFILE_ENABLED is set)
+    app.extensions['campus_profiler'] = install_profiler(app)
+    # Optional per-client token-bucket rate limit (no-op unless CAMPUS_RATE_LIMIT_RPS is set)
+    app.extensions['campus_rate_limiter'] = install_rate_limiter(app)
+    # Optional per-campus databases under CAMPUS_CAMPUSES_DIR, picked by /api/<campus>/... or X-Campus-Id
+    app.extensions['campus_registry'] = install_campus_router(app)
+
+    if app.config['CAMPUS_WARMUP']:
+        app.extensions['campus_navigator'].warm_up()
+
+    return app
+
+
+def _navigator() -> CampusNavigator:
+    """The navigator for the request's campus (the default campus unless CampusRouter set one)."""
+    campus = request.environ.get(CAMPUS_ENVIRON_KEY)
+    if campus:
+        return current_app.extensions['campus_registry'].navigator(campus)
+    return current_app.extensions['campus_navigator']
+
+
+def __getattr__(name):
+    # `flask_api.app` is built on first access so importing this module stays cheap
+    if name == 'app':
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+@api.route('/api', methods=['POST', 'OPTIONS'])
 def process_query():
     """Handle chat queries from mobile app"""
     print("DEBUG: Received request on /api")
@@ -62,10 +129,30 @@ def process_query():
 
         # Process query; allow optional debug flag to include raw LLM payload
         debug_flag = bool(data.get('debug')) if isinstance(data, dict) else False
-        result = navigator.process_query(query, debug=debug_flag)
+        # Optional user position ("lat,lng" or {"lat": .., "lng": ..}) for nearest-place answers
+        near = parse_point(data.get('near'))
+        # Optional conversation id so follow-ups ("when does it close?") keep context
+        session_id = str(data.get('session_id') or request.headers.get('X-Session-Id') or '').strip() or None
+        # Optional reply shape: view=compact for cards instead of full rows, fields=a,b.c to pick keys
+        view = str(data.get('view') or request.args.get('view') or 'full').strip().lower()
+        if view not in VIEWS:
+            return jsonify({
+                'success': False,
+                'error': f"Unknown view '{view}' (use one of: {', '.join(VIEWS)})"
+            }), 400
+        fields = parse_fields(data.get('fields') or request.args.get('fields'))
+        result = _navigator().process_query(query, debug=debug_flag, near=near, session_id=session_id)
         print(f"DEBUG: Processed query result: {result}")
 
-        return jsonify(result), 200
+        if view == 'compact':
+            result = compact(result)
+        if fields:
+            result = select_fields(result, fields)
+        response = jsonify(result)
+        payload_bytes = len(response.get_data())
+        metrics.observe('api.chat.payload_bytes', payload_bytes)
+        metrics.observe(f"api.chat.payload_bytes.{'fields' if fields else view}", payload_bytes)
+        return response, 200
 
     except Exception as e:
         print(f"ERROR: Exception in /api processing: {str(e)}")
@@ -74,28 +161,20 @@ def process_query():
             'error': str(e)
         }), 500
 
-@app.route('/api/buildings', methods=['GET'])
+@api.route('/api/buildings', methods=['GET'])
 def get_buildings():
     """Get list of all buildings"""
     print("DEBUG: Received request on /api/buildings")
     try:
-        conn = sqlite3.connect('campus_navigator.db')
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, name, building_code, description, 
-                   latitude, longitude, address
-            FROM buildings 
-            ORDER BY name
-        ''')
-        
-        buildings = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        
+        catalog = _navigator().catalog()
+        buildings = [b.to_json(Building.SUMMARY_FIELDS)
+                     for b in sorted(catalog.buildings.values(), key=lambda b: (b.name, b.id))]
+
         return jsonify({
             'success': True,
-            'buildings': buildings
+            'buildings': buildings,
+            # Pass to /api/changes?since= to sync later edits
+            'version': catalog.change_version
         }), 200
         
     except Exception as e:
@@ -105,36 +184,35 @@ def get_buildings():
             'error': str(e)
         }), 500
 
-@app.route('/api/building/<int:building_id>', methods=['GET'])
+@api.route('/api/building/<int:building_id>', methods=['GET'])
 def get_building(building_id):
     """Get details of a specific building"""
     print(f"DEBUG: Received request on /api/building/{building_id}")
     try:
-        conn = sqlite3.connect('campus_navigator.db')
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM buildings WHERE id = ?', (building_id,))
-        building = cursor.fetchone()
-        
+        catalog = _navigator().catalog()
+        building = catalog.building(building_id)
+
         if not building:
-            conn.close()
             return jsonify({
                 'success': False,
                 'error': 'Building not found'
             }), 404
-        
+
         # Get POIs for this building
-        cursor.execute('SELECT * FROM poi WHERE building_id = ?', (building_id,))
-        pois = [dict(row) for row in cursor.fetchall()]
-        
-        conn.close()
-        
-        return jsonify({
+        pois = [poi.to_json() for poi in catalog.pois_by_building.get(building_id, [])]
+
+        response = jsonify({
             'success': True,
-            'building': dict(building),
+            'building': building.to_json(),
             'pois': pois
-        }), 200
+        })
+        # Compact chat replies link here; clients revalidate with If-None-Match and get 304 until it changes
+        etag = hashlib.sha1(response.get_data()).hexdigest()[:16]
+        headers = {'ETag': f'"{etag}"', 'Cache-Control': 'public, no-cache'}
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers=headers)
+        response.headers.update(headers)
+        return response, 200
         
     except Exception as e:
         print(f"ERROR: Exception in /api/building/<id> processing: {str(e)}")
@@ -143,7 +221,7 @@ def get_building(building_id):
             'error': str(e)
         }), 500
 
-@app.route('/api/route', methods=['POST'])
+@api.route('/api/route', methods=['POST'])
 def get_route():
     """Get route between two buildings"""
     print("DEBUG: Received request on /api/route")
@@ -161,7 +239,7 @@ def get_route():
         to_id = data['to_id']
         
         # Get route
-        route = navigator.get_route(from_id, to_id)
+        route = _navigator().get_route(from_id, to_id)
         print(f"DEBUG: Route found: {route}")
         
         if not route:
@@ -171,17 +249,14 @@ def get_route():
             }), 404
         
         # Get building details
-        conn = sqlite3.connect('campus_navigator.db')
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM buildings WHERE id = ?', (from_id,))
-        from_building = dict(cursor.fetchone())
-        
-        cursor.execute('SELECT * FROM buildings WHERE id = ?', (to_id,))
-        to_building = dict(cursor.fetchone())
-        
-        conn.close()
+        with _navigator().db.connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('SELECT * FROM buildings WHERE id = ?', (from_id,))
+            from_building = dict(cursor.fetchone())
+
+            cursor.execute('SELECT * FROM buildings WHERE id = ?', (to_id,))
+            to_building = dict(cursor.fetchone())
         
         return jsonify({
             'success': True,
@@ -197,7 +272,55 @@ def get_route():
             'error': str(e)
         }), 500
 
-@app.route('/api/search', methods=['GET'])
+@api.route('/api/tour', methods=['POST'])
+def tour():
+    """Quickest order to visit a set of buildings over the route graph.
+
+    Body: {"stops": [building ids], "start": id (optional, default first stop),
+    "round_trip": true to walk back to the start}
+    """
+    print("DEBUG: Received request on /api/tour")
+    try:
+        data = request.get_json(silent=True) or {}
+        stops = data.get('stops')
+        if not isinstance(stops, list) or not stops:
+            return jsonify({
+                'success': False,
+                'error': 'stops (a list of building ids) is required'
+            }), 400
+        try:
+            stop_ids = [int(s) for s in stops]
+            start = int(data['start']) if data.get('start') is not None else None
+        except (TypeError, ValueError):
+            return jsonify({
+                'success': False,
+                'error': 'Building ids must be integers'
+            }), 400
+
+        result = plan_tour(_navigator().route_graph(), stop_ids, start_id=start,
+                           round_trip=bool(data.get('round_trip')))
+        return jsonify({
+            'success': True,
+            'tour': result
+        }), 200
+    except UnreachableError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 404
+    except TourError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        print(f"ERROR: Exception in /api/tour processing: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@api.route('/api/search', methods=['GET'])
 def search_buildings():
     """Search buildings by name or alias"""
     print("DEBUG: Received request on /api/search")
@@ -211,22 +334,28 @@ def search_buildings():
                 'error': 'Search query is required'
             }), 400
         
-        conn = sqlite3.connect('campus_navigator.db')
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT * FROM buildings 
-            WHERE LOWER(name) LIKE ? OR LOWER(aliases) LIKE ?
-        ''', (f'%{query.lower()}%', f'%{query.lower()}%'))
-        
-        buildings = [dict(row) for row in cursor.fetchall()]
-        conn.close()
+        with _navigator().db.connection() as conn:
+            cursor = conn.execute('''
+                SELECT * FROM buildings 
+                WHERE LOWER(name) LIKE ? OR LOWER(aliases) LIKE ?
+            ''', (f'%{query.lower()}%', f'%{query.lower()}%'))
+
+            buildings = [dict(row) for row in cursor.fetchall()]
+
+        # No substring match: fall back to typo-tolerant candidates, best first, with their scores
+        fuzzy = not buildings
+        if fuzzy:
+            catalog = _navigator().catalog()
+            limit = max(1, min(request.args.get('limit', default=10, type=int), 50))
+            buildings = [dict(catalog.building(match['id']).to_json(), score=match['score'])
+                         for match in _navigator().building_resolver().resolve(query, limit=limit,
+                                                                             min_score=FUZZY_SEARCH_MIN_SCORE)]
         
         return jsonify({
             'success': True,
             'buildings': buildings,
-            'count': len(buildings)
+            'count': len(buildings),
+            'fuzzy': fuzzy
         }), 200
         
     except Exception as e:
@@ -236,7 +365,263 @@ def search_buildings():
             'error': str(e)
         }), 500
 
-@app.route('/api/directions', methods=['POST'])
+def _parse_at(value: str) -> datetime:
+    """`at` query param: ISO datetime ("2025-03-03T21:30") or a time today ("21:30")."""
+    if not value:
+        return datetime.now()
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        clock = datetime.strptime(value, '%H:%M')
+        return datetime.now().replace(hour=clock.hour, minute=clock.minute, second=0, microsecond=0)
+
+
+@api.route('/api/open-now', methods=['GET'])
+def open_now():
+    """Buildings and POIs open at a given time, soonest-closing first.
+
+    Query params: at - ISO datetime or HH:MM (default now),
+    type - 'building', 'poi' or a POI type such as 'dining',
+    closing_within - only places closing within this many minutes
+    """
+    try:
+        try:
+            at = _parse_at(request.args.get('at', '').strip())
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': "Invalid 'at' (use ISO datetime or HH:MM)"
+            }), 400
+        kind = request.args.get('type', '').strip() or None
+        closing_within = request.args.get('closing_within', type=int)
+
+        places = _navigator().open_index().open_at(at, kind=kind, closing_within=closing_within)
+        return jsonify({
+            'success': True,
+            'at': at.isoformat(timespec='minutes'),
+            'open': places,
+            'count': len(places)
+        }), 200
+    except Exception as e:
+        print(f"ERROR: Exception in /api/open-now processing: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@api.route('/api/poi', methods=['GET'])
+def search_pois():
+    """Search points of interest by type, name and floor/room.
+
+    Query params: type - POI type ('dining', 'computer_lab', ...), q - name words,
+    floor, room, near - "lat,lng" to rank by distance, limit (default 20)
+    """
+    try:
+        poi_type = request.args.get('type', '').strip() or None
+        q = request.args.get('q', '').strip() or None
+        floor = request.args.get('floor', '').strip() or None
+        room = request.args.get('room', '').strip() or None
+        near_arg = request.args.get('near', '').strip()
+        near = parse_point(near_arg)
+        if near_arg and near is None:
+            return jsonify({
+                'success': False,
+                'error': "Invalid 'near' (use lat,lng)"
+            }), 400
+        limit = max(1, min(request.args.get('limit', default=20, type=int), 200))
+
+        index = _navigator().poi_index()
+        pois = index.search(poi_type=poi_type, q=q, near=near, floor=floor, room=room, limit=limit)
+        return jsonify({
+            'success': True,
+            'pois': pois,
+            'count': len(pois),
+            'types': index.types()
+        }), 200
+    except Exception as e:
+        print(f"ERROR: Exception in /api/poi processing: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@api.route('/api/reachable', methods=['GET'])
+def reachable():
+    """Buildings and POIs reachable on foot from a building within N minutes.
+
+    Query params: from - building id, minutes - walking time (max 120),
+    polygon - 1 to include the isochrone outline for the map
+    """
+    try:
+        source = request.args.get('from', type=int)
+        minutes = request.args.get('minutes', type=float)
+        if source is None or minutes is None or minutes < 0:
+            return jsonify({
+                'success': False,
+                'error': "'from' (building id) and 'minutes' are required"
+            }), 400
+        polygon = request.args.get('polygon', '').strip().lower() in ('1', 'true', 'yes')
+
+        try:
+            result = _navigator().reachability().reachable(source, minutes, polygon=polygon)
+        except KeyError:
+            return jsonify({
+                'success': False,
+                'error': 'Building not found'
+            }), 404
+        result['success'] = True
+        return jsonify(result), 200
+    except Exception as e:
+        print(f"ERROR: Exception in /api/reachable processing: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@api.route('/api/map/bundle', methods=['GET'])
+def get_map_bundle():
+    """Buildings, POIs and routes as one GeoJSON FeatureCollection for the map.
+
+    Query params: v - bundle version (responses for the current version are
+    cached as immutable), z, x, y - only the features in that map tile
+    """
+    try:
+        bundle = _navigator().map_bundle()
+        tile = [request.args.get(name, type=int) for name in ('z', 'x', 'y')]
+        if any(value is not None for value in tile):
+            if any(value is None for value in tile):
+                return jsonify({
+                    'success': False,
+                    'error': 'z, x and y are required together'
+                }), 400
+            try:
+                body, gzipped = bundle.tile(*tile)
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                }), 400
+            etag = f"{bundle.version}-{'-'.join(map(str, tile))}"
+        else:
+            body, gzipped = bundle.body, bundle.gzipped
+            etag = bundle.version
+
+        # Versioned URLs never change content; unversioned ones revalidate with the ETag
+        if request.args.get('v') == bundle.version:
+            cache_control = 'public, max-age=31536000, immutable'
+        else:
+            cache_control = 'public, no-cache'
+        headers = {
+            'ETag': f'"{etag}"',
+            'Cache-Control': cache_control,
+            'Vary': 'Accept-Encoding',
+            'X-Map-Bundle-Version': bundle.version,
+        }
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers=headers)
+
+        if request.accept_encodings['gzip']:
+            headers['Content-Encoding'] = 'gzip'
+            body = gzipped
+        metrics.incr('map_bundle.served')
+        return Response(body, status=200, headers=headers, mimetype='application/geo+json')
+    except Exception as e:
+        print(f"ERROR: Exception in /api/map/bundle processing: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@api.route('/api/admin/<entity>', methods=['POST'])
+@api.route('/api/admin/<entity>/<int:row_id>', methods=['PUT', 'DELETE'])
+def admin_edit(entity, row_id=None):
+    """Insert, update or delete a building, poi or route and log it for /api/changes.
+
+    POST creates a row (or updates it when the body has an id), PUT updates
+    the given fields of row_id, DELETE removes it. Deleting a building also
+    deletes its POIs and routes.
+    """
+    print(f"DEBUG: Received {request.method} request on /api/admin/{entity}")
+    try:
+        # Not even localhost may edit without a token: behind a reverse proxy every client is local
+        if not _admin_token():
+            return jsonify({'success': False, 'error': 'Admin edits are disabled (CAMPUS_ADMIN_TOKEN is not set)'}), 404
+        if not _is_admin_request():
+            return jsonify({'success': False, 'error': 'Forbidden'}), 403
+
+        navigator = _navigator()
+        if request.method == 'DELETE':
+            with navigator.db.connection() as conn:
+                deleted, version = delete_row(conn, entity, row_id)
+            result = {'deleted': deleted}
+        else:
+            data = request.get_json(silent=True)
+            if not isinstance(data, dict):
+                return jsonify({
+                    'success': False,
+                    'error': 'A JSON object of fields is required'
+                }), 400
+            if row_id is not None:
+                data = dict(data, id=row_id)
+            with navigator.db.connection() as conn:
+                row, version = upsert_row(conn, entity, data)
+            result = {entity: row}
+        metrics.incr(f"admin.{request.method.lower()}")
+        # Apply the change to this process's snapshot now rather than on the next read
+        navigator.catalog()
+
+        return jsonify(dict(result, success=True, version=version)), 200
+    except UnknownRowError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 404
+    except ChangeError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        print(f"ERROR: Exception in /api/admin processing: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@api.route('/api/changes', methods=['GET'])
+def get_changes():
+    """Edits logged after a version, oldest first, for delta sync.
+
+    Query params: since - last version the client has (default 0),
+    limit - most changes to return (default 1000, at most 10000)
+    """
+    print("DEBUG: Received request on /api/changes")
+    try:
+        since = request.args.get('since', default=0, type=int)
+        limit = max(1, min(request.args.get('limit', default=1000, type=int), 10000))
+        with _navigator().db.connection() as conn:
+            changes = changes_since(conn, since, limit)
+            latest = current_version(conn)
+
+        return jsonify({
+            'success': True,
+            'since': since,
+            # Resume from here; more are waiting while has_more is true
+            'version': changes[-1]['version'] if changes else latest,
+            'latest': latest,
+            # The log is behind the client's version: the database was replaced, reload /api/buildings
+            'reset': since > latest,
+            'has_more': bool(changes) and changes[-1]['version'] < latest,
+            'changes': changes
+        }), 200
+    except Exception as e:
+        print(f"ERROR: Exception in /api/changes processing: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@api.route('/api/directions', methods=['POST'])
 def directions():
     """
     Returns distance, duration, and step-by-step walking directions
@@ -262,7 +647,9 @@ def directions():
             "mode": mode,
             "key": key,
         }
-        r = requests.get("https://maps.googleapis.com/maps/api/directions/json", params=params, timeout=10)
+        import requests  # only this endpoint needs it; keep it off the startup path
+
+        r = requests.get(current_app.config['GOOGLE_DIRECTIONS_URL'], params=params, timeout=10)
         j = r.json()
         status = j.get("status", "UNKNOWN_ERROR")
         if status != "OK":
@@ -291,7 +678,7 @@ def directions():
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
-@app.route('/api/health', methods=['GET'])
+@api.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     print("DEBUG: Received request on /api/health")
@@ -302,53 +689,122 @@ def health_check():
     }), 200
 
 
-@app.route('/api/debug/last_llm', methods=['GET'])
+def _is_local_request() -> bool:
+    """Debug endpoints are only served to localhost."""
+    remote = request.remote_addr or ''
+    return remote in ('127.0.0.1', '::1', 'localhost')
+
+
+def _admin_token() -> str:
+    """Admin edits are disabled unless CAMPUS_ADMIN_TOKEN is set."""
+    return os.environ.get('CAMPUS_ADMIN_TOKEN', '')
+
+
+def _is_admin_request() -> bool:
+    """Admin edits need the CAMPUS_ADMIN_TOKEN bearer token (or X-Admin-Token header)."""
+    token = _admin_token()
+    if not token:
+        return False
+    auth = request.headers.get('Authorization', '')
+    supplied = auth[len('Bearer '):] if auth.startswith('Bearer ') else request.headers.get('X-Admin-Token', '')
+    return hmac.compare_digest(supplied.encode('utf-8'), token.encode('utf-8'))
+
+
+@api.route('/api/debug/last_llm', methods=['GET'])
 def debug_last_llm():
-    """Return the last LLM payload recorded by the navigator (local dev only)."""
+    """Return the most recent LLM call traces, newest first (local dev only).
+
+    Query params: n - number of traces to return (default 1, capped at the buffer size)
+    """
     try:
         # Only allow localhost requests for safety
-        remote = request.remote_addr or ''
-        if remote not in ('127.0.0.1', '::1', 'localhost'):
+        if not _is_local_request():
             return jsonify({'success': False, 'error': 'Forbidden'}), 403
 
-        last = None
-        try:
-            last = getattr(navigator, '_last_llm', None)
-        except Exception:
-            last = None
+        n = request.args.get('n', default=1, type=int)
+        traces = _navigator().traces
+        recent = traces.recent(max(1, n))
+
+        return jsonify({
+            'success': True,
+            'last_llm': recent[0] if recent else None,
+            'traces': recent,
+            'buffer_size': traces.maxlen
+        }), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@api.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Counters, gauges and latency histograms for this process (localhost only)."""
+    try:
+        if not _is_local_request():
+            return jsonify({'success': False, 'error': 'Forbidden'}), 403
 
-        return jsonify({'success': True, 'last_llm': last}), 200
+        return jsonify({
+            'success': True,
+            'metrics': metrics.snapshot()
+        }), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@api.route('/api/debug/profiles', methods=['GET'])
+def debug_profiles():
+    """List recent request profiles written by the profiling middleware (local dev only)."""
+    try:
+        if not _is_local_request():
+            return jsonify({'success': False, 'error': 'Forbidden'}), 403
+
+        profiler = current_app.extensions.get('campus_profiler')
+        if profiler is None:
+            return jsonify({
+                'success': True,
+                'enabled': False,
+                'profiles': []
+            }), 200
+
+        limit = request.args.get('n', type=int)
+        return jsonify({
+            'success': True,
+            'enabled': True,
+            'engine': profiler.engine,
+            'sample_rate': profiler.sample_rate,
+            'directory': profiler.profile_dir,
+            'profiles': profiler.recent_profiles(limit)
+        }), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.errorhandler(404)
+@api.app_errorhandler(404)
 def not_found(error):
     return jsonify({
         'success': False,
         'error': 'Endpoint not found'
     }), 404
 
-@app.errorhandler(500)
+@api.app_errorhandler(500)
 def internal_error(error):
     return jsonify({
         'success': False,
         'error': 'Internal server error'
     }), 500
 
-@app.route('/api/navigate', methods=['POST'])
+@api.route('/api/navigate', methods=['POST'])
 def navigate():
     print("DEBUG: Received request on /api/navigate")
     data = request.get_json()
     print(f"DEBUG: Request data: {data}")
     
     # Process the navigation request
-    response = navigator.process(data)
+    response = _navigator().process(data)
     print(f"DEBUG: Response from navigator: {response}")
     return jsonify(response)
 
 if __name__ == '__main__':
     # Check if database exists
-    if not os.path.exists('campus_navigator.db'):
+    if not os.path.exists(DB_PATH):
         print("ERROR: Database not found! Run setup_database.py first.")
         sys.exit(1)
     
@@ -360,9 +816,20 @@ if __name__ == '__main__':
     print("  GET    /api/buildings    - List all buildings")
     print("  GET    /api/building/<id> - Get building details")
     print("  POST   /api/route        - Get route between buildings")
+    print("  POST   /api/tour         - Visiting order for several buildings")
     print("  POST   /api/directions   - Get directions between coordinates")
     print("  GET    /api/search?q=    - Search buildings")
+    print("  GET    /api/open-now?at=&type= - Places open at a time")
+    print("  GET    /api/poi?type=&q=&near= - Search points of interest")
+    print("  GET    /api/reachable?from=&minutes= - Buildings within a walk")
+    print("  GET    /api/map/bundle?v=&z=&x=&y= - GeoJSON map bundle")
+    print("  GET    /api/changes?since= - Edits after a version (delta sync)")
+    print("  POST   /api/admin/<entity> - Create/update a building, poi or route")
+    print("  PUT|DELETE /api/admin/<entity>/<id> - Update or delete one")
     print("  GET    /api/health       - Health check")
+    print("  GET    /api/metrics      - Process metrics (localhost)")
+    print("  GET    /api/debug/last_llm?n= - Recent LLM call traces (localhost)")
+    print("  GET    /api/debug/profiles - Recent request profiles (localhost)")
     print("\nStarting server on http://0.0.0.0:5000")
     print("=" * 50)
     # Helpful runtime hints for LLM configuration
@@ -380,4 +847,5 @@ if __name__ == '__main__':
     
     # Run server
     # Use 0.0.0.0 to allow mobile devices to connect
+    app = create_app()
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,241 @@
+"""
+Parsing for the free-form hours JSON stored on buildings and POIs.
+
+Hours are stored as JSON objects keyed by day specs:
+    {"mon-fri": "7:00 AM - 11:00 PM", "sat": "9:00 AM - 5:00 PM", "sun": "Closed"}
+
+Day specs may be a single day ("sat"), a range ("mon-fri", wrapping ranges
+like "fri-mon" are allowed) or a comma list ("mon,wed"). Later keys override
+earlier ones for the days they cover. compile_hours() turns the whole object
+into week-minute intervals for open/closed checks.
+"""
+
+import re
+import json
+from bisect import bisect_right
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+DAY_NAMES = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+DAY_LABELS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+DAY_ALIASES = {
+    'daily': list(range(7)),
+    'everyday': list(range(7)),
+    'weekdays': list(range(5)),
+    'weekends': [5, 6],
+    'weekend': [5, 6],
+}
+
+
+def _day_index(token: str) -> Optional[int]:
+    token = token.strip().lower()[:3]
+    return DAY_NAMES.index(token) if token in DAY_NAMES else None
+
+
+def expand_days(spec: str) -> List[int]:
+    """Weekday indexes (Monday=0) covered by a day spec; [] if it can't be parsed."""
+    days: List[int] = []
+    for part in spec.lower().split(','):
+        part = part.strip()
+        if part in DAY_ALIASES:
+            days.extend(DAY_ALIASES[part])
+            continue
+        if '-' in part:
+            start, _, end = part.partition('-')
+            a, b = _day_index(start), _day_index(end)
+            if a is None or b is None:
+                continue
+            i = a
+            while True:
+                days.append(i)
+                if i == b:
+                    break
+                i = (i + 1) % 7
+        else:
+            i = _day_index(part)
+            if i is not None:
+                days.append(i)
+    return days
+
+
+def decode_hours(value) -> Optional[Dict[str, str]]:
+    """Hours JSON string (or already-decoded dict) to a dict; None if absent or invalid."""
+    if not value:
+        return None
+    if isinstance(value, dict):
+        return value
+    try:
+        decoded = json.loads(value)
+    except (TypeError, ValueError):
+        return None
+    return decoded if isinstance(decoded, dict) else None
+
+
+def hours_by_weekday(value) -> Dict[int, str]:
+    """Map weekday index (Monday=0) to its hours text, e.g. {0: "7:00 AM - 11:00 PM", 6: "Closed"}."""
+    decoded = decode_hours(value)
+    result: Dict[int, str] = {}
+    if not decoded:
+        return result
+    for spec, span in decoded.items():
+        for day in expand_days(spec):
+            result[day] = str(span).strip()
+    return result
+
+
+def is_closed_text(span: Optional[str]) -> bool:
+    return not span or span.strip().lower() in ('closed', 'close', 'n/a', 'none')
+
+
+# --- Minute intervals -------------------------------------------------------
+#
+# compile_hours() turns hours JSON into sorted, merged intervals measured in
+# minutes from Monday 00:00 (0 - 10080), so spans that run past midnight and
+# "Sun ... - Mon ..." wrap-arounds are plain intervals.
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+_TIME_RE = re.compile(r"^\s*(\d{1,2})(?::(\d{2}))?\s*(?:([ap])\.?\s*m\.?)?\s*$", re.IGNORECASE)
+_SPAN_SPLIT_RE = re.compile(r"\s*(?:-|–|—|\bto\b)\s*", re.IGNORECASE)
+
+
+def parse_time(text: str) -> Optional[int]:
+    """Minutes after midnight for "7:00 AM", "12:00 AM", "19:30", "noon", "midnight"."""
+    text = text.strip().lower()
+    if text == 'noon':
+        return 12 * 60
+    if text == 'midnight':
+        return 0
+    match = _TIME_RE.match(text)
+    if not match:
+        return None
+    hour, minute, meridiem = int(match.group(1)), int(match.group(2) or 0), match.group(3)
+    if minute > 59:
+        return None
+    if meridiem:
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if meridiem == 'p' else 0)
+    elif hour > 24:
+        return None
+    return (hour * 60 + minute) % MINUTES_PER_DAY if hour < 24 else MINUTES_PER_DAY
+
+
+def parse_span(text: Optional[str]) -> Optional[List[Tuple[int, int]]]:
+    """Day-relative (start, end) minutes for one hours string.
+
+    "Closed" gives [], "24 hours" gives [(0, 1440)], and an end at or before
+    the start runs past midnight (end > 1440). None if it can't be parsed.
+    """
+    if is_closed_text(text):
+        return []
+    lowered = text.strip().lower()
+    if '24' in lowered and ('hour' in lowered or 'hrs' in lowered):
+        return [(0, MINUTES_PER_DAY)]
+    spans = []
+    for part in lowered.split(','):
+        pieces = _SPAN_SPLIT_RE.split(part.strip(), maxsplit=1)
+        if len(pieces) != 2:
+            return None
+        start, end = parse_time(pieces[0]), parse_time(pieces[1])
+        if start is None or end is None:
+            return None
+        if end <= start:
+            end += MINUTES_PER_DAY
+        spans.append((start, end))
+    return spans
+
+
+@lru_cache(maxsize=4096)
+def _compile_cached(canonical: str) -> Tuple[Tuple[int, int], ...]:
+    intervals: List[Tuple[int, int]] = []
+    for day, span in hours_by_weekday(canonical).items():
+        for start, end in parse_span(span) or []:
+            start += day * MINUTES_PER_DAY
+            end += day * MINUTES_PER_DAY
+            if end > MINUTES_PER_WEEK:
+                # Sunday night into Monday morning
+                intervals.append((start, MINUTES_PER_WEEK))
+                intervals.append((0, end - MINUTES_PER_WEEK))
+            else:
+                intervals.append((start, end))
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return tuple(merged)
+
+
+def compile_hours(value) -> Tuple[Tuple[int, int], ...]:
+    """Sorted, merged week-minute intervals for hours JSON (memoized per distinct value)."""
+    decoded = decode_hours(value)
+    if not decoded:
+        return ()
+    return _compile_cached(json.dumps(decoded, sort_keys=True))
+
+
+def week_minute(when: datetime) -> int:
+    return when.weekday() * MINUTES_PER_DAY + when.hour * 60 + when.minute
+
+
+def format_minute(minute: int) -> str:
+    """Week (or day) minute as a clock time, e.g. 1380 -> "11:00 PM"."""
+    minute %= MINUTES_PER_DAY
+    hour, mins = divmod(minute, 60)
+    return f"{hour % 12 or 12}:{mins:02d} {'AM' if hour < 12 else 'PM'}"
+
+
+def always_open(intervals: Tuple[Tuple[int, int], ...]) -> bool:
+    """Whether compiled intervals cover the whole week (open 24/7)."""
+    return intervals == ((0, MINUTES_PER_WEEK),)
+
+
+def interval_status(intervals: Tuple[Tuple[int, int], ...], when: datetime) -> Optional[Dict]:
+    """Open/closed status at `when` for compiled intervals; None if there are no hours.
+
+    A place open 24/7 never closes: closes_at and minutes_until_close are None.
+    """
+    if not intervals:
+        return None
+    if always_open(intervals):
+        return {'open': True, 'closes_at': None, 'minutes_until_close': None}
+    t = week_minute(when)
+    i = bisect_right(intervals, (t, MINUTES_PER_WEEK + 1)) - 1
+    if i >= 0 and intervals[i][0] <= t < intervals[i][1]:
+        end = intervals[i][1]
+        # An interval ending at the end of the week may continue on Monday
+        if end == MINUTES_PER_WEEK and intervals[0][0] == 0:
+            end += intervals[0][1]
+        return {
+            'open': True,
+            'closes_at': format_minute(end),
+            'minutes_until_close': end - t,
+        }
+    following = intervals[i + 1] if i + 1 < len(intervals) else intervals[0]
+    start = following[0] if following[0] > t else following[0] + MINUTES_PER_WEEK
+    return {
+        'open': False,
+        'opens_at': format_minute(start),
+        'opens_on': DAY_LABELS[(start // MINUTES_PER_DAY) % 7],
+        'minutes_until_open': start - t,
+    }
+
+
+def open_status(value, when: datetime) -> Optional[Dict]:
+    """Open/closed status at `when` for hours JSON; None if there are no usable hours."""
+    return interval_status(compile_hours(value), when)
+
+
+def describe_status(status: Optional[Dict]) -> Optional[str]:
+    """One-line phrasing of an open_status() result, e.g. "open now until 11:00 PM"."""
+    if not status:
+        return None
+    if status['open']:
+        if status.get('closes_at') is None:
+            return "open 24 hours"
+        return f"open now until {status['closes_at']}"
+    return f"closed now, opens {status['opens_on']} at {status['opens_at']}"
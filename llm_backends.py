@@ -0,0 +1,301 @@
+"""
+Pluggable LLM backends for the campus navigator.
+
+Every backend takes OpenAI-style chat messages and returns a result dict:
+    { 'text': str, 'raw': dict | str, 'model': str, 'usage': dict | None }
+and raises on failure (the navigator turns exceptions into its fallback reply).
+
+Backends:
+- GroqBackend              the hosted Groq API via the `groq` SDK
+- OpenAICompatibleBackend  any /v1/chat/completions endpoint (vLLM, llama.cpp, Ollama, ...)
+- TemplateBackend          deterministic, offline; for CI, load tests and no-key setups
+
+Selection is by config (see `create_backend`):
+    CAMPUS_LLM_BACKEND   auto | groq | openai | template   (default: auto)
+    CAMPUS_LLM_BASE_URL  base URL for the openai backend, e.g. http://localhost:8000/v1
+    CAMPUS_LLM_API_KEY   API key for the openai backend (optional)
+    CAMPUS_LLM_MODEL     model name for the openai backend
+"auto" uses Groq when GROQ_API_KEY is set and the template backend otherwise.
+"""
+
+import os
+import re
+import sys
+import json
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Protocol, runtime_checkable
+
+DEFAULT_GROQ_MODEL = "openai/gpt-oss-20b"
+
+Messages = List[Dict[str, str]]
+
+
+@runtime_checkable
+class LLMBackend(Protocol):
+    """Interface every LLM backend implements."""
+
+    name: str
+    model: Optional[str]
+
+    def complete(self, messages: Messages, model: Optional[str] = None, task: str = 'chat', **options) -> Dict:
+        ...
+
+    def stream(self, messages: Messages, model: Optional[str] = None, task: str = 'chat', **options) -> Iterator[str]:
+        ...
+
+    async def acomplete(self, messages: Messages, model: Optional[str] = None, task: str = 'chat', **options) -> Dict:
+        ...
+
+    def astream(self, messages: Messages, model: Optional[str] = None, task: str = 'chat', **options) -> AsyncIterator[str]:
+        ...
+
+
+class _BackendBase:
+    """Default async/streaming behaviour built on top of `complete`."""
+
+    name = "base"
+    model: Optional[str] = None
+
+    def complete(self, messages: Messages, model: Optional[str] = None, task: str = 'chat', **options) -> Dict:
+        raise NotImplementedError
+
+    def stream(self, messages: Messages, model: Optional[str] = None, task: str = 'chat', **options) -> Iterator[str]:
+        yield self.complete(messages, model=model, task=task, **options)['text']
+
+    async def acomplete(self, messages: Messages, model: Optional[str] = None, task: str = 'chat', **options) -> Dict:
+        import asyncio  # deferred: only async callers pay for importing asyncio
+
+        return await asyncio.to_thread(self.complete, messages, model, task, **options)
+
+    async def astream(self, messages: Messages, model: Optional[str] = None, task: str = 'chat', **options) -> AsyncIterator[str]:
+        result = await self.acomplete(messages, model=model, task=task, **options)
+        yield result['text']
+
+
+def _usage_dict(usage) -> Optional[Dict]:
+    if usage is None:
+        return None
+    if isinstance(usage, dict):
+        return usage
+    return {
+        'prompt_tokens': getattr(usage, 'prompt_tokens', None),
+        'completion_tokens': getattr(usage, 'completion_tokens', None),
+        'total_tokens': getattr(usage, 'total_tokens', None),
+    }
+
+
+class GroqBackend(_BackendBase):
+    """Hosted Groq chat completions through the official SDK."""
+
+    name = "groq"
+
+    def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None):
+        from groq import Groq
+
+        self.api_key = api_key or os.environ.get("GROQ_API_KEY")
+        self.model = model or os.environ.get("GROQ_MODEL", DEFAULT_GROQ_MODEL)
+        # Retries are handled by llm_resilience.ResilientLLM, so the SDK's own are disabled
+        self.client = Groq(api_key=self.api_key, max_retries=0)
+        self._async_client = None
+
+    def _async(self):
+        if self._async_client is None:
+            from groq import AsyncGroq
+            self._async_client = AsyncGroq(api_key=self.api_key, max_retries=0)
+        return self._async_client
+
+    @staticmethod
+    def _result(completion, model: str) -> Dict:
+        try:
+            text = completion.choices[0].message.content
+        except Exception:
+            try:
+                text = completion.choices[0].message["content"]
+            except Exception:
+                text = str(completion)
+        try:
+            raw = completion.to_dict() if hasattr(completion, 'to_dict') else str(completion)
+        except Exception:
+            raw = str(completion)
+        return {'text': text, 'raw': raw, 'model': model, 'usage': _usage_dict(getattr(completion, 'usage', None))}
+
+    def complete(self, messages: Messages, model: Optional[str] = None, task: str = 'chat', **options) -> Dict:
+        model = model or self.model
+        completion = self.client.chat.completions.create(messages=messages, model=model, **options)
+        return self._result(completion, model)
+
+    def stream(self, messages: Messages, model: Optional[str] = None, task: str = 'chat', **options) -> Iterator[str]:
+        chunks = self.client.chat.completions.create(messages=messages, model=model or self.model, stream=True, **options)
+        for chunk in chunks:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                yield delta
+
+    async def acomplete(self, messages: Messages, model: Optional[str] = None, task: str = 'chat', **options) -> Dict:
+        model = model or self.model
+        completion = await self._async().chat.completions.create(messages=messages, model=model, **options)
+        return self._result(completion, model)
+
+    async def astream(self, messages: Messages, model: Optional[str] = None, task: str = 'chat', **options) -> AsyncIterator[str]:
+        chunks = await self._async().chat.completions.create(messages=messages, model=model or self.model, stream=True, **options)
+        async for chunk in chunks:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                yield delta
+
+
+class OpenAICompatibleBackend(_BackendBase):
+    """Any server speaking the OpenAI /chat/completions protocol (self-hosted models)."""
+
+    name = "openai"
+
+    def __init__(self, base_url: Optional[str] = None, api_key: Optional[str] = None,
+                 model: Optional[str] = None, timeout: float = 60.0):
+        import requests
+
+        self._requests = requests
+        self.base_url = (base_url or os.environ.get("CAMPUS_LLM_BASE_URL") or "http://localhost:8000/v1").rstrip('/')
+        self.api_key = api_key or os.environ.get("CAMPUS_LLM_API_KEY")
+        self.model = model or os.environ.get("CAMPUS_LLM_MODEL") or "local-model"
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def _headers(self) -> Dict[str, str]:
+        headers = {'Content-Type': 'application/json'}
+        if self.api_key:
+            headers['Authorization'] = f"Bearer {self.api_key}"
+        return headers
+
+    def complete(self, messages: Messages, model: Optional[str] = None, task: str = 'chat', **options) -> Dict:
+        model = model or self.model
+        timeout = options.pop('timeout', self.timeout)
+        r = self.session.post(f"{self.base_url}/chat/completions", headers=self._headers(),
+                              json={'model': model, 'messages': messages, **options}, timeout=timeout)
+        r.raise_for_status()
+        raw = r.json()
+        return {
+            'text': raw['choices'][0]['message']['content'],
+            'raw': raw,
+            'model': raw.get('model', model),
+            'usage': raw.get('usage'),
+        }
+
+    def stream(self, messages: Messages, model: Optional[str] = None, task: str = 'chat', **options) -> Iterator[str]:
+        timeout = options.pop('timeout', self.timeout)
+        with self.session.post(f"{self.base_url}/chat/completions", headers=self._headers(),
+                               json={'model': model or self.model, 'messages': messages, 'stream': True, **options},
+                               timeout=timeout, stream=True) as r:
+            r.raise_for_status()
+            for line in r.iter_lines(decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+                data = line[5:].strip()
+                if data == '[DONE]':
+                    break
+                try:
+                    delta = json.loads(data)['choices'][0].get('delta', {}).get('content')
+                except (ValueError, KeyError, IndexError):
+                    continue
+                if delta:
+                    yield delta
+
+
+_FIELD_RE = r"^{field}:\s*(.+)$"
+_DIRECTIONS_RE = re.compile(r"from\s+(?:the\s+)?(.+?)\s+to\s+(?:the\s+)?(.+?)[?.!]*$", re.IGNORECASE)
+_LOCATION_RE = re.compile(r"(?:where is|where's|find|about|does|is)\s+(?:the\s+)?(.+?)(?:\s+(?:open|close|closed|located))?[?.!]*$", re.IGNORECASE)
+_HOURS_WORDS = ("open", "close", "hours", "what time")
+
+
+class TemplateBackend(_BackendBase):
+    """Deterministic offline backend.
+
+    Extraction is done with a few regexes; answers are assembled from the facts
+    the navigator already put in the prompt. The same input always gives the
+    same output, which keeps CI and load tests stable.
+    """
+
+    name = "template"
+
+    def __init__(self, model: Optional[str] = None):
+        self.model = model or "template"
+
+    @staticmethod
+    def _split(messages: Messages):
+        system = next((m.get('content', '') for m in messages if m.get('role') == 'system'), '')
+        user = next((m.get('content', '') for m in reversed(messages) if m.get('role') == 'user'), '')
+        return system, user
+
+    @staticmethod
+    def extract(query: str) -> Dict:
+        query = query.strip()
+        match = _DIRECTIONS_RE.search(query)
+        if match:
+            return {"location": match.group(2), "from_location": match.group(1), "query_type": "directions", "confidence": 0.9}
+        lowered = query.lower()
+        query_type = "hours" if any(w in lowered for w in _HOURS_WORDS) else "location"
+        match = _LOCATION_RE.search(query)
+        location = match.group(1) if match else query.rstrip('?.!')
+        return {"location": location, "query_type": query_type, "confidence": 0.8 if match else 0.3}
+
+    @staticmethod
+    def _field(prompt: str, field: str) -> Optional[str]:
+        match = re.search(_FIELD_RE.format(field=field), prompt, re.MULTILINE)
+        return match.group(1).strip() if match else None
+
+    def answer(self, prompt: str) -> str:
+        """Answer a prompt built by prompts.build_answer_prompt from its Task/Facts lines."""
+        task = self._field(prompt, 'Task') or ''
+        if task.startswith("Rewrite the draft"):
+            return self._field(prompt, 'Draft') or ''
+        if "couldn't find that location" in task:
+            return "Sorry, I couldn't find that place on campus. Did you mean another building? I can also list all the locations I know."
+
+        name = self._field(prompt, 'Name') or self._field(prompt, 'To') or "that building"
+        hours = self._field(prompt, 'Hours')
+
+        if "walking directions" in task:
+            start = self._field(prompt, 'From')
+            steps = self._field(prompt, 'Directions')
+            minutes = self._field(prompt, 'Walking Time')
+            route = steps[0].lower() + steps[1:] if steps else 'follow the campus signs'
+            return f"From {start}, {route}. It's about {minutes or 'a short walk'} to {name}."
+        if "opening hours" in task:
+            return f"{name} is open {hours}." if hours else f"I don't have opening hours for {name}."
+
+        address = self._field(prompt, 'Address')
+        description = self._field(prompt, 'Description')
+        parts = [f"{name} is at {address}." if address else f"Here's what I know about {name}."]
+        if description:
+            parts.append(description.rstrip('.') + ".")
+        if hours:
+            parts.append(f"Hours: {hours}.")
+        return " ".join(parts)
+
+    def complete(self, messages: Messages, model: Optional[str] = None, task: str = 'chat', **options) -> Dict:
+        system, user = self._split(messages)
+        if task == 'extract':
+            text = json.dumps(self.extract(user))
+        else:
+            text = self.answer(user)
+        return {'text': text, 'raw': {'backend': self.name, 'task': task}, 'model': model or self.model, 'usage': None}
+
+
+BACKENDS = {
+    'groq': GroqBackend,
+    'openai': OpenAICompatibleBackend,
+    'template': TemplateBackend,
+}
+
+
+def create_backend(name: Optional[str] = None, **kwargs) -> LLMBackend:
+    """Build the backend named by `name` or CAMPUS_LLM_BACKEND (default "auto")."""
+    name = (name or os.environ.get("CAMPUS_LLM_BACKEND") or "auto").strip().lower()
+    if name == "auto":
+        if os.environ.get("GROQ_API_KEY"):
+            name = "groq"
+        else:
+            print("GROQ_API_KEY not set; using the offline template LLM backend. "
+                  "Set CAMPUS_LLM_BACKEND to choose a backend explicitly.", file=sys.stderr)
+            name = "template"
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend '{name}'. Choose one of: auto, {', '.join(BACKENDS)}")
+    return BACKENDS[name](**kwargs)
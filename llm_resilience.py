@@ -0,0 +1,353 @@
+"""
+Timeouts, retries, hedging and a circuit breaker around an LLM backend.
+
+ResilientLLM wraps any llm_backends backend:
+- every attempt gets a timeout no longer than what is left of the request's
+  deadline (see RequestTrace.deadline), so one stuck call can't pin a worker
+- retryable failures (timeouts, connection errors, 408/429/5xx) are retried
+  with full-jitter exponential backoff while the deadline allows
+- an admission limiter (admission.ConcurrencyLimiter) caps calls in flight;
+  calls that can't get a slot in time are shed to the local fallback
+- optional hedging fires a second identical request once the first has taken
+  longer than the recent p95 latency; whichever succeeds first wins
+- a circuit breaker opens when the rate of retryable errors over a time window
+  spikes (a rejected request counts as a healthy call); while open, calls go
+  straight to the local fallback backend instead of waiting to fail
+
+Configuration (environment):
+    CAMPUS_LLM_TIMEOUT_S         per-attempt timeout cap            (default 10)
+    CAMPUS_REQUEST_BUDGET_S      total LLM time per request         (default 25)
+    CAMPUS_LLM_RETRIES           retries after the first attempt    (default 2)
+    CAMPUS_LLM_BACKOFF_S         base backoff                       (default 0.2)
+    CAMPUS_LLM_BACKOFF_MAX_S     backoff cap                        (default 2)
+    CAMPUS_LLM_HEDGE             1 to enable hedged requests        (default 0)
+    CAMPUS_LLM_HEDGE_DELAY_S     hedge delay until p95 is known     (default 1.0)
+    CAMPUS_BREAKER_ERROR_RATE    error rate that opens the breaker  (default 0.5)
+    CAMPUS_BREAKER_MIN_CALLS     calls in window before it can open (default 10)
+    CAMPUS_BREAKER_WINDOW_S      error-rate window                  (default 60)
+    CAMPUS_BREAKER_COOLDOWN_S    time open before a trial call      (default 30)
+
+Counters, latency and breaker state are published through metrics.metrics.
+"""
+
+import os
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional
+
+from admission import ConcurrencyLimiter
+from metrics import metrics
+
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+HEDGE_MIN_SAMPLES = 20
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when the breaker is open and no fallback backend is configured."""
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request's LLM time budget ran out."""
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Whether a backend exception is worth retrying."""
+    if isinstance(exc, CircuitOpenError):
+        return False
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    status = getattr(exc, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(exc, 'response', None), 'status_code', None)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS
+    # groq.APITimeoutError / APIConnectionError, requests ReadTimeout / ConnectionError, ...
+    name = type(exc).__name__.lower()
+    return 'timeout' in name or 'connection' in name
+
+
+class CircuitBreaker:
+    """Error-rate circuit breaker over a sliding time window."""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, error_rate: float = 0.5, min_calls: int = 10,
+                 window_s: float = 60.0, cooldown_s: float = 30.0):
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.window_s = window_s
+        self.cooldown_s = cooldown_s
+        self._lock = threading.Lock()
+        self._events = deque()  # (monotonic time, ok)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self.times_opened = 0
+
+    def _trim(self, now: float):
+        while self._events and now - self._events[0][0] > self.window_s:
+            self._events.popleft()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown_s:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may go to the backend right now."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if time.monotonic() - self._opened_at < self.cooldown_s:
+                return False
+            # Cooldown over: let exactly one trial call through
+            if self._trial_in_flight:
+                return False
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = True
+            return True
+
+    def release(self):
+        """End a half-open trial that never reached the backend, so the next call can be the trial."""
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._trial_in_flight = False
+
+    def record(self, ok: bool):
+        now = time.monotonic()
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._trial_in_flight = False
+                if ok:
+                    self._state = self.CLOSED
+                    self._events.clear()
+                else:
+                    self._state = self.OPEN
+                    self._opened_at = now
+                    self.times_opened += 1
+                return
+            self._events.append((now, ok))
+            self._trim(now)
+            if self._state == self.CLOSED and len(self._events) >= self.min_calls:
+                errors = sum(1 for _, success in self._events if not success)
+                if errors / len(self._events) >= self.error_rate:
+                    self._state = self.OPEN
+                    self._opened_at = now
+                    self.times_opened += 1
+
+    def snapshot(self) -> Dict:
+        state = self.state
+        with self._lock:
+            self._trim(time.monotonic())
+            total = len(self._events)
+            errors = sum(1 for _, ok in self._events if not ok)
+        return {
+            'state': state,
+            'window_calls': total,
+            'window_errors': errors,
+            'window_error_rate': round(errors / total, 3) if total else 0.0,
+            'times_opened': self.times_opened,
+        }
+
+
+class ResilientLLM:
+    """Deadline-aware retries, hedging and circuit breaking around an LLM backend."""
+
+    def __init__(self, backend, fallback=None, timeout_s: float = 10.0, retries: int = 2,
+                 backoff_s: float = 0.2, backoff_max_s: float = 2.0, hedge: bool = False,
+                 hedge_delay_s: float = 1.0, request_budget_s: float = 25.0,
+                 breaker: Optional[CircuitBreaker] = None, limiter: Optional[ConcurrencyLimiter] = None):
+        self.backend = backend
+        self.fallback = fallback
+        self.timeout_s = timeout_s
+        self.retries = max(0, int(retries))
+        self.backoff_s = backoff_s
+        self.backoff_max_s = backoff_max_s
+        self.hedge = hedge
+        self.hedge_delay_s = hedge_delay_s
+        self.request_budget_s = request_budget_s
+        self.breaker = breaker or CircuitBreaker()
+        self.limiter = limiter
+        self._latencies = deque(maxlen=512)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        metrics.register_collector('llm_breaker', self.breaker.snapshot)
+
+    @classmethod
+    def from_env(cls, backend, fallback=None) -> 'ResilientLLM':
+        breaker = CircuitBreaker(
+            error_rate=_env_float('CAMPUS_BREAKER_ERROR_RATE', 0.5),
+            min_calls=int(_env_float('CAMPUS_BREAKER_MIN_CALLS', 10)),
+            window_s=_env_float('CAMPUS_BREAKER_WINDOW_S', 60.0),
+            cooldown_s=_env_float('CAMPUS_BREAKER_COOLDOWN_S', 30.0),
+        )
+        return cls(
+            backend,
+            fallback=fallback,
+            timeout_s=_env_float('CAMPUS_LLM_TIMEOUT_S', 10.0),
+            retries=int(_env_float('CAMPUS_LLM_RETRIES', 2)),
+            backoff_s=_env_float('CAMPUS_LLM_BACKOFF_S', 0.2),
+            backoff_max_s=_env_float('CAMPUS_LLM_BACKOFF_MAX_S', 2.0),
+            hedge=os.environ.get('CAMPUS_LLM_HEDGE', '').strip().lower() in ('1', 'true', 'yes', 'on'),
+            hedge_delay_s=_env_float('CAMPUS_LLM_HEDGE_DELAY_S', 1.0),
+            request_budget_s=_env_float('CAMPUS_REQUEST_BUDGET_S', 25.0),
+            breaker=breaker,
+            limiter=ConcurrencyLimiter.from_env(),
+        )
+
+    def new_deadline(self) -> float:
+        """Monotonic deadline for a request starting now."""
+        return time.monotonic() + self.request_budget_s
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=int(_env_float('CAMPUS_LLM_HEDGE_WORKERS', 16)),
+                                                    thread_name_prefix='llm-hedge')
+        return self._pool
+
+    def hedge_delay(self) -> float:
+        """Current hedge delay: p95 of recent successful latencies, or the configured default."""
+        samples: List[float] = sorted(self._latencies)
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return self.hedge_delay_s
+        return samples[int(0.95 * (len(samples) - 1))]
+
+    def _use_fallback(self, messages, model, task, reason: str, error: Optional[BaseException] = None) -> Dict:
+        if self.fallback is None:
+            if error is not None:
+                raise error
+            if reason == 'shed':
+                raise CircuitOpenError("LLM call shed: too many calls in flight")
+            raise CircuitOpenError("LLM circuit breaker is open")
+        metrics.incr('llm.fallbacks')
+        result = self.fallback.complete(messages, task=task)
+        result['fallback'] = True
+        result['fallback_reason'] = reason
+        if error is not None:
+            result['error'] = str(error)
+        return result
+
+    def _hedged_attempt(self, messages, model, task, timeout: float) -> Dict:
+        pool = self._executor()
+        started = time.monotonic()
+        first = pool.submit(self.backend.complete, messages, model=model, task=task, timeout=timeout)
+        done, _ = wait([first], timeout=min(self.hedge_delay(), timeout))
+        if done:
+            return first.result()
+
+        remaining = timeout - (time.monotonic() - started)
+        if remaining <= 0:
+            raise DeadlineExceeded("LLM call exceeded its timeout")
+        # The hedge is a second request in flight, so it needs its own slot; without one, keep waiting
+        if self.limiter is not None and not self.limiter.try_acquire():
+            metrics.incr('llm.hedges_skipped')
+            pending = {first}
+        else:
+            metrics.incr('llm.hedges')
+            second = pool.submit(self.backend.complete, messages, model=model, task=task, timeout=remaining)
+            if self.limiter is not None:
+                # Held until the hedge finishes, even when the first request wins
+                second.add_done_callback(lambda _: self.limiter.release())
+            pending = {first, second}
+        last_error: Optional[BaseException] = None
+        while pending:
+            remaining = timeout - (time.monotonic() - started)
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is not first:
+                        metrics.incr('llm.hedge_wins')
+                    return future.result()
+                last_error = future.exception()
+        if last_error is not None:
+            raise last_error
+        raise DeadlineExceeded("LLM call exceeded its timeout")
+
+    def complete(self, messages, model: Optional[str] = None, task: str = 'chat',
+                 deadline: Optional[float] = None) -> Dict:
+        """Run one logical LLM call. Returns the backend result dict plus
+        'attempts' and, when the fallback answered, 'fallback'/'fallback_reason'."""
+        metrics.incr('llm.calls')
+        deadline = deadline or self.new_deadline()
+
+        if not self.breaker.allow():
+            metrics.incr('llm.short_circuits')
+            return self._use_fallback(messages, model, task, 'circuit_open')
+
+        # Too many calls in flight and the queue is full (or the wait would be too long)
+        if self.limiter is not None and not self.limiter.acquire(deadline):
+            # A shed half-open trial never reached the backend; let the next call try instead
+            self.breaker.release()
+            return self._use_fallback(messages, model, task, 'shed')
+        try:
+            return self._attempts(messages, model, task, deadline)
+        finally:
+            if self.limiter is not None:
+                self.limiter.release()
+
+    def _attempts(self, messages, model: Optional[str], task: str, deadline: float) -> Dict:
+        last_error: Optional[BaseException] = None
+        attempts = 0
+        for attempt in range(self.retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                last_error = last_error or DeadlineExceeded("request LLM budget exhausted")
+                break
+            timeout = min(self.timeout_s, remaining)
+            attempts += 1
+            metrics.incr('llm.attempts')
+            started = time.perf_counter()
+            try:
+                if self.hedge:
+                    result = self._hedged_attempt(messages, model, task, timeout)
+                else:
+                    result = self.backend.complete(messages, model=model, task=task, timeout=timeout)
+            except Exception as e:
+                last_error = e
+                retryable = is_retryable(e)
+                # Only transport and overload errors say the provider is unhealthy; a rejected
+                # request (bad prompt or model name) is this caller's problem and must not open
+                # the breaker for everyone
+                self.breaker.record(not retryable)
+                metrics.incr('llm.errors')
+                if isinstance(e, TimeoutError) or 'timeout' in type(e).__name__.lower():
+                    metrics.incr('llm.timeouts')
+                if not retryable or attempt == self.retries:
+                    break
+                # Full jitter backoff, never sleeping past the deadline
+                sleep_s = random.uniform(0, min(self.backoff_max_s, self.backoff_s * (2 ** attempt)))
+                if time.monotonic() + sleep_s >= deadline:
+                    break
+                metrics.incr('llm.retries')
+                time.sleep(sleep_s)
+                continue
+
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.breaker.record(True)
+            self._latencies.append(elapsed_ms / 1000)
+            metrics.observe('llm.latency_ms', elapsed_ms)
+            result['attempts'] = attempts
+            return result
+
+        if attempts == 0:
+            # The deadline had passed before the first attempt: nothing to record, but free a half-open trial
+            self.breaker.release()
+        return self._use_fallback(messages, model, task, 'error', last_error)
@@ -0,0 +1,83 @@
+"""
+Per-request LLM call traces and a bounded buffer of recent traces.
+
+Each request gets its own RequestTrace that query_llm appends call records to,
+so provenance (`response_source`) is decided from the request's own calls rather
+than from state shared between Flask threads.
+
+For debugging, every call record is also pushed into a TraceBuffer, a bounded
+ring buffer backed by `collections.deque(maxlen=N)`. deque.append and iteration
+snapshots are atomic under the GIL, so writers never take a lock.
+"""
+
+import os
+from collections import deque
+from typing import Dict, List, Optional
+
+DEFAULT_TRACE_BUFFER_SIZE = 100
+
+
+class RequestTrace:
+    """LLM calls made while serving a single request."""
+
+    __slots__ = ('request_id', 'calls', 'deadline', 'answer_source', 'retrieval')
+
+    def __init__(self, request_id: Optional[str] = None, deadline: Optional[float] = None):
+        self.request_id = request_id
+        self.calls: List[Dict] = []
+        # time.monotonic() deadline for all LLM calls of this request (set on first call)
+        self.deadline = deadline
+        # Set when the answer didn't come from an LLM call (e.g. 'template')
+        self.answer_source: Optional[str] = None
+        # Passages retrieved for the answer prompt: time, count and context size (see retrieval.py)
+        self.retrieval: Optional[Dict] = None
+
+    def add(self, call: Dict):
+        self.calls.append(call)
+
+    def last(self, task: Optional[str] = None) -> Optional[Dict]:
+        """Most recent call, optionally restricted to one task ('extract', 'answer')."""
+        for call in reversed(self.calls):
+            if task is None or call.get('task') == task:
+                return call
+        return None
+
+    def summary(self) -> List[Dict]:
+        """Call records without the raw provider payloads."""
+        return [{k: v for k, v in call.items() if k not in ('raw', 'error_trace')} for call in self.calls]
+
+    def total_tokens(self) -> Dict[str, int]:
+        totals = {'prompt_tokens': 0, 'completion_tokens': 0}
+        for call in self.calls:
+            usage = call.get('usage') or {}
+            for key in totals:
+                totals[key] += usage.get(key) or 0
+        return totals
+
+
+class TraceBuffer:
+    """Bounded, lock-free ring buffer of the last N LLM call records."""
+
+    def __init__(self, maxlen: Optional[int] = None):
+        if maxlen is None:
+            try:
+                maxlen = int(os.environ.get('CAMPUS_LLM_TRACE_BUFFER', DEFAULT_TRACE_BUFFER_SIZE))
+            except ValueError:
+                maxlen = DEFAULT_TRACE_BUFFER_SIZE
+        self._items = deque(maxlen=max(1, maxlen))
+
+    @property
+    def maxlen(self) -> int:
+        return self._items.maxlen
+
+    def record(self, call: Dict):
+        self._items.append(call)
+
+    def recent(self, n: Optional[int] = None) -> List[Dict]:
+        """The last `n` records, newest first."""
+        items = list(self._items)  # snapshot; safe while other threads append
+        items.reverse()
+        return items if not n or n <= 0 else items[:n]
+
+    def __len__(self) -> int:
+        return len(self._items)
@@ -0,0 +1,169 @@
+"""
+Versioned GeoJSON map bundle for the frontend map.
+
+One FeatureCollection per catalog snapshot holds:
+- every building as a Point;
+- every POI as a Point at its building's coordinates;
+- every route as a LineString, simplified with Douglas-Peucker.
+
+It is encoded and gzip-compressed once, when the catalog is loaded
+(`map_bundle(catalog)` from the navigator's preload), so serving it is a byte
+copy. The bundle `version` is derived from the catalog version. A client that
+asks for `?v=<version>` gets the bytes with immutable caching headers.
+
+`tile(z, x, y)` returns the features intersecting a web-mercator tile's
+bounding box. Tiles are encoded on first request and kept in a bounded cache
+on the bundle.
+"""
+
+import gzip
+import json
+import math
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from metrics import metrics
+
+# Bump when the bundle layout changes so clients don't keep an old format cached
+FORMAT_VERSION = 1
+# About 1 m at campus latitudes
+SIMPLIFY_TOLERANCE_DEG = 0.00001
+MAX_ZOOM = 22
+DEFAULT_TILE_CACHE_SIZE = 512
+
+BUILDING_PROPERTIES = ('id', 'name', 'building_code', 'address')
+POI_PROPERTIES = ('id', 'name', 'building_id', 'poi_type', 'floor', 'room_number')
+ROUTE_PROPERTIES = ('id', 'from_building_id', 'to_building_id', 'distance_meters', 'walk_time_minutes')
+
+# (min_lng, min_lat, max_lng, max_lat), the GeoJSON bbox order
+BBox = Tuple[float, float, float, float]
+
+
+def simplify(points: List[List[float]], tolerance: float = SIMPLIFY_TOLERANCE_DEG) -> List[List[float]]:
+    """Douglas-Peucker simplification of a polyline (planar, in degrees)."""
+    if len(points) <= 2:
+        return points
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        (ax, ay), (bx, by) = points[first][:2], points[last][:2]
+        dx, dy = bx - ax, by - ay
+        norm = math.hypot(dx, dy)
+        farthest, index = 0.0, None
+        for i in range(first + 1, last):
+            px, py = points[i][:2]
+            if norm:
+                d = abs(dy * (px - ax) - dx * (py - ay)) / norm
+            else:
+                d = math.hypot(px - ax, py - ay)
+            if d > farthest:
+                farthest, index = d, i
+        if index is not None and farthest > tolerance:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return [p for p, kept in zip(points, keep) if kept]
+
+
+def tile_bbox(z: int, x: int, y: int) -> BBox:
+    """Bounding box of web-mercator (slippy map) tile z/x/y."""
+    if not 0 <= z <= MAX_ZOOM or not 0 <= x < 2 ** z or not 0 <= y < 2 ** z:
+        raise ValueError(f"Invalid tile {z}/{x}/{y}")
+    n = 2 ** z
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return x / n * 360.0 - 180.0, lat(y + 1), (x + 1) / n * 360.0 - 180.0, lat(y)
+
+
+def _intersects(a: BBox, b: BBox) -> bool:
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def _point(building) -> Optional[List[float]]:
+    if building is None or building.latitude is None or building.longitude is None:
+        return None
+    # GeoJSON positions are [lng, lat]
+    return [building.longitude, building.latitude]
+
+
+class MapBundle:
+    """Encoded GeoJSON for one catalog snapshot, whole and by tile."""
+
+    def __init__(self, catalog, tile_cache_size: int = DEFAULT_TILE_CACHE_SIZE):
+        self.version = hashlib.sha1(f"{FORMAT_VERSION}:{catalog.version}".encode('utf-8')).hexdigest()[:16]
+        self.catalog_version = catalog.version
+        self.tile_cache_size = tile_cache_size
+        # (bbox, feature) pairs, kept for tiling
+        self._features: List[Tuple[BBox, Dict]] = self._build_features(catalog)
+        self.body, self.gzipped = self._encode([feature for _, feature in self._features])
+        self._tiles: 'OrderedDict[Tuple[int, int, int], Tuple[bytes, bytes]]' = OrderedDict()
+        self._lock = threading.Lock()
+        metrics.gauge('map_bundle.bytes', len(self.body))
+        metrics.gauge('map_bundle.gzip_bytes', len(self.gzipped))
+
+    @staticmethod
+    def _build_features(catalog) -> List[Tuple[BBox, Dict]]:
+        features = []
+        for building in catalog.buildings.values():
+            point = _point(building)
+            if point is None:
+                continue
+            properties = dict(building.to_json(BUILDING_PROPERTIES), kind='building')
+            features.append(((point[0], point[1], point[0], point[1]),
+                             {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': point},
+                              'properties': properties}))
+        for poi in catalog.pois.values():
+            point = _point(catalog.building(poi.building_id))
+            if point is None:
+                continue
+            properties = dict(poi.to_json(POI_PROPERTIES), kind='poi')
+            features.append(((point[0], point[1], point[0], point[1]),
+                             {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': point},
+                              'properties': properties}))
+        for route in catalog.routes:
+            line = [[p[1], p[0]] for p in route.waypoint_list if isinstance(p, (list, tuple)) and len(p) >= 2]
+            if len(line) < 2:
+                line = [p for p in (_point(catalog.building(route.from_building_id)),
+                                    _point(catalog.building(route.to_building_id))) if p]
+            if len(line) < 2:
+                continue
+            line = simplify(line)
+            lngs, lats = [p[0] for p in line], [p[1] for p in line]
+            properties = dict(route.to_json(ROUTE_PROPERTIES), kind='route')
+            features.append(((min(lngs), min(lats), max(lngs), max(lats)),
+                             {'type': 'Feature', 'geometry': {'type': 'LineString', 'coordinates': line},
+                              'properties': properties}))
+        return features
+
+    def _encode(self, features: List[Dict]) -> Tuple[bytes, bytes]:
+        collection = {'type': 'FeatureCollection', 'version': self.version, 'features': features}
+        body = json.dumps(collection, separators=(',', ':'), default=str).encode('utf-8')
+        # mtime=0 keeps the compressed bytes identical across processes and restarts
+        return body, gzip.compress(body, compresslevel=9, mtime=0)
+
+    def tile(self, z: int, x: int, y: int) -> Tuple[bytes, bytes]:
+        """(body, gzipped body) for the features in tile z/x/y."""
+        key = (z, x, y)
+        with self._lock:
+            cached = self._tiles.get(key)
+            if cached is not None:
+                self._tiles.move_to_end(key)
+                return cached
+        bbox = tile_bbox(z, x, y)
+        encoded = self._encode([feature for box, feature in self._features if _intersects(box, bbox)])
+        with self._lock:
+            self._tiles[key] = encoded
+            while len(self._tiles) > self.tile_cache_size:
+                self._tiles.popitem(last=False)
+        return encoded
+
+
+def map_bundle(catalog) -> MapBundle:
+    """The MapBundle for a catalog snapshot, built once."""
+    return catalog.derived('map_bundle', MapBundle)
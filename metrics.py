@@ -0,0 +1,126 @@
+"""
+In-process metrics for the campus navigator.
+
+A single module-level registry (`metrics`) collects:
+- counters    monotonically increasing totals        metrics.incr('llm.retries')
+- gauges      last value set                          metrics.gauge('llm.breaker_state', 1)
+- histograms  count/sum/min/max plus percentiles      metrics.observe('llm.latency_ms', 412.0)
+                over a bounded reservoir of recent samples
+
+`metrics.snapshot()` returns everything as plain JSON-able dicts; the Flask API
+serves it at GET /api/metrics. Other modules may register a callable with
+`metrics.register_collector(name, fn)` to contribute a live section (e.g. the
+circuit breaker state) computed at snapshot time.
+"""
+
+import threading
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+DEFAULT_RESERVOIR_SIZE = 1024
+
+
+class Histogram:
+    """Running summary plus a bounded reservoir of recent samples for percentiles."""
+
+    __slots__ = ('count', 'total', 'min', 'max', '_recent')
+
+    def __init__(self, reservoir_size: int = DEFAULT_RESERVOIR_SIZE):
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self._recent = deque(maxlen=reservoir_size)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self._recent.append(value)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        values = sorted(self._recent)
+        if not values:
+            return None
+        k = min(len(values) - 1, max(0, int(round(pct / 100.0 * (len(values) - 1)))))
+        return values[k]
+
+    def snapshot(self) -> Dict:
+        return {
+            'count': self.count,
+            'sum': round(self.total, 3),
+            'mean': round(self.total / self.count, 3) if self.count else None,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+        }
+
+
+class MetricsRegistry:
+    """Thread-safe counters, gauges and histograms keyed by dotted names."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+        self._histograms: Dict[str, Histogram] = {}
+        self._collectors: Dict[str, Callable[[], Dict]] = {}
+
+    def incr(self, name: str, value: float = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def gauge(self, name: str, value: float):
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: float):
+        with self._lock:
+            hist = self._histograms.get(name)
+            if hist is None:
+                hist = self._histograms[name] = Histogram()
+            hist.observe(value)
+
+    def counter_value(self, name: str) -> float:
+        return self._counters.get(name, 0)
+
+    def percentile(self, name: str, pct: float) -> Optional[float]:
+        with self._lock:
+            hist = self._histograms.get(name)
+            return hist.percentile(pct) if hist else None
+
+    def register_collector(self, name: str, fn: Callable[[], Dict]):
+        """Add a section computed at snapshot time (replaces any previous one with this name)."""
+        with self._lock:
+            self._collectors[name] = fn
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            result = {
+                'counters': dict(sorted(self._counters.items())),
+                'gauges': dict(sorted(self._gauges.items())),
+                'histograms': {name: h.snapshot() for name, h in sorted(self._histograms.items())},
+            }
+            collectors = list(self._collectors.items())
+        for name, fn in collectors:
+            try:
+                result[name] = fn()
+            except Exception as e:
+                result[name] = {'error': str(e)}
+        return result
+
+    def names(self) -> List[str]:
+        with self._lock:
+            return sorted(set(self._counters) | set(self._gauges) | set(self._histograms))
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+
+metrics = MetricsRegistry()
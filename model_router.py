@@ -0,0 +1,91 @@
+"""
+Per-stage model selection for the navigator's LLM calls.
+
+Extraction is a small JSON task, so it goes to a fast model; answers go to the
+answer model; an extraction is retried once on the escalation model when its
+JSON doesn't parse or its confidence is below the threshold.
+
+Configuration (environment), each falling back to the backend's default model:
+    CAMPUS_EXTRACT_MODEL            model for location extraction
+    CAMPUS_ANSWER_MODEL             model for the final answer
+    CAMPUS_ESCALATION_MODEL         larger model for failed/low-confidence extractions
+    CAMPUS_EXTRACT_MIN_CONFIDENCE   confidence below which extraction escalates (default 0.5)
+
+Per-stage latency, token counts and the escalation rate are published through
+metrics.metrics (llm.<stage>.*) and the `llm_routing` snapshot section.
+"""
+
+import os
+from typing import Dict, Optional
+
+from metrics import metrics
+
+# Per-backend defaults used when a stage model isn't configured
+BACKEND_STAGE_DEFAULTS = {
+    'groq': {
+        'extract': 'llama-3.1-8b-instant',
+        'escalate': 'openai/gpt-oss-120b',
+    },
+}
+
+STAGES = ('extract', 'answer', 'escalate')
+
+
+class ModelRouter:
+    """Maps an LLM task ('extract', 'answer', 'escalate') to a model name."""
+
+    def __init__(self, default_model: Optional[str], stage_models: Optional[Dict[str, Optional[str]]] = None,
+                 min_confidence: float = 0.5):
+        self.default_model = default_model
+        self.stage_models = {k: v for k, v in (stage_models or {}).items() if v}
+        self.min_confidence = min_confidence
+        metrics.register_collector('llm_routing', self.snapshot)
+
+    @classmethod
+    def from_env(cls, backend_name: Optional[str], default_model: Optional[str]) -> 'ModelRouter':
+        defaults = BACKEND_STAGE_DEFAULTS.get(backend_name or '', {})
+        try:
+            min_confidence = float(os.environ.get('CAMPUS_EXTRACT_MIN_CONFIDENCE', 0.5))
+        except ValueError:
+            min_confidence = 0.5
+        return cls(default_model, {
+            'extract': os.environ.get('CAMPUS_EXTRACT_MODEL') or defaults.get('extract'),
+            'answer': os.environ.get('CAMPUS_ANSWER_MODEL') or defaults.get('answer'),
+            'escalate': os.environ.get('CAMPUS_ESCALATION_MODEL') or defaults.get('escalate'),
+        }, min_confidence)
+
+    def model_for(self, task: str) -> Optional[str]:
+        return self.stage_models.get(task) or self.default_model
+
+    def should_escalate(self, parsed: Optional[Dict]) -> bool:
+        """True when the extraction didn't parse or isn't confident enough.
+
+        An empty location is a valid answer (general questions name no building).
+        """
+        if not parsed:
+            return True
+        confidence = parsed.get('confidence')
+        try:
+            return confidence is not None and float(confidence) < self.min_confidence
+        except (TypeError, ValueError):
+            return False
+
+    @staticmethod
+    def record(task: str, duration_ms: float, usage: Optional[Dict]):
+        """Per-stage latency and token accounting."""
+        metrics.incr(f'llm.{task}.calls')
+        metrics.observe(f'llm.{task}.latency_ms', duration_ms)
+        usage = usage or {}
+        for key in ('prompt_tokens', 'completion_tokens'):
+            if usage.get(key):
+                metrics.incr(f'llm.{task}.{key}', usage[key])
+
+    def snapshot(self) -> Dict:
+        extract_calls = metrics.counter_value('llm.extract.calls')
+        escalations = metrics.counter_value('llm.extract.escalations')
+        return {
+            'models': {stage: self.model_for(stage) for stage in STAGES},
+            'min_confidence': self.min_confidence,
+            'extract_escalations': escalations,
+            'extract_escalation_rate': round(escalations / extract_calls, 4) if extract_calls else 0.0,
+        }
@@ -0,0 +1,165 @@
+"""
+Typed, slotted row models for the catalog.
+
+Building, POI and Route are immutable `__slots__` classes built straight from
+cursor tuples (`Building.select_sql()` lists the columns in field order), so a row
+costs one small object instead of a `dict(sqlite3.Row)` copy. Short
+low-cardinality strings (hours JSON, POI types, floors) are interned so
+thousands of rows share one copy.
+
+JSON columns stay as the stored text until first used. `Building.hours`,
+`POI.hours_json` and `Route.waypoint_list` decode them once and memoize the
+result on the instance.
+
+Rows also support read-only mapping access (`row['name']`, `row.get(...)`,
+`dict(row)`), so code written against `dict(row)` keeps working. `to_json()`
+is the explicit projection used for API responses.
+"""
+
+import sys
+import json
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+_MISSING = object()
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) and len(value) <= 128 else value
+
+
+def _decode(text) -> Any:
+    if not text or not isinstance(text, str):
+        return text or None
+    try:
+        return json.loads(text)
+    except ValueError:
+        return None
+
+
+class Row:
+    """Base class: fixed fields, frozen after construction, read-only mapping access."""
+
+    __slots__ = ()
+    TABLE = ''
+    FIELDS: Tuple[str, ...] = ()
+    INTERNED: Tuple[str, ...] = ()
+    # Slots starting with '_' hold memoized decoded values
+    _MEMO_SLOTS: Tuple[str, ...] = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._MEMO_SLOTS = tuple(s for s in cls.__slots__ if s.startswith('_'))
+
+    def __init__(self, *values):
+        if len(values) != len(self.FIELDS):
+            raise TypeError(f"{type(self).__name__} takes {len(self.FIELDS)} values, got {len(values)}")
+        setter = object.__setattr__
+        interned = self.INTERNED
+        for name, value in zip(self.FIELDS, values):
+            setter(self, name, _intern(value) if name in interned else value)
+        for name in self._MEMO_SLOTS:
+            setter(self, name, _MISSING)
+
+    @classmethod
+    def select_sql(cls, where: str = '') -> str:
+        return f"SELECT {', '.join(cls.FIELDS)} FROM {cls.TABLE} {where}".strip()
+
+    @classmethod
+    def from_row(cls, row) -> 'Row':
+        """Build from a cursor tuple in FIELDS order (see select_sql)."""
+        return cls(*row)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def _memo(self, slot: str, compute):
+        value = getattr(self, slot)
+        if value is _MISSING:
+            value = compute()
+            object.__setattr__(self, slot, value)
+        return value
+
+    # Read-only mapping access, for code written against dict(row)
+    def keys(self) -> Tuple[str, ...]:
+        return self.FIELDS
+
+    def __getitem__(self, key: str):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default=None):
+        return getattr(self, key) if key in self.FIELDS else default
+
+    def __contains__(self, key) -> bool:
+        return key in self.FIELDS
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.FIELDS)
+
+    def __len__(self) -> int:
+        return len(self.FIELDS)
+
+    def __eq__(self, other) -> bool:
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, f) == getattr(other, f) for f in self.FIELDS)
+
+    def __hash__(self) -> int:
+        return hash((type(self).__name__, self.id))
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(id={self.id!r}, name={getattr(self, 'name', None)!r})"
+
+    def to_json(self, fields: Optional[Tuple[str, ...]] = None) -> Dict:
+        """JSON-ready dict of the stored columns (or just `fields`), as the API has always returned them."""
+        return {name: getattr(self, name) for name in (fields or self.FIELDS)}
+
+
+class Building(Row):
+    __slots__ = ('id', 'name', 'aliases', 'latitude', 'longitude', 'address', 'description',
+                 'building_hours', 'image_url', 'building_code', '_hours', '_alias_list')
+    TABLE = 'buildings'
+    FIELDS = ('id', 'name', 'aliases', 'latitude', 'longitude', 'address', 'description',
+              'building_hours', 'image_url', 'building_code')
+    INTERNED = ('building_hours',)
+    # Projection used by the building list endpoint
+    SUMMARY_FIELDS = ('id', 'name', 'building_code', 'description', 'latitude', 'longitude', 'address')
+
+    @property
+    def hours(self) -> Optional[Dict[str, str]]:
+        """building_hours decoded from JSON (once)."""
+        return self._memo('_hours', lambda: _decode(self.building_hours))
+
+    @property
+    def alias_list(self) -> List[str]:
+        return self._memo('_alias_list', lambda: [a.strip() for a in (self.aliases or '').split(',') if a.strip()])
+
+
+class POI(Row):
+    __slots__ = ('id', 'name', 'building_id', 'floor', 'room_number', 'poi_type', 'description', 'hours',
+                 '_hours_json')
+    TABLE = 'poi'
+    FIELDS = ('id', 'name', 'building_id', 'floor', 'room_number', 'poi_type', 'description', 'hours')
+    INTERNED = ('floor', 'poi_type', 'hours')
+
+    @property
+    def hours_json(self) -> Optional[Dict[str, str]]:
+        """hours decoded from JSON (once)."""
+        return self._memo('_hours_json', lambda: _decode(self.hours))
+
+
+class Route(Row):
+    __slots__ = ('id', 'from_building_id', 'to_building_id', 'distance_meters', 'walk_time_minutes',
+                 'route_description', 'waypoints', '_waypoint_list')
+    TABLE = 'routes'
+    FIELDS = ('id', 'from_building_id', 'to_building_id', 'distance_meters', 'walk_time_minutes',
+              'route_description', 'waypoints')
+
+    @property
+    def waypoint_list(self) -> List:
+        """waypoints decoded from JSON (once); [] when absent or invalid."""
+        return self._memo('_waypoint_list', lambda: _decode(self.waypoints) or [])
+
+    def __repr__(self) -> str:
+        return f"Route(id={self.id!r}, {self.from_building_id!r} -> {self.to_building_id!r})"
@@ -0,0 +1,160 @@
+"""
+Open-now index over building and POI hours.
+
+Hours are compiled once per catalog snapshot into week-minute intervals
+(see hours.compile_hours). Most places share a handful of hours patterns, so
+the index groups entries by pattern and, for every pattern, keeps its sorted
+intervals; "what is open at T" then costs one bisect per distinct pattern
+instead of one hours parse per row.
+
+Entries are keyed ('building', id) or ('poi', id). Rows without parseable
+hours are left out (unknown rather than closed). After an admin edit
+(changes.py) `updated()` re-files only the changed rows.
+"""
+
+from bisect import bisect_right
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+from hours import MINUTES_PER_WEEK, always_open, compile_hours, format_minute, interval_status, week_minute
+
+Intervals = Tuple[Tuple[int, int], ...]
+
+
+class OpenNowIndex:
+    """Answers "open at T" and "closing within N minutes" from a Catalog."""
+
+    def __init__(self):
+        self.patterns: List[Intervals] = []
+        self.members: List[List[Dict]] = []
+        self.by_key: Dict[Tuple[str, int], int] = {}
+
+    @classmethod
+    def build(cls, catalog) -> 'OpenNowIndex':
+        index = cls()
+        pattern_ids: Dict[Intervals, int] = {}
+        for building in catalog.buildings.values():
+            index._add(pattern_ids, 'building', building, building.get('building_hours'), {
+                'name': building.get('name'),
+            })
+        for poi in catalog.pois.values():
+            index._add(pattern_ids, 'poi', poi, poi.get('hours'), {
+                'name': poi.get('name'),
+                'poi_type': poi.get('poi_type'),
+                'building_id': poi.get('building_id'),
+            })
+        return index
+
+    def updated(self, catalog, changed: Dict[str, Set[int]]) -> 'OpenNowIndex':
+        """A copy for `catalog` with the changed buildings and POIs re-filed; other patterns are shared."""
+        index = OpenNowIndex()
+        index.patterns = list(self.patterns)
+        index.members = list(self.members)
+        index.by_key = dict(self.by_key)
+        copied: Set[int] = set()
+        for kind in ('building', 'poi'):
+            for row_id in changed.get(kind, ()):
+                pattern = index.by_key.pop((kind, row_id), None)
+                if pattern is not None:
+                    index.members[pattern] = [e for e in index.members[pattern]
+                                              if e['id'] != row_id or e['kind'] != kind]
+                    copied.add(pattern)
+        pattern_ids = {intervals: i for i, intervals in enumerate(index.patterns)}
+        for building_id in changed.get('building', ()):
+            building = catalog.buildings.get(building_id)
+            if building is not None:
+                index._add(pattern_ids, 'building', building, building.get('building_hours'), {
+                    'name': building.get('name'),
+                }, copied)
+        for poi_id in changed.get('poi', ()):
+            poi = catalog.pois.get(poi_id)
+            if poi is not None:
+                index._add(pattern_ids, 'poi', poi, poi.get('hours'), {
+                    'name': poi.get('name'),
+                    'poi_type': poi.get('poi_type'),
+                    'building_id': poi.get('building_id'),
+                }, copied)
+        return index
+
+    def _add(self, pattern_ids: Dict[Intervals, int], kind: str, row: Dict, hours, fields: Dict,
+             copied: Optional[Set[int]] = None):
+        intervals = compile_hours(hours)
+        if not intervals:
+            return
+        pattern = pattern_ids.get(intervals)
+        if pattern is None:
+            pattern = pattern_ids[intervals] = len(self.patterns)
+            self.patterns.append(intervals)
+            self.members.append([])
+        elif copied is not None and pattern not in copied:
+            # Member lists are shared with the snapshot this index was updated from
+            self.members[pattern] = list(self.members[pattern])
+            copied.add(pattern)
+        self.members[pattern].append(dict(fields, kind=kind, id=row['id']))
+        self.by_key[(kind, row['id'])] = pattern
+
+    def __len__(self) -> int:
+        return len(self.by_key)
+
+    @staticmethod
+    def _matches(entry: Dict, kind: Optional[str]) -> bool:
+        if not kind:
+            return True
+        if kind in ('building', 'poi'):
+            return entry['kind'] == kind
+        return (entry.get('poi_type') or '').lower() == kind.lower()
+
+    @staticmethod
+    def _closing_minute(intervals: Intervals, t: int) -> Optional[int]:
+        """Week minute at which the interval containing t ends, or None if closed at t."""
+        i = bisect_right(intervals, (t, MINUTES_PER_WEEK + 1)) - 1
+        if i < 0 or not intervals[i][0] <= t < intervals[i][1]:
+            return None
+        end = intervals[i][1]
+        if end == MINUTES_PER_WEEK and intervals[0][0] == 0:
+            end += intervals[0][1]
+        return end
+
+    def open_at(self, when: datetime, kind: Optional[str] = None,
+                closing_within: Optional[int] = None) -> List[Dict]:
+        """Entries open at `when`, soonest-closing first (places open 24/7 last, with no closing time).
+
+        kind filters to 'building', 'poi' or a poi_type ('dining', 'library', ...).
+        closing_within keeps only entries that close within that many minutes.
+        """
+        t = week_minute(when)
+        results = []
+        for pattern, intervals in enumerate(self.patterns):
+            if always_open(intervals):
+                if closing_within is not None:
+                    continue
+                closes_at = remaining = None
+            else:
+                end = self._closing_minute(intervals, t)
+                if end is None:
+                    continue
+                remaining = end - t
+                if closing_within is not None and remaining > closing_within:
+                    continue
+                closes_at = format_minute(end)
+            for entry in self.members[pattern]:
+                if self._matches(entry, kind):
+                    results.append(dict(entry, closes_at=closes_at, minutes_until_close=remaining))
+        results.sort(key=lambda e: (e['minutes_until_close'] is None, e['minutes_until_close'] or 0,
+                                    e['kind'], e['id']))
+        return results
+
+    def closing_within(self, when: datetime, minutes: int, kind: Optional[str] = None) -> List[Dict]:
+        return self.open_at(when, kind=kind, closing_within=minutes)
+
+    def status(self, kind: str, entry_id: int, when: datetime) -> Optional[Dict]:
+        """Open/closed status for one building or POI; None if its hours are unknown."""
+        pattern = self.by_key.get((kind, entry_id))
+        if pattern is None:
+            return None
+        return interval_status(self.patterns[pattern], when)
+
+
+def open_now_index(catalog) -> OpenNowIndex:
+    """The OpenNowIndex for a catalog snapshot, built on first use."""
+    return catalog.derived('open_now', OpenNowIndex.build)
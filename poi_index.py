@@ -0,0 +1,233 @@
+"""
+Inverted index over POIs for typed and free-text search.
+
+Built once per catalog snapshot (`poi_index(catalog)`), it maps
+    poi_type        -> POI ids   ("dining", "computer_lab", ...)
+    name token      -> POI ids   ("chemistry", "lab", ...)
+    floor / room    -> POI ids   (tokens "floor:2", "room:201")
+so "all computer labs" or "chemistry lab on floor 2" is a few set
+intersections instead of a table scan. Results can be ranked by walking
+distance from a point using the parent building's coordinates.
+
+CATEGORY_TERMS maps everyday words ("food", "printer", "study") to poi_type so
+category questions sent to /api can be answered from the index directly.
+"""
+
+import re
+import math
+from bisect import bisect_left
+from typing import Dict, List, Optional, Set, Tuple
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Everyday words -> poi_type; multi-word phrases are matched before single words
+CATEGORY_TERMS = {
+    'dining': ('dining', 'food', 'eat', 'eating', 'lunch', 'breakfast', 'dinner', 'cafe', 'cafeteria',
+               'coffee', 'restaurant', 'snack', 'snacks'),
+    'computer_lab': ('computer lab', 'computer labs', 'computers', 'computer', 'printer', 'printers',
+                     'printing', 'print'),
+    'study_space': ('study space', 'study room', 'study', 'quiet'),
+    'lab': ('lab', 'labs', 'laboratory', 'laboratories'),
+    'facility': ('facility', 'facilities', 'restroom', 'restrooms', 'bathroom', 'toilet', 'pool'),
+    'service': ('service', 'services', 'help desk', 'reference desk', 'office'),
+}
+
+# Words that mark a category question rather than a named place
+CATEGORY_CUES = ('where can i', 'nearest', 'closest', 'any ', 'all ', 'list', 'which buildings', 'somewhere')
+
+EARTH_RADIUS_M = 6371000.0
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return _TOKEN_RE.findall((text or '').lower())
+
+
+def haversine_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def parse_point(value) -> Optional[Tuple[float, float]]:
+    """(lat, lng) from "18.01,-76.75", a [lat, lng] pair or {"lat": .., "lng": ..}; None if invalid."""
+    if not value:
+        return None
+    try:
+        if isinstance(value, str):
+            lat, lng = (float(v) for v in value.split(','))
+        elif isinstance(value, dict):
+            lat, lng = float(value['lat']), float(value.get('lng', value.get('lon')))
+        else:
+            lat, lng = (float(v) for v in value)
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return lat, lng
+
+
+def category_for(text: str) -> Optional[str]:
+    """poi_type named by everyday words in `text` ("where can I get food?" -> "dining")."""
+    lowered = ' ' + ' '.join(tokenize(text)) + ' '
+    for phrase_len in (2, 1):
+        for poi_type, terms in CATEGORY_TERMS.items():
+            for term in terms:
+                if len(term.split()) == phrase_len and f' {term} ' in lowered:
+                    return poi_type
+    return None
+
+
+def is_category_question(text: str) -> bool:
+    lowered = text.lower()
+    return any(cue in lowered for cue in CATEGORY_CUES)
+
+
+class POIIndex:
+    """Inverted index from POI type, name tokens and floor/room to POI ids."""
+
+    def __init__(self, pois: Dict[int, Dict], buildings: Dict[int, Dict]):
+        self.pois = pois
+        self.buildings = buildings
+        self.by_type: Dict[str, Set[int]] = {}
+        self.by_token: Dict[str, Set[int]] = {}
+        self._tokens: List[str] = []
+
+    @classmethod
+    def build(cls, catalog) -> 'POIIndex':
+        index = cls(catalog.pois, catalog.buildings)
+        for poi_id, poi in catalog.pois.items():
+            if poi.get('poi_type'):
+                index.by_type.setdefault(poi['poi_type'].lower(), set()).add(poi_id)
+            for token in index._poi_tokens(poi):
+                index.by_token.setdefault(token, set()).add(poi_id)
+        index._tokens = sorted(index.by_token)
+        return index
+
+    def updated(self, catalog, changed: Dict[str, Set[int]]) -> 'POIIndex':
+        """A copy for `catalog` with only the changed POIs' postings rewritten."""
+        index = POIIndex(catalog.pois, catalog.buildings)
+        index.by_type = dict(self.by_type)
+        index.by_token = dict(self.by_token)
+        index._tokens = self._tokens
+        copied: Set[Tuple[str, str]] = set()
+        # Whether a token appeared or disappeared, i.e. the sorted token list must be rebuilt
+        new_tokens = [False]
+
+        def postings(table: str, key: str) -> Set[int]:
+            # Copy-on-write: the sets are shared with this index until changed
+            target = index.by_type if table == 'type' else index.by_token
+            if (table, key) not in copied:
+                if table == 'token' and key not in target:
+                    new_tokens[0] = True
+                target[key] = set(target.get(key, ()))
+                copied.add((table, key))
+            return target[key]
+
+        for poi_id in changed.get('poi', ()):
+            old, new = self.pois.get(poi_id), catalog.pois.get(poi_id)
+            if old is not None:
+                if old.get('poi_type'):
+                    postings('type', old['poi_type'].lower()).discard(poi_id)
+                for token in self._poi_tokens(old):
+                    postings('token', token).discard(poi_id)
+            if new is not None:
+                if new.get('poi_type'):
+                    postings('type', new['poi_type'].lower()).add(poi_id)
+                for token in self._poi_tokens(new):
+                    postings('token', token).add(poi_id)
+        for table, key in copied:
+            target = index.by_type if table == 'type' else index.by_token
+            if not target[key]:
+                del target[key]
+                new_tokens[0] = new_tokens[0] or table == 'token'
+        if new_tokens[0]:
+            index._tokens = sorted(index.by_token)
+        return index
+
+    @staticmethod
+    def _poi_tokens(poi: Dict) -> Set[str]:
+        tokens = set(tokenize(poi.get('name')))
+        tokens.update(tokenize((poi.get('poi_type') or '').replace('_', ' ')))
+        if poi.get('floor') not in (None, ''):
+            tokens.add(f"floor:{str(poi['floor']).strip().lower()}")
+        if poi.get('room_number') not in (None, ''):
+            room = str(poi['room_number']).strip().lower()
+            tokens.add(f"room:{room}")
+            tokens.add(room)
+        return tokens
+
+    def __len__(self) -> int:
+        return len(self.pois)
+
+    def types(self) -> List[str]:
+        return sorted(self.by_type)
+
+    def _ids_for_token(self, token: str) -> Set[int]:
+        """POIs with `token`, or with any token it prefixes (3+ characters: "chem" -> "chemistry")."""
+        ids = self.by_token.get(token)
+        if len(token) < 3:
+            return set(ids or ())
+        matched = set(ids or ())
+        i = bisect_left(self._tokens, token)
+        while i < len(self._tokens) and self._tokens[i].startswith(token):
+            matched |= self.by_token[self._tokens[i]]
+            i += 1
+        return matched
+
+    def match(self, poi_type: Optional[str] = None, q: Optional[str] = None,
+              floor: Optional[str] = None, room: Optional[str] = None) -> Set[int]:
+        """Ids of POIs matching every given filter (all POIs when no filter is given)."""
+        sets: List[Set[int]] = []
+        if poi_type:
+            sets.append(self.by_type.get(poi_type.lower(), set()))
+        for token in tokenize(q):
+            sets.append(self._ids_for_token(token))
+        if floor:
+            sets.append(self.by_token.get(f"floor:{str(floor).strip().lower()}", set()))
+        if room:
+            sets.append(self.by_token.get(f"room:{str(room).strip().lower()}", set()))
+        if not sets:
+            return set(self.pois)
+        sets.sort(key=len)
+        result = set(sets[0])
+        for other in sets[1:]:
+            result &= other
+            if not result:
+                break
+        return result
+
+    def search(self, poi_type: Optional[str] = None, q: Optional[str] = None,
+               near: Optional[Tuple[float, float]] = None, floor: Optional[str] = None,
+               room: Optional[str] = None, limit: Optional[int] = 20) -> List[Dict]:
+        """Matching POIs with their building, nearest first when `near` is given.
+
+        Repeated rows (same name, building, floor and room) are returned once.
+        """
+        results = []
+        seen = set()
+        for poi_id in sorted(self.match(poi_type, q, floor, room)):
+            poi = self.pois[poi_id]
+            building = self.buildings.get(poi.get('building_id')) or {}
+            key = (poi.get('name'), building.get('name'), poi.get('floor'), poi.get('room_number'))
+            if key in seen:
+                continue
+            seen.add(key)
+            entry = dict(poi, building_name=building.get('name'),
+                         latitude=building.get('latitude'), longitude=building.get('longitude'))
+            if near and building.get('latitude') is not None and building.get('longitude') is not None:
+                entry['distance_meters'] = round(haversine_m(near[0], near[1],
+                                                             building['latitude'], building['longitude']))
+            results.append(entry)
+
+        if near:
+            results.sort(key=lambda e: (e.get('distance_meters') is None, e.get('distance_meters') or 0, e['id']))
+        elif q:
+            wanted = set(tokenize(q))
+            results.sort(key=lambda e: (-len(wanted & set(tokenize(e.get('name')))), e['id']))
+        return results[:limit] if limit else results
+
+
+def poi_index(catalog) -> POIIndex:
+    """The POIIndex for a catalog snapshot, built on first use."""
+    return catalog.derived('poi_index', POIIndex.build)
@@ -0,0 +1,222 @@
+"""
+Prompt building and token accounting for the navigator's LLM calls.
+
+- Templates are parsed once at import (`CompiledTemplate`) and rendered by
+  joining literal chunks with field values.
+- System prompts are module constants and every user prompt starts with the
+  same fixed lines, so the provider sees a stable prefix it can cache.
+- Answer context is trimmed to the fields the query_type needs (hours questions
+  don't get the description, directions don't get the address, ...), and
+  `building_hours` JSON is rendered as one compact line.
+- Passages retrieved for the question (retrieval.py) are listed under
+  "Related" and are the first thing dropped when over budget; without a
+  resolved building they are the only facts.
+- `estimate_tokens` is a local, dependency-free estimate used to keep each
+  prompt inside the request's token budget (CAMPUS_REQUEST_TOKEN_BUDGET).
+"""
+
+import os
+import json
+import math
+from string import Formatter
+from typing import Dict, List, Optional, Tuple
+
+from hours import describe_status
+
+DEFAULT_REQUEST_TOKEN_BUDGET = 1200
+MIN_ANSWER_PROMPT_TOKENS = 120
+
+EXTRACT_SYSTEM_PROMPT = """Extract the campus place from the user's query. Reply with JSON only:
+{"location": str, "query_type": "location"|"directions"|"hours"|"info", "from_location": str (directions only), "confidence": 0.0-1.0}
+Example: "How do I get from library to student center?" -> {"location": "student center", "from_location": "library", "query_type": "directions", "confidence": 0.9}"""
+
+ANSWER_SYSTEM_PROMPT = """You are a friendly campus navigation assistant. Answer in 2-3 concise, conversational sentences using only the facts given."""
+
+# Fields included in the answer context per query_type, in prompt order
+CONTEXT_FIELDS = {
+    'hours': ('name', 'open_now', 'hours'),
+    'location': ('name', 'address', 'description'),
+    'directions': ('from', 'to', 'walk_time', 'distance', 'directions'),
+    'info': ('name', 'address', 'description', 'open_now', 'hours'),
+}
+
+# Dropped first when a prompt is over budget
+TRIM_ORDER = ('description', 'hours', 'address', 'distance', 'directions')
+
+INSTRUCTIONS = {
+    'hours': "Tell the user the opening hours.",
+    'location': "Tell the user where it is and what's there.",
+    'directions': "Give clear walking directions.",
+    'info': "Tell the user where it is and what's there.",
+    'retrieved': "Answer from the campus facts below. If they don't answer the question, say so briefly and suggest asking about a specific building.",
+    'not_found': "We couldn't find that location on campus. Apologize briefly and ask if they meant something else or want the list of locations.",
+    'polish': "Rewrite the draft answer to sound friendly and natural. Keep every fact and add none.",
+}
+
+FIELD_LABELS = {
+    'name': 'Name',
+    'address': 'Address',
+    'description': 'Description',
+    'hours': 'Hours',
+    'open_now': 'Open Now',
+    'from': 'From',
+    'to': 'To',
+    'walk_time': 'Walking Time',
+    'distance': 'Distance',
+    'directions': 'Directions',
+    'related': 'Related',
+}
+
+
+class CompiledTemplate:
+    """A str.format-style template parsed once into literal/field chunks."""
+
+    __slots__ = ('source', '_chunks')
+
+    def __init__(self, source: str):
+        self.source = source
+        self._chunks: List[Tuple[str, Optional[str]]] = [
+            (literal, field) for literal, field, _, _ in Formatter().parse(source)
+        ]
+
+    def render(self, **values) -> str:
+        parts = []
+        for literal, field in self._chunks:
+            parts.append(literal)
+            if field is not None:
+                parts.append(str(values[field]))
+        return ''.join(parts)
+
+
+ANSWER_TEMPLATE = CompiledTemplate("Task: {instruction}\nFacts:\n{facts}\nUser question: {query}")
+NOT_FOUND_TEMPLATE = CompiledTemplate("Task: {instruction}\nUser question: {query}")
+POLISH_TEMPLATE = CompiledTemplate("Task: {instruction}\nDraft: {draft}\nUser question: {query}")
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Rough token count (about 4 characters per token for English)."""
+    if not text:
+        return 0
+    return int(math.ceil(len(text) / 4.0))
+
+
+def request_token_budget() -> int:
+    try:
+        return int(os.environ.get('CAMPUS_REQUEST_TOKEN_BUDGET', DEFAULT_REQUEST_TOKEN_BUDGET))
+    except ValueError:
+        return DEFAULT_REQUEST_TOKEN_BUDGET
+
+
+def format_hours(hours) -> Optional[str]:
+    """Render building_hours JSON ({"mon-fri": "7:00 AM - 11:00 PM"}) as one line."""
+    if not hours:
+        return None
+    if isinstance(hours, str):
+        try:
+            hours = json.loads(hours)
+        except ValueError:
+            return hours
+    if isinstance(hours, dict):
+        return "; ".join(f"{days.title()} {span}" for days, span in hours.items())
+    return str(hours)
+
+
+def _context_values(building: Optional[Dict], route: Optional[Dict], from_building: Optional[Dict]) -> Dict[str, Optional[str]]:
+    building = building or {}
+    values = {
+        'name': building.get('name'),
+        'address': building.get('address'),
+        'description': building.get('description'),
+        'hours': format_hours(building.get('building_hours')),
+    }
+    if route:
+        values.update({
+            'from': (from_building or {}).get('name'),
+            'to': building.get('name'),
+            'walk_time': f"{route.get('walk_time_minutes')} min" if route.get('walk_time_minutes') is not None else None,
+            'distance': f"{route.get('distance_meters')} m" if route.get('distance_meters') is not None else None,
+            'directions': route.get('route_description'),
+        })
+    return values
+
+
+def build_polish_prompt(query_data: Dict, draft: str) -> Tuple[str, str, Dict]:
+    """Return (system_prompt, user_prompt, meta) asking the LLM to rephrase a local draft."""
+    user = POLISH_TEMPLATE.render(instruction=INSTRUCTIONS['polish'], draft=draft,
+                                  query=query_data.get('original_query', ''))
+    return ANSWER_SYSTEM_PROMPT, user, {
+        'query_type': 'polish',
+        'fields': ['draft'],
+        'dropped': [],
+        'prompt_tokens_est': estimate_tokens(ANSWER_SYSTEM_PROMPT) + estimate_tokens(user),
+    }
+
+
+def build_answer_prompt(query_data: Dict, building: Optional[Dict], route: Optional[Dict] = None,
+                        from_building: Optional[Dict] = None, max_tokens: Optional[int] = None,
+                        related: Optional[List[str]] = None) -> Tuple[str, str, Dict]:
+    """Return (system_prompt, user_prompt, meta) for the answer stage.
+
+    `related` are retrieved passages (best first) added as extra facts.
+    meta holds the query_type used, the fields kept and dropped, the number
+    of related passages kept and the estimated prompt tokens.
+    """
+    query = query_data.get('original_query', '')
+    related = list(related or ())
+    system_tokens = estimate_tokens(ANSWER_SYSTEM_PROMPT)
+    if not building and not related:
+        user = NOT_FOUND_TEMPLATE.render(instruction=INSTRUCTIONS['not_found'], query=query)
+        return ANSWER_SYSTEM_PROMPT, user, {
+            'query_type': 'not_found',
+            'fields': [],
+            'dropped': [],
+            'related': 0,
+            'prompt_tokens_est': system_tokens + estimate_tokens(user),
+        }
+
+    if not building:
+        query_type = 'retrieved'
+        values: Dict[str, Optional[str]] = {}
+        fields: List[str] = []
+    else:
+        query_type = query_data.get('query_type', 'info')
+        if query_type == 'directions' and not route:
+            query_type = 'location'
+        if query_type not in CONTEXT_FIELDS:
+            query_type = 'info'
+        values = _context_values(building, route, from_building)
+        values['open_now'] = describe_status(query_data.get('open_now'))
+        fields = [f for f in CONTEXT_FIELDS[query_type] if values.get(f)]
+    dropped: List[str] = []
+
+    def render() -> str:
+        lines = [f"{FIELD_LABELS[f]}: {values[f]}" for f in fields]
+        if related and fields:
+            lines.append(f"{FIELD_LABELS['related']}:")
+        lines.extend(f"- {passage}" for passage in related)
+        facts = "\n".join(lines)
+        return ANSWER_TEMPLATE.render(instruction=INSTRUCTIONS[query_type], facts=facts, query=query)
+
+    user = render()
+    if max_tokens is not None:
+        # Related passages go first, least relevant first; a prompt built only from them keeps one
+        while len(related) > (0 if fields else 1) and system_tokens + estimate_tokens(user) > max_tokens:
+            related.pop()
+            dropped.append('related')
+            user = render()
+        for field in TRIM_ORDER:
+            if system_tokens + estimate_tokens(user) <= max_tokens:
+                break
+            # Always keep at least the name/destination and one supporting fact
+            if field in fields and len(fields) > 2:
+                fields.remove(field)
+                dropped.append(field)
+                user = render()
+
+    return ANSWER_SYSTEM_PROMPT, user, {
+        'query_type': query_type,
+        'fields': list(fields),
+        'dropped': dropped,
+        'related': len(related),
+        'prompt_tokens_est': system_tokens + estimate_tokens(user),
+    }
@@ -0,0 +1,343 @@
+"""
+Append-only log of the queries the navigator answers.
+
+Every processed query becomes one entry: the query text (raw and normalized),
+the resolved building ids, the path taken (category / followup / cached /
+local / llm extraction), the response source, stage timings and cache hits.
+The entries are captured traffic that caches and fast paths can be tuned
+against:
+
+    python query_log.py report                  # top unresolved queries, cache hit rates
+    python benchmarks/replay_queries.py --url http://127.0.0.1:5000 --speedup 10
+
+Writes never happen on the request thread. record() puts the entry on a
+bounded queue and a background thread writes it out in batches. When the queue
+is full the entry is dropped and counted (query_log.dropped), so a slow disk
+can't stall requests.
+
+The log is a JSONL file, or a SQLite database when the path ends in .db or
+.sqlite. A JSONL file is rotated once it passes the size limit, and the most
+recent backups are kept (query_log.jsonl.1, .2, ...). With several server
+processes, put `{pid}` in the path so each process writes its own file. A
+shared SQLite file also works.
+
+Configuration (environment):
+    CAMPUS_QUERY_LOG            log path, e.g. logs/queries.jsonl   (default unset = off)
+    CAMPUS_QUERY_LOG_MAX_MB     rotate JSONL files above this size  (default 50)
+    CAMPUS_QUERY_LOG_BACKUPS    rotated files kept                  (default 5)
+    CAMPUS_QUERY_LOG_BUFFER     entries queued before dropping      (default 10000)
+"""
+
+import os
+import re
+import sys
+import json
+import glob
+import queue
+import atexit
+import sqlite3
+import argparse
+import threading
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from metrics import metrics
+
+SQLITE_SUFFIXES = ('.db', '.sqlite', '.sqlite3')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS query_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    normalized TEXT,
+    path TEXT,
+    response_source TEXT,
+    resolved INTEGER,
+    entry TEXT NOT NULL
+)
+'''
+
+_SPACE_RE = re.compile(r'\s+')
+_EDGE_PUNCT_RE = re.compile(r'^[\W_]+|[\W_]+$')
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def normalize_query(text: str) -> str:
+    """Lowercased, whitespace-collapsed query without leading/trailing punctuation."""
+    return _EDGE_PUNCT_RE.sub('', _SPACE_RE.sub(' ', (text or '').strip().lower()))
+
+
+def _is_sqlite(path: str) -> bool:
+    return path.lower().endswith(SQLITE_SUFFIXES)
+
+
+class QueryLog:
+    """Buffered, off-thread writer of query log entries."""
+
+    _STOP = object()
+
+    def __init__(self, path: str, max_bytes: int = 50 * 1024 * 1024, backups: int = 5,
+                 buffer_size: int = 10000, batch_size: int = 500):
+        self.path_template = path
+        self.max_bytes = max(0, int(max_bytes))
+        self.backups = max(0, int(backups))
+        self.buffer_size = max(1, int(buffer_size))
+        self.batch_size = max(1, int(batch_size))
+        self.written = 0
+        self.dropped = 0
+        # The writer thread belongs to the process that started it; a forked
+        # worker starts its own on first record() (see _start)
+        self._pid = None
+        self._queue: Optional[queue.Queue] = None
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        metrics.register_collector('query_log', self.snapshot)
+        atexit.register(self.close)
+
+    @classmethod
+    def from_env(cls) -> Optional['QueryLog']:
+        """A QueryLog for CAMPUS_QUERY_LOG, or None when query logging is off."""
+        path = os.environ.get('CAMPUS_QUERY_LOG', '').strip()
+        if not path:
+            return None
+        return cls(
+            path,
+            max_bytes=int(_env_number('CAMPUS_QUERY_LOG_MAX_MB', 50) * 1024 * 1024),
+            backups=int(_env_number('CAMPUS_QUERY_LOG_BACKUPS', 5)),
+            buffer_size=int(_env_number('CAMPUS_QUERY_LOG_BUFFER', 10000)),
+        )
+
+    @property
+    def path(self) -> str:
+        return self.path_template.replace('{pid}', str(os.getpid()))
+
+    def _start(self) -> queue.Queue:
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._queue = queue.Queue(maxsize=self.buffer_size)
+                self._thread = threading.Thread(target=self._run, args=(self._queue, self.path),
+                                                name='query-log-writer', daemon=True)
+                self._thread.start()
+        return self._queue
+
+    def record(self, entry: Dict):
+        """Queue an entry for writing; never blocks the caller."""
+        q = self._queue if self._pid == os.getpid() else self._start()
+        try:
+            q.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+            metrics.incr('query_log.dropped')
+
+    def close(self, timeout: float = 5.0):
+        """Write out what is queued and stop the writer thread (this process's only)."""
+        if self._pid != os.getpid() or self._thread is None:
+            return
+        thread, q = self._thread, self._queue
+        self._pid = self._thread = self._queue = None
+        try:
+            q.put(self._STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        thread.join(timeout)
+
+    def snapshot(self) -> Dict:
+        return {
+            'path': self.path,
+            'queued': self._queue.qsize() if self._queue is not None and self._pid == os.getpid() else 0,
+            'written': self.written,
+            'dropped': self.dropped,
+        }
+
+    # Writer thread
+
+    def _run(self, q: queue.Queue, path: str):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        sink = _SQLiteSink(path) if _is_sqlite(path) else _JSONLSink(path, self.max_bytes, self.backups)
+        try:
+            while True:
+                item = q.get()
+                batch = []
+                stop = item is self._STOP
+                if not stop:
+                    batch.append(item)
+                while not stop and len(batch) < self.batch_size:
+                    try:
+                        item = q.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is self._STOP:
+                        stop = True
+                    else:
+                        batch.append(item)
+                if batch:
+                    try:
+                        sink.write(batch)
+                        self.written += len(batch)
+                        metrics.incr('query_log.written', len(batch))
+                    except (OSError, sqlite3.Error) as e:
+                        self.dropped += len(batch)
+                        metrics.incr('query_log.dropped', len(batch))
+                        print(f"Query log {path} write failed: {e}", file=sys.stderr)
+                if stop:
+                    return
+        finally:
+            sink.close()
+
+
+class _JSONLSink:
+    def __init__(self, path: str, max_bytes: int, backups: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def write(self, batch: List[Dict]):
+        # One write per batch keeps lines from interleaving across processes
+        self._file.write(''.join(json.dumps(entry, separators=(',', ':'), default=str) + '\n'
+                                 for entry in batch))
+        self._file.flush()
+        if self.max_bytes and self._file.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        self._file.close()
+        if self.backups:
+            for i in range(self.backups - 1, 0, -1):
+                older = f"{self.path}.{i}"
+                if os.path.exists(older):
+                    os.replace(older, f"{self.path}.{i + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def close(self):
+        self._file.close()
+
+
+class _SQLiteSink:
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(SCHEMA)
+        self._conn.commit()
+
+    def write(self, batch: List[Dict]):
+        self._conn.executemany(
+            'INSERT INTO query_log (ts, normalized, path, response_source, resolved, entry) VALUES (?, ?, ?, ?, ?, ?)',
+            [(entry.get('ts'), entry.get('normalized'), entry.get('path'), entry.get('response_source'),
+              1 if entry.get('resolved') else 0, json.dumps(entry, separators=(',', ':'), default=str))
+             for entry in batch])
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+def log_files(path: str) -> List[str]:
+    """The log files behind `path`, oldest first: rotated backups, then the live file.
+
+    `{pid}` in the path matches every process's file.
+    """
+    pattern = path.replace('{pid}', '*')
+    files = []
+    for live in sorted(glob.glob(pattern)) if '*' in pattern else [pattern]:
+        backups = [p for p in glob.glob(glob.escape(live) + '.*') if p.rsplit('.', 1)[-1].isdigit()]
+        backups.sort(key=lambda p: int(p.rsplit('.', 1)[-1]), reverse=True)
+        files.extend(backups)
+        if os.path.exists(live):
+            files.append(live)
+    return files
+
+
+def read_entries(path: str) -> Iterator[Dict]:
+    """Every entry in the log at `path` (JSONL with backups, or SQLite), roughly oldest first."""
+    for file_path in log_files(path):
+        if _is_sqlite(file_path):
+            conn = sqlite3.connect(file_path)
+            try:
+                for (entry,) in conn.execute('SELECT entry FROM query_log ORDER BY id'):
+                    yield json.loads(entry)
+            finally:
+                conn.close()
+            continue
+        with open(file_path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # A torn last line from a crash; skip it
+                    continue
+
+
+def summarize(entries: Iterable[Dict], top: int = 20) -> Dict:
+    """Top unresolved queries, path/source mix, cache hit rates and stage timings."""
+    total = 0
+    unresolved = Counter()
+    paths = Counter()
+    sources = Counter()
+    cache_hits = Counter()
+    timings: Dict[str, List[float]] = {}
+    for entry in entries:
+        total += 1
+        paths[entry.get('path')] += 1
+        sources[entry.get('response_source')] += 1
+        if not entry.get('resolved'):
+            unresolved[entry.get('normalized') or normalize_query(entry.get('query', ''))] += 1
+        for name, hit in (entry.get('cache') or {}).items():
+            cache_hits[(name, bool(hit))] += 1
+        for stage, ms in (entry.get('timings_ms') or {}).items():
+            if ms is not None:
+                timings.setdefault(stage, []).append(ms)
+
+    def rate(name):
+        hits, misses = cache_hits[(name, True)], cache_hits[(name, False)]
+        return round(hits / (hits + misses), 4) if hits + misses else None
+
+    stage_summary = {}
+    for stage, values in sorted(timings.items()):
+        values.sort()
+        stage_summary[stage] = {
+            'count': len(values),
+            'p50': round(values[len(values) // 2], 2),
+            'p99': round(values[min(len(values) - 1, int(round(0.99 * (len(values) - 1))))], 2),
+        }
+
+    cache_names = sorted({name for name, _ in cache_hits})
+    return {
+        'queries': total,
+        'unresolved': sum(unresolved.values()),
+        'top_unresolved': [{'query': q, 'count': n} for q, n in unresolved.most_common(top)],
+        'paths': dict(paths.most_common()),
+        'response_sources': dict(sources.most_common()),
+        'cache_hit_rates': {name: rate(name) for name in cache_names},
+        'timings_ms': stage_summary,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize the query log")
+    parser.add_argument('command', choices=['report'], nargs='?', default='report')
+    parser.add_argument('--log', default=os.environ.get('CAMPUS_QUERY_LOG'),
+                        help="log path (default CAMPUS_QUERY_LOG); {pid} matches every process's file")
+    parser.add_argument('--top', type=int, default=20, help="unresolved queries to list")
+    args = parser.parse_args()
+    if not args.log:
+        parser.error("no log path: pass --log or set CAMPUS_QUERY_LOG")
+    print(json.dumps(summarize(read_entries(args.log), args.top), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Walking isochrones: everything reachable from a building within N minutes.
+
+Reachability runs a single-source Dijkstra over the route graph and stops
+expanding once a walk exceeds the time limit. Results are cached per (source,
+minutes rounded up to BUCKET_MINUTES). The cache lives on the catalog snapshot
+(`reachability(catalog)`). It is kept across admin edits that leave the routes
+alone (building names and POIs are read at answer time) and dropped otherwise.
+A cached search for a larger bucket is filtered down to the exact minutes
+asked for.
+
+The optional polygon is the convex hull of every point a walker can reach:
+the reached buildings, the waypoints of the paths to them, and the part of
+each outgoing route that can still be walked before time runs out.
+"""
+
+import math
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+from metrics import metrics
+from poi_index import haversine_m
+from route_graph import RouteGraph, route_graph
+
+BUCKET_MINUTES = 5
+MAX_MINUTES = 120
+DEFAULT_CACHE_SIZE = 1024
+
+POI_FIELDS = ('id', 'name', 'poi_type', 'floor', 'room_number')
+
+Point = Tuple[float, float]
+
+
+def convex_hull(points: List[Point]) -> List[List[float]]:
+    """Convex hull (Andrew's monotone chain), counter-clockwise, as [lat, lng] pairs."""
+    pts = sorted(set(points))
+    if len(pts) <= 2:
+        return [list(p) for p in pts]
+
+    def cross(o, a, b):
+        return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+    lower: List[Point] = []
+    for p in pts:
+        while len(lower) >= 2 and cross(lower[-2], lower[-1], p) <= 0:
+            lower.pop()
+        lower.append(p)
+    upper: List[Point] = []
+    for p in reversed(pts):
+        while len(upper) >= 2 and cross(upper[-2], upper[-1], p) <= 0:
+            upper.pop()
+        upper.append(p)
+    return [list(p) for p in lower[:-1] + upper[:-1]]
+
+
+def along(points: List[Point], fraction: float) -> List[Point]:
+    """The first `fraction` (0-1) of a polyline, by walking distance."""
+    if fraction >= 1 or len(points) < 2:
+        return list(points)
+    lengths = [haversine_m(a[0], a[1], b[0], b[1]) for a, b in zip(points, points[1:])]
+    target = max(0.0, fraction) * sum(lengths)
+    result = [points[0]]
+    for (a, b), length in zip(zip(points, points[1:]), lengths):
+        if length >= target:
+            t = target / length if length else 0.0
+            result.append((a[0] + (b[0] - a[0]) * t, a[1] + (b[1] - a[1]) * t))
+            return result
+        target -= length
+        result.append(b)
+    return result
+
+
+class Reachability:
+    """Bounded Dijkstra searches from a source building, cached per minute bucket."""
+
+    def __init__(self, graph: RouteGraph, cache_size: int = DEFAULT_CACHE_SIZE):
+        self.graph = graph
+        self.catalog = graph.catalog
+        self.cache_size = cache_size
+        self._cache: 'OrderedDict[Tuple[int, int], Tuple[Dict, Dict]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def updated(self, catalog, changed: Dict[str, Set[int]]) -> Optional['Reachability']:
+        """This cache for `catalog` if no route changed, else None to start over."""
+        graph = catalog.peek('route_graph')
+        if changed.get('route') or graph is None:
+            return None
+        reach = Reachability(graph, self.cache_size)
+        reach._cache = self._cache
+        reach._lock = self._lock
+        return reach
+
+    def _search(self, source: int, minutes: float) -> Tuple[Dict, Dict]:
+        bucket = max(BUCKET_MINUTES, math.ceil(minutes / BUCKET_MINUTES) * BUCKET_MINUTES)
+        key = (source, bucket)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                metrics.incr('reachable.cache.hits')
+                return cached
+        metrics.incr('reachable.cache.misses')
+        result = self.graph.dijkstra(source, max_minutes=bucket)
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def reachable(self, source: int, minutes: float, polygon: bool = False) -> Dict:
+        """Buildings (with POIs) reachable from `source` within `minutes`, nearest first."""
+        if self.catalog.building(source) is None:
+            raise KeyError(source)
+        minutes = max(0.0, min(float(minutes), MAX_MINUTES))
+        dist, prev = self._search(source, minutes)
+        reached = {node: d for node, d in dist.items() if d <= minutes}
+
+        buildings = []
+        for node, arrival in sorted(reached.items(), key=lambda item: (item[1], item[0])):
+            building = self.catalog.building(node)
+            entry = building.to_json(('id', 'name', 'building_code', 'latitude', 'longitude'))
+            entry['arrival_minutes'] = round(arrival, 2)
+            entry['via'] = prev[node][0] if node in prev else None
+            entry['pois'] = [poi.to_json(POI_FIELDS) for poi in self.catalog.pois_by_building.get(node, ())]
+            buildings.append(entry)
+
+        result = {
+            'from': self.catalog.building(source).to_json(('id', 'name')),
+            'minutes': minutes,
+            'buildings': buildings,
+            'count': len(buildings),
+        }
+        if polygon:
+            result['polygon'] = convex_hull(self._reached_points(reached, prev, minutes))
+        return result
+
+    def _reached_points(self, reached: Dict[int, float], prev: Dict, minutes: float) -> List[Point]:
+        points: List[Point] = []
+        for node, arrival in reached.items():
+            building = self.catalog.building(node)
+            if building.latitude is not None and building.longitude is not None:
+                points.append((building.latitude, building.longitude))
+            if node in prev:
+                parent, route = prev[node]
+                points.extend(self._route_points(route, parent))
+            # Routes leading out of the isochrone are walked part of the way
+            for neighbour, edge_minutes, route in self.graph.adjacency.get(node, ()):
+                if neighbour in reached or edge_minutes <= 0:
+                    continue
+                fraction = (minutes - arrival) / edge_minutes
+                if fraction > 0:
+                    points.extend(along(self._route_points(route, node), fraction))
+        return points
+
+    def _route_points(self, route, start: int) -> List[Point]:
+        """The route's waypoints as walked from `start`."""
+        waypoints = [(p[0], p[1]) for p in route.waypoint_list if isinstance(p, (list, tuple)) and len(p) >= 2]
+        if route.from_building_id != start:
+            waypoints.reverse()
+        return waypoints
+
+
+def reachability(catalog) -> Reachability:
+    """The Reachability cache for a catalog snapshot."""
+    # Built first: derived() holds the catalog's lock while running the factory
+    graph = route_graph(catalog)
+    return catalog.derived('reachability', lambda c: Reachability(graph))
@@ -0,0 +1,227 @@
+"""
+Opt-in per-request profiling for the Flask API.
+
+The profiler is installed as WSGI middleware only when CAMPUS_PROFILE_ENABLED
+is set, so a normal deployment pays nothing for it. When installed, a request
+is profiled if it carries the trigger header or is picked by the sampling
+rate (CAMPUS_PROFILE_SAMPLE_RATE, 0.0 - 1.0). The header is honored only as
+`X-Campus-Profile: <CAMPUS_PROFILE_SECRET>` when a secret is configured, and
+otherwise only as `X-Campus-Profile: 1` from localhost, so remote clients
+can't switch profiling and profile writes on.
+
+Profiles are written to CAMPUS_PROFILE_DIR and the directory is kept to the
+most recent CAMPUS_PROFILE_MAX_FILES files:
+- cProfile runs produce a `.prof` file (open with snakeviz or pstats)
+- pyinstrument runs (used when installed) produce a `.collapsed` file that
+  can be fed straight into flamegraph.pl or speedscope
+"""
+
+import os
+import sys
+import time
+import random
+import threading
+import hmac
+import cProfile
+from typing import Dict, List, Optional
+
+PROFILE_HEADER = "HTTP_X_CAMPUS_PROFILE"
+LOCAL_ADDRESSES = ('127.0.0.1', '::1', 'localhost')
+# One cProfile run at a time: on Python 3.12+ a second enable() in another thread
+# raises "Another profiling tool is already active"
+_CPROFILE_LOCK = threading.Lock()
+
+
+def _env_flag(name: str, default: bool = False) -> bool:
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+class RequestProfiler:
+    """WSGI middleware that profiles selected requests and rotates the output."""
+
+    def __init__(self, wsgi_app, profile_dir: str = 'profiles', max_files: int = 50,
+                 sample_rate: float = 0.0, use_sampler: bool = True, secret: str = ''):
+        self.wsgi_app = wsgi_app
+        self.secret = secret
+        self.profile_dir = os.path.abspath(profile_dir)
+        self.max_files = max(1, int(max_files))
+        self.sample_rate = max(0.0, min(1.0, float(sample_rate)))
+        self._lock = threading.Lock()
+        self._sampler = None
+        if use_sampler:
+            try:
+                import pyinstrument
+                self._sampler = pyinstrument
+            except ImportError:
+                self._sampler = None
+        os.makedirs(self.profile_dir, exist_ok=True)
+
+    @property
+    def engine(self) -> str:
+        return "pyinstrument" if self._sampler else "cprofile"
+
+    def _header_trigger(self, environ) -> bool:
+        value = environ.get(PROFILE_HEADER, '').strip()
+        if not value:
+            return False
+        if self.secret:
+            return hmac.compare_digest(value.encode('utf-8'), self.secret.encode('utf-8'))
+        return value.lower() in ("1", "true", "yes") and environ.get('REMOTE_ADDR', '') in LOCAL_ADDRESSES
+
+    def _triggered(self, environ) -> bool:
+        if self._header_trigger(environ):
+            return True
+        return self.sample_rate > 0.0 and random.random() < self.sample_rate
+
+    def _consume(self, environ, start_response) -> List[bytes]:
+        """Run the app and materialize its body, closing the iterable as a WSGI server would."""
+        result = self.wsgi_app(environ, start_response)
+        try:
+            return list(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+    def __call__(self, environ, start_response):
+        if not self._triggered(environ):
+            return self.wsgi_app(environ, start_response)
+
+        started = time.perf_counter()
+        if self._sampler:
+            profiler = self._sampler.Profiler()
+            profiler.start()
+            try:
+                # Consume the body inside the profiled section so lazy
+                # generators are included in the measurement.
+                body = self._consume(environ, start_response)
+            finally:
+                profiler.stop()
+            self._write_collapsed(environ, profiler, time.perf_counter() - started)
+        else:
+            # A request that finds another one being profiled is served unprofiled
+            if not _CPROFILE_LOCK.acquire(blocking=False):
+                return self.wsgi_app(environ, start_response)
+            try:
+                profiler = cProfile.Profile()
+                try:
+                    profiler.enable()
+                except ValueError:
+                    # Some other profiler or tracer is active in this process
+                    return self.wsgi_app(environ, start_response)
+                try:
+                    body = self._consume(environ, start_response)
+                finally:
+                    profiler.disable()
+            finally:
+                _CPROFILE_LOCK.release()
+            self._write_prof(environ, profiler, time.perf_counter() - started)
+        return body
+
+    def _base_name(self, environ, elapsed: float) -> str:
+        method = environ.get('REQUEST_METHOD', 'GET')
+        path = environ.get('PATH_INFO', '/').strip('/').replace('/', '.') or 'root'
+        return f"{time.strftime('%Y%m%dT%H%M%S')}-{int(time.time() * 1000) % 1000:03d}-{method}-{path}-{int(elapsed * 1000)}ms"
+
+    def _write_prof(self, environ, profiler: cProfile.Profile, elapsed: float):
+        path = os.path.join(self.profile_dir, self._base_name(environ, elapsed) + '.prof')
+        try:
+            profiler.dump_stats(path)
+        except Exception as e:
+            print(f"ERROR: could not write profile {path}: {e}", file=sys.stderr)
+            return
+        self._rotate()
+
+    def _write_collapsed(self, environ, profiler, elapsed: float):
+        path = os.path.join(self.profile_dir, self._base_name(environ, elapsed) + '.collapsed')
+        try:
+            session = profiler.last_session
+            root = session.root_frame() if session else None
+            lines: List[str] = []
+            if root is not None:
+                _collapse_frame(root, [], lines)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write("\n".join(lines))
+                f.write("\n")
+        except Exception as e:
+            print(f"ERROR: could not write profile {path}: {e}", file=sys.stderr)
+            return
+        self._rotate()
+
+    def _rotate(self):
+        with self._lock:
+            files = self._profile_files()
+            for name in files[self.max_files:]:
+                try:
+                    os.remove(os.path.join(self.profile_dir, name))
+                except OSError:
+                    pass
+
+    def _profile_files(self) -> List[str]:
+        try:
+            names = [n for n in os.listdir(self.profile_dir) if n.endswith(('.prof', '.collapsed'))]
+        except OSError:
+            return []
+        # Newest first; file names start with a sortable timestamp
+        return sorted(names, key=lambda n: os.path.getmtime(os.path.join(self.profile_dir, n)), reverse=True)
+
+    def recent_profiles(self, limit: Optional[int] = None) -> List[Dict]:
+        """Return metadata for the most recent profiles, newest first."""
+        profiles = []
+        for name in self._profile_files()[:limit or self.max_files]:
+            full = os.path.join(self.profile_dir, name)
+            try:
+                stat = os.stat(full)
+            except OSError:
+                continue
+            profiles.append({
+                'name': name,
+                'path': full,
+                'format': 'prof' if name.endswith('.prof') else 'collapsed',
+                'size_bytes': stat.st_size,
+                'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(stat.st_mtime)),
+            })
+        return profiles
+
+
+def _collapse_frame(frame, stack: List[str], lines: List[str]):
+    """Flatten a pyinstrument frame tree into `a;b;c <microseconds>` lines."""
+    label = f"{frame.function} ({os.path.basename(frame.file_path or '?')}:{frame.line_no})"
+    stack = stack + [label]
+    self_us = int(round(frame.total_self_time * 1_000_000))
+    if self_us > 0:
+        lines.append(f"{';'.join(stack)} {self_us}")
+    for child in frame.children:
+        _collapse_frame(child, stack, lines)
+
+
+def install_profiler(app) -> Optional[RequestProfiler]:
+    """Wrap `app.wsgi_app` with a RequestProfiler if profiling is enabled by config.
+
+    Returns the profiler, or None when profiling is disabled (the app is left untouched).
+    """
+    if not _env_flag('CAMPUS_PROFILE_ENABLED'):
+        return None
+
+    try:
+        sample_rate = float(os.environ.get('CAMPUS_PROFILE_SAMPLE_RATE', '0'))
+    except ValueError:
+        sample_rate = 0.0
+    try:
+        max_files = int(os.environ.get('CAMPUS_PROFILE_MAX_FILES', '50'))
+    except ValueError:
+        max_files = 50
+
+    profiler = RequestProfiler(
+        app.wsgi_app,
+        profile_dir=os.environ.get('CAMPUS_PROFILE_DIR', 'profiles'),
+        max_files=max_files,
+        sample_rate=sample_rate,
+        use_sampler=_env_flag('CAMPUS_PROFILE_SAMPLER', True),
+        secret=os.environ.get('CAMPUS_PROFILE_SECRET', ''),
+    )
+    app.wsgi_app = profiler
+    print(f"Request profiling enabled (engine={profiler.engine}, sample_rate={profiler.sample_rate}, dir={profiler.profile_dir})", file=sys.stderr)
+    return profiler
@@ -0,0 +1,86 @@
+"""
+Compact projections of /api chat replies.
+
+A full reply carries the resolved building row (description, address, hours
+JSON, image path), the route with its raw waypoint JSON and every POI row of
+the building. Most chat UIs render only the answer text and a card.
+
+`view=compact` keeps the answer and its provenance and replaces the rows with
+small cards:
+- `building` keeps BUILDING_CARD;
+- `route` keeps ROUTE_CARD;
+- `pois` becomes `poi_ids`.
+Clients fetch details from the cacheable /api/building/<id> when the user
+opens the card.
+
+`fields` (a comma-separated list, e.g. "response,building.id,building.name")
+keeps only the named keys. A dotted name picks keys inside a nested object, or
+inside every object of a list. It applies after the view.
+"""
+
+from typing import Dict, Iterable, List, Optional
+
+VIEWS = ('full', 'compact')
+
+BUILDING_CARD = ('id', 'name', 'building_code', 'latitude', 'longitude')
+ROUTE_CARD = ('id', 'from_building_id', 'to_building_id', 'distance_meters', 'walk_time_minutes')
+# Top-level keys a compact reply keeps as they are; debug keys only appear when requested
+COMPACT_KEYS = ('success', 'request_id', 'timestamp', 'response', 'response_source', 'session_id',
+                'category', 'open_now', 'llm_raw', 'llm_trace', 'timings_ms')
+
+
+def _card(row: Optional[Dict], fields: Iterable[str]) -> Optional[Dict]:
+    if not row:
+        return None
+    return {name: row.get(name) for name in fields}
+
+
+def compact(result: Dict) -> Dict:
+    """The compact view of a process_query result."""
+    view = {key: result[key] for key in COMPACT_KEYS if key in result}
+    view['building'] = _card(result.get('building'), BUILDING_CARD)
+    view['route'] = _card(result.get('route'), ROUTE_CARD)
+    view['poi_ids'] = [poi.get('id') for poi in result.get('pois') or ()]
+    return view
+
+
+def parse_fields(value) -> List[str]:
+    """`fields` as given in a body (list or comma string) or query string."""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(',')
+    return [str(name).strip() for name in value if str(name).strip()]
+
+
+def _field_tree(fields: List[str]) -> Dict:
+    """{"building": {"id": None}} for ["building.id"]; None marks a value kept whole."""
+    tree: Dict = {}
+    for name in fields:
+        parts = name.split('.')
+        node = tree
+        for part in parts[:-1]:
+            if node.get(part, {}) is None:
+                # The whole parent is already kept
+                break
+            node = node.setdefault(part, {})
+        else:
+            node[parts[-1]] = None
+    return tree
+
+
+def select_fields(result: Dict, fields: List[str]) -> Dict:
+    """Keep only `fields` (dotted names reach into objects and lists of objects); 'success' is always kept."""
+    selected = _select(result, _field_tree(fields))
+    selected['success'] = result.get('success', True)
+    return selected
+
+
+def _select(value, tree: Optional[Dict]):
+    if tree is None:
+        return value
+    if isinstance(value, list):
+        return [_select(item, tree) for item in value]
+    if not isinstance(value, dict):
+        return value
+    return {key: _select(value[key], sub) for key, sub in tree.items() if key in value}
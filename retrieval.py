@@ -0,0 +1,279 @@
+"""
+Local retrieval over buildings, POIs and routes for grounded LLM answers.
+
+The answer prompt used to carry one building's row, so questions such as
+"where can I print near the science labs?" had nothing to be answered from.
+RetrievalIndex is built once per catalog snapshot (`retrieval_index(catalog)`)
+and holds one short passage per:
+- building: name, code, aliases, address, description;
+- POI: name, type, floor/room, building, description;
+- route: from and to, walk time and distance, route description.
+
+Passages are ranked with BM25 over an inverted index of lightly stemmed
+words. With CAMPUS_RETRIEVAL=hybrid and NumPy installed, every passage is also
+embedded by a local hashing embedder: word and character-trigram features are
+hashed into DIM signed buckets, and the vector is L2-normalized. The cosine
+similarity is blended with the normalized BM25 score. The vectors are written
+once per catalog version to a float32 file in a subdirectory of
+CAMPUS_RETRIEVAL_DIR named after the database (so campuses sharing the
+directory keep their own files) and memory-mapped read-only, so forked
+workers and restarts share one copy through the page cache. Without NumPy,
+hybrid falls back to BM25.
+
+The navigator passes the top CAMPUS_RETRIEVAL_K passages, trimmed to the
+request's token budget, into the answer prompt. Retrieval time and context
+size are recorded per request.
+
+Configuration (environment):
+    CAMPUS_RETRIEVAL        bm25 | hybrid | off      (default bm25)
+    CAMPUS_RETRIEVAL_K      passages per prompt      (default 5)
+    CAMPUS_RETRIEVAL_DIR    vector files for hybrid  (default retrieval_cache/ next to the database)
+"""
+
+import os
+import sys
+import math
+import zlib
+import heapq
+import hashlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from poi_index import tokenize
+
+
+def _numpy():
+    """NumPy, imported on first hybrid use so BM25-only processes never pay for it; None if missing."""
+    try:
+        import numpy  # deferred: only hybrid retrieval needs it
+    except ImportError:
+        return None
+    return numpy
+
+
+MODES = ('bm25', 'hybrid', 'off')
+DEFAULT_K = 5
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Embedding width; bump FORMAT_VERSION when the embedder changes so old vector files aren't reused
+DIM = 256
+FORMAT_VERSION = 1
+# Share of the vector similarity in hybrid scores
+DENSE_WEIGHT = 0.4
+# Passages taken from each ranking before blending
+CANDIDATES = 50
+# Passages scoring below this fraction of the best one are left out of the prompt
+MIN_RELATIVE_SCORE = 0.3
+
+# Question words that say nothing about which passage answers it
+STOP_WORDS = frozenset((
+    'a', 'an', 'and', 'any', 'are', 'at', 'by', 'can', 'do', 'does', 'for', 'from', 'get', 'how', 'i',
+    'in', 'is', 'it', 'me', 'my', 'near', 'of', 'on', 'or', 'the', 'there', 'to', 'what', 'when',
+    'where', 'which', 'with',
+))
+_SUFFIXES = (('ies', 'y'), ('ing', ''), ('ers', ''), ('er', ''), ('es', ''), ('s', ''))
+
+
+def retrieval_mode() -> str:
+    mode = os.environ.get('CAMPUS_RETRIEVAL', 'bm25').strip().lower()
+    return mode if mode in MODES else 'bm25'
+
+
+def retrieval_k() -> int:
+    try:
+        return max(1, int(os.environ.get('CAMPUS_RETRIEVAL_K', DEFAULT_K)))
+    except ValueError:
+        return DEFAULT_K
+
+
+def default_vector_dir(db_path: str) -> str:
+    """Vector directory for one database: <CAMPUS_RETRIEVAL_DIR>/<db name>-<path hash>."""
+    db_path = os.path.abspath(db_path)
+    root = os.environ.get('CAMPUS_RETRIEVAL_DIR') or os.path.join(os.path.dirname(db_path), 'retrieval_cache')
+    name = os.path.splitext(os.path.basename(db_path))[0]
+    return os.path.join(root, f"{name}-{hashlib.sha1(db_path.encode('utf-8')).hexdigest()[:8]}")
+
+
+def stem(word: str) -> str:
+    """Strip a plural/-ing/-er ending ("printers" -> "print", "libraries" -> "library")."""
+    for suffix, replacement in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)] + replacement
+    return word
+
+
+def terms(text: Optional[str]) -> List[str]:
+    return [stem(word) for word in tokenize(text) if word not in STOP_WORDS]
+
+
+def _sentence(parts: Iterable[Optional[str]]) -> str:
+    kept = [str(p).strip().rstrip('.') for p in parts if p not in (None, '') and str(p).strip()]
+    return '. '.join(kept) + '.' if kept else ''
+
+
+def build_passages(catalog) -> List[Dict]:
+    """One {'kind', 'id', 'text'} passage per building, POI and route."""
+    passages = []
+    for building in catalog.buildings.values():
+        name = f"{building.name} ({building.building_code})" if building.building_code else building.name
+        aliases = f"Also called {', '.join(building.alias_list)}" if building.alias_list else None
+        passages.append({'kind': 'building', 'id': building.id,
+                         'text': _sentence((name, aliases, building.address, building.description))})
+    for poi in catalog.pois.values():
+        building = catalog.building(poi.building_id)
+        kind = (poi.poi_type or '').replace('_', ' ')
+        where = ', '.join(p for p in (
+            f"floor {poi.floor}" if poi.floor not in (None, '') else None,
+            f"room {poi.room_number}" if poi.room_number not in (None, '') else None,
+            f"in {building.name}" if building else None,
+        ) if p)
+        passages.append({'kind': 'poi', 'id': poi.id,
+                         'text': _sentence((f"{poi.name} ({kind})" if kind else poi.name, where, poi.description))})
+    for route in catalog.routes:
+        start, end = catalog.building(route.from_building_id), catalog.building(route.to_building_id)
+        if start is None or end is None:
+            continue
+        walk = ', '.join(p for p in (
+            f"{route.walk_time_minutes} min" if route.walk_time_minutes is not None else None,
+            f"{route.distance_meters} m" if route.distance_meters is not None else None,
+        ) if p)
+        passages.append({'kind': 'route', 'id': route.id,
+                         'text': _sentence((f"Walk from {start.name} to {end.name}", walk, route.route_description))})
+    return passages
+
+
+def _features(text: str) -> List[str]:
+    features = []
+    for word in terms(text):
+        features.append(word)
+        padded = f"#{word}#"
+        features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    return features
+
+
+def embed(text: str):
+    """Hashing-trick embedding of `text` (float32, L2-normalized); needs NumPy."""
+    import numpy as np
+    vector = np.zeros(DIM, dtype=np.float32)
+    for feature in _features(text):
+        h = zlib.crc32(feature.encode('utf-8'))
+        vector[h % DIM] += 1.0 if (h >> 31) & 1 else -1.0
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+def _vectors(passages: List[Dict], version: str, vector_dir: str):
+    """Passage embeddings memory-mapped from vector_dir, written on first use for this catalog version."""
+    import numpy as np
+    key = hashlib.sha1(f"{FORMAT_VERSION}:{DIM}:{version}:{len(passages)}".encode('utf-8')).hexdigest()[:16]
+    path = os.path.join(vector_dir, f"vectors-{key}.f32")
+    shape = (len(passages), DIM)
+    if not os.path.exists(path) or os.path.getsize(path) != shape[0] * DIM * 4:
+        matrix = np.stack([embed(p['text']) for p in passages]).astype(np.float32)
+        try:
+            os.makedirs(vector_dir, exist_ok=True)
+            # Written aside and renamed, so a worker never maps a half-written file
+            tmp = f"{path}.{os.getpid()}.tmp"
+            matrix.tofile(tmp)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"Retrieval vectors kept in memory ({vector_dir} not writable: {e})", file=sys.stderr)
+            return matrix
+        for name in os.listdir(vector_dir):
+            # Older catalog versions of this database (the directory is per database);
+            # processes still mapping them keep their pages
+            if name.startswith('vectors-') and name.endswith('.f32') and name != os.path.basename(path):
+                try:
+                    os.remove(os.path.join(vector_dir, name))
+                except OSError:
+                    pass
+    return np.memmap(path, dtype=np.float32, mode='r', shape=shape)
+
+
+class RetrievalIndex:
+    """BM25 (plus optional hashed-vector) ranking of catalog passages."""
+
+    def __init__(self, passages: List[Dict], vectors=None):
+        self.passages = passages
+        self.vectors = vectors
+        # term -> [(passage index, term frequency)]
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.lengths: List[int] = []
+        for i, passage in enumerate(passages):
+            counts: Dict[str, int] = {}
+            words = terms(passage['text'])
+            for word in words:
+                counts[word] = counts.get(word, 0) + 1
+            for word, tf in counts.items():
+                self.postings.setdefault(word, []).append((i, tf))
+            self.lengths.append(len(words))
+        total = len(passages)
+        self.average_length = sum(self.lengths) / total if total else 0.0
+        self.idf = {word: math.log(1 + (total - len(p) + 0.5) / (len(p) + 0.5)) for word, p in self.postings.items()}
+
+    @classmethod
+    def build(cls, catalog, vector_dir: Optional[str] = None) -> 'RetrievalIndex':
+        """Index `catalog`; with vector_dir (and NumPy) also embed the passages for hybrid ranking."""
+        passages = build_passages(catalog)
+        vectors = None
+        if vector_dir and passages:
+            if _numpy() is None:
+                print("NumPy not installed; CAMPUS_RETRIEVAL=hybrid falls back to BM25", file=sys.stderr)
+            else:
+                vectors = _vectors(passages, catalog.version, vector_dir)
+        return cls(passages, vectors)
+
+    def __len__(self) -> int:
+        return len(self.passages)
+
+    def bm25(self, query: str) -> Dict[int, float]:
+        scores: Dict[int, float] = {}
+        avg = self.average_length or 1.0
+        for word in set(terms(query)):
+            idf = self.idf.get(word)
+            if idf is None:
+                continue
+            for i, tf in self.postings[word]:
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[i] / avg)
+                scores[i] = scores.get(i, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+        return scores
+
+    def _dense(self, query: str) -> Dict[int, float]:
+        import numpy as np
+        sims = np.asarray(self.vectors @ embed(query))
+        n = min(CANDIDATES, len(sims))
+        top = np.argpartition(-sims, n - 1)[:n]
+        return {int(i): float(sims[i]) for i in top if sims[i] > 0}
+
+    def search(self, query: str, k: int = DEFAULT_K, exclude: Iterable[Tuple[str, int]] = ()) -> List[Dict]:
+        """Top-k passages for `query`, best first, each with its 'score'; `exclude` lists (kind, id) to skip."""
+        skip = set(exclude)
+        lexical = self.bm25(query)
+        lexical = dict(heapq.nlargest(CANDIDATES, lexical.items(), key=lambda item: item[1]))
+        best = max(lexical.values(), default=0.0)
+        scores = {i: s / best for i, s in lexical.items()} if best else {}
+        if self.vectors is not None:
+            dense = self._dense(query)
+            scores = {i: (1 - DENSE_WEIGHT) * scores.get(i, 0.0) + DENSE_WEIGHT * dense.get(i, 0.0)
+                      for i in set(scores) | set(dense)}
+        ranked = heapq.nlargest(CANDIDATES, scores.items(), key=lambda item: (item[1], -item[0]))
+        results = []
+        seen = set()
+        top = None
+        for i, score in ranked:
+            passage = self.passages[i]
+            # Repeated rows (same text) would only take up prompt space
+            if (passage['kind'], passage['id']) in skip or score <= 0 or passage['text'] in seen:
+                continue
+            seen.add(passage['text'])
+            top = top if top is not None else score
+            if score < top * MIN_RELATIVE_SCORE:
+                break
+            results.append(dict(passage, score=round(score, 4)))
+            if len(results) >= k:
+                break
+        return results
+
+
+def retrieval_index(catalog, vector_dir: Optional[str] = None) -> RetrievalIndex:
+    """The RetrievalIndex for a catalog snapshot, built on first use (vectors only with vector_dir)."""
+    return catalog.derived('retrieval', lambda c: RetrievalIndex.build(c, vector_dir))
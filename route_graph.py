@@ -0,0 +1,179 @@
+"""
+Walking graph over the campus routes.
+
+Buildings are the nodes and every row of the routes table is an undirected
+edge weighted by its walk_time_minutes (get_route looks routes up in both
+directions too). A route without a walk time is costed from its distance at
+WALK_SPEED_M_PER_MIN. The graph is derived from a catalog snapshot
+(`route_graph(catalog)`), so it is rebuilt when the routes change. Admin
+edits (changes.py) that only touch buildings or POIs keep the graph and its
+cached rows.
+
+Shortest-path rows (Dijkstra from one source to everything) are kept in an
+LRU bounded by total entries (CAMPUS_ROUTE_CACHE_ENTRIES, default 200000).
+When the campus fits in that budget, precompute() fills in the full all-pairs
+matrix at preload. On a larger campus the rows are computed on demand and
+only the ones that tours actually use stay resident.
+"""
+
+import os
+import copy
+import heapq
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from models import Route
+
+WALK_SPEED_M_PER_MIN = 80.0
+DEFAULT_CACHE_ENTRIES = 200000
+
+# node -> (previous node, route used to get here)
+Predecessors = Dict[int, Tuple[int, Route]]
+
+
+def edge_minutes(route: Route) -> float:
+    if route.walk_time_minutes is not None:
+        return float(route.walk_time_minutes)
+    return float(route.distance_meters or 0) / WALK_SPEED_M_PER_MIN
+
+
+class RouteGraph:
+    """Adjacency lists over the routes plus a cache of single-source shortest paths."""
+
+    def __init__(self, catalog, max_cache_entries: int = DEFAULT_CACHE_ENTRIES):
+        self.catalog = catalog
+        self.max_cache_entries = max_cache_entries
+        # Each row holds up to one entry per building
+        self.max_cached_sources = max(16, max_cache_entries // max(1, len(catalog.buildings)))
+        # node -> [(neighbour, minutes, route)], keeping the quickest route per pair
+        best: Dict[Tuple[int, int], Tuple[float, Route]] = {}
+        for route in catalog.routes:
+            a, b = route.from_building_id, route.to_building_id
+            if a == b or a not in catalog.buildings or b not in catalog.buildings:
+                continue
+            minutes = edge_minutes(route)
+            key = (min(a, b), max(a, b))
+            if key not in best or minutes < best[key][0]:
+                best[key] = (minutes, route)
+        self.adjacency: Dict[int, List[Tuple[int, float, Route]]] = {}
+        for (a, b), (minutes, route) in best.items():
+            self.adjacency.setdefault(a, []).append((b, minutes, route))
+            self.adjacency.setdefault(b, []).append((a, minutes, route))
+        self._rows: 'OrderedDict[int, Tuple[Dict[int, float], Predecessors]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def updated(self, catalog, changed: Dict[str, Set[int]]) -> Optional['RouteGraph']:
+        """This graph for `catalog` if no route changed (cached rows are kept), else None to rebuild."""
+        if changed.get('route'):
+            return None
+        graph = copy.copy(self)
+        graph.catalog = catalog
+        graph.max_cached_sources = max(16, self.max_cache_entries // max(1, len(catalog.buildings)))
+        return graph
+
+    def dijkstra(self, source: int, max_minutes: Optional[float] = None) -> Tuple[Dict[int, float], Predecessors]:
+        """Minutes from `source` to every node reachable within `max_minutes` (all if None)."""
+        dist = {source: 0.0}
+        prev: Predecessors = {}
+        heap = [(0.0, source)]
+        adjacency = self.adjacency
+        while heap:
+            d, node = heapq.heappop(heap)
+            if d > dist[node]:
+                continue
+            for neighbour, minutes, route in adjacency.get(node, ()):
+                nd = d + minutes
+                if max_minutes is not None and nd > max_minutes:
+                    continue
+                if nd < dist.get(neighbour, float('inf')):
+                    dist[neighbour] = nd
+                    prev[neighbour] = (node, route)
+                    heapq.heappush(heap, (nd, neighbour))
+        return dist, prev
+
+    def shortest_from(self, source: int) -> Tuple[Dict[int, float], Predecessors]:
+        """Cached unbounded Dijkstra row for `source`."""
+        with self._lock:
+            row = self._rows.get(source)
+            if row is not None:
+                self._rows.move_to_end(source)
+                return row
+        row = self.dijkstra(source)
+        with self._lock:
+            self._rows[source] = row
+            self._rows.move_to_end(source)
+            while len(self._rows) > self.max_cached_sources:
+                self._rows.popitem(last=False)
+        return row
+
+    def precompute(self) -> bool:
+        """Compute the all-pairs matrix if it fits the cache budget; True if it did."""
+        if len(self.catalog.buildings) > self.max_cached_sources:
+            return False
+        for building_id in self.catalog.buildings:
+            self.shortest_from(building_id)
+        return True
+
+    def cached_sources(self) -> int:
+        return len(self._rows)
+
+    def minutes(self, a: int, b: int) -> float:
+        """Shortest walk in minutes, inf when no route connects them."""
+        return self.shortest_from(a)[0].get(b, float('inf'))
+
+    def matrix(self, ids: List[int]) -> List[List[float]]:
+        """Shortest walk minutes between every pair of `ids` (inf when unreachable)."""
+        rows = [self.shortest_from(i)[0] for i in ids]
+        return [[row.get(j, float('inf')) for j in ids] for row in rows]
+
+    def path(self, a: int, b: int) -> Optional[List[Tuple[int, int, Route]]]:
+        """The edges (from, to, route) of the shortest walk from a to b; None if unreachable."""
+        return path_to(self.shortest_from(a)[1], a, b)
+
+    def stitch(self, edges: Iterable[Tuple[int, int, Route]]) -> List[List[float]]:
+        """One [lat, lng] polyline along the edges, each route's waypoints oriented in walking order."""
+        points: List[List[float]] = []
+        for a, b, route in edges:
+            waypoints = [list(p) for p in route.waypoint_list if isinstance(p, (list, tuple)) and len(p) >= 2]
+            if not waypoints:
+                waypoints = [self._coords(a), self._coords(b)]
+            elif route.from_building_id != a:
+                waypoints.reverse()
+            for point in waypoints:
+                if point and point != (points[-1] if points else None):
+                    points.append(point)
+        return points
+
+    def _coords(self, building_id: int) -> Optional[List[float]]:
+        building = self.catalog.building(building_id)
+        if building is None or building.latitude is None or building.longitude is None:
+            return None
+        return [building.latitude, building.longitude]
+
+
+def path_to(prev: Predecessors, source: int, target: int) -> Optional[List[Tuple[int, int, Route]]]:
+    if target == source:
+        return []
+    if target not in prev:
+        return None
+    edges = []
+    node = target
+    while node != source:
+        parent, route = prev[node]
+        edges.append((parent, node, route))
+        node = parent
+    edges.reverse()
+    return edges
+
+
+def _cache_entries() -> int:
+    try:
+        return int(os.environ.get('CAMPUS_ROUTE_CACHE_ENTRIES', DEFAULT_CACHE_ENTRIES))
+    except ValueError:
+        return DEFAULT_CACHE_ENTRIES
+
+
+def route_graph(catalog) -> RouteGraph:
+    """The RouteGraph for a catalog snapshot, built once."""
+    return catalog.derived('route_graph', lambda c: RouteGraph(c, _cache_entries()))
@@ -0,0 +1,396 @@
+"""
+Production server for the Campus Navigator API.
+
+    python serve.py --port 5000 --workers 4 --threads 8
+
+The master process builds the app and preloads the catalog and every index
+derived from it (hours, POI search, ...), freezes those objects out of the
+garbage collector and then forks the workers. Workers share the preloaded
+pages copy-on-write instead of each loading its own copy. Each worker serves
+the shared listening socket with a fixed pool of threads. The LLM client is
+created lazily inside each worker, never in the master.
+
+The master also:
+- restarts workers that exit, and recycles each worker after --max-requests
+  requests (plus up to --max-requests-jitter, so they don't all restart at once)
+- polls the database file every --reload-interval seconds. Admin edits logged
+  in the changes table are applied to the master's snapshot, so workers forked
+  later start current; running workers apply the same log on their next
+  request (CatalogCache), and keep serving. When the log doesn't account for
+  the change (the file was replaced, its tables altered, or rows edited by
+  hand), and on SIGHUP, the master preloads the new catalog, forks a fresh set
+  of workers and gracefully stops the old ones, so the new data is shared again
+- logs each worker's RSS, PSS and shared memory every --stats-interval
+  seconds. Each worker also reports its own under `process` in /api/metrics
+
+Workers finish in-flight requests on SIGTERM. SIGINT/SIGTERM to the master
+stops everything. Where os.fork is not available (Windows), the app is served
+by one process with the same thread pool.
+"""
+
+import os
+import gc
+import sys
+import time
+import random
+import signal
+import socket
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from metrics import metrics
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def process_memory(pid: int) -> Dict[str, Optional[int]]:
+    """RSS, PSS, shared and private memory of a process, in KiB (None when unavailable).
+
+    PSS splits shared pages between the processes mapping them, so the sum of
+    worker PSS is the real footprint of a preforked server.
+    """
+    fields = {'Rss': 'rss_kb', 'Pss': 'pss_kb'}
+    result: Dict[str, Optional[int]] = {'rss_kb': None, 'pss_kb': None, 'shared_kb': None, 'private_kb': None}
+    try:
+        shared = private = 0
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                key, _, rest = line.partition(':')
+                if key in fields:
+                    result[fields[key]] = int(rest.split()[0])
+                elif key in ('Shared_Clean', 'Shared_Dirty'):
+                    shared += int(rest.split()[0])
+                elif key in ('Private_Clean', 'Private_Dirty'):
+                    private += int(rest.split()[0])
+        result['shared_kb'] = shared
+        result['private_kb'] = private
+        return result
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    result['rss_kb'] = int(line.split()[1])
+        return result
+    except OSError:
+        pass
+    try:
+        import psutil
+        result['rss_kb'] = psutil.Process(pid).memory_info().rss // 1024
+    except Exception:
+        pass
+    return result
+
+
+def _make_server(host: str, port: int, app, threads: int, fd: Optional[int] = None):
+    """Werkzeug WSGI server that handles connections on a fixed-size thread pool."""
+    from werkzeug.serving import BaseWSGIServer
+
+    class PooledWSGIServer(BaseWSGIServer):
+        multithread = True
+
+        def __init__(self):
+            super().__init__(host, port, app, fd=fd)
+            self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='campus-http')
+            # One slot per pool thread, taken before accept(): a saturated worker stops
+            # accepting and the kernel hands new connections to idle workers
+            self.slots = threading.BoundedSemaphore(threads)
+            self._submitted = False
+
+        def _handle_request_noblock(self):
+            # Returning without accepting lets serve_forever() re-poll and notice shutdown()
+            if not self.slots.acquire(timeout=0.5):
+                return
+            self._submitted = False
+            try:
+                super()._handle_request_noblock()
+            finally:
+                # accept() lost the race to another worker, or the request was rejected
+                if not self._submitted:
+                    self.slots.release()
+
+        def process_request(self, request, client_address):
+            self.pool.submit(self._handle, request, client_address)
+            self._submitted = True
+
+        def _handle(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+                self.slots.release()
+
+        def server_close(self):
+            super().server_close()
+            self.pool.shutdown(wait=True)
+
+    return PooledWSGIServer()
+
+
+class Worker:
+    """Runs in a forked child: serves the shared socket until told to stop or recycled."""
+
+    def __init__(self, app, sock: socket.socket, host: str, port: int, threads: int, max_requests: int):
+        self.app = app
+        self.sock = sock
+        self.host = host
+        self.port = port
+        self.threads = threads
+        self.max_requests = max_requests
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._stopping = False
+        self.server = None
+
+    def __call__(self, environ, start_response):
+        with self._lock:
+            self.requests += 1
+            recycle = self.max_requests and self.requests >= self.max_requests
+        if recycle:
+            self.stop()
+        return self.app(environ, start_response)
+
+    def stop(self, *_):
+        with self._lock:
+            if self._stopping or self.server is None:
+                return
+            self._stopping = True
+        # shutdown() waits for serve_forever to return, so it can't run on the serving thread
+        threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+    def snapshot(self) -> Dict:
+        return dict(process_memory(os.getpid()), pid=os.getpid(), requests=self.requests)
+
+    def run(self) -> int:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        random.seed()
+        metrics.register_collector('process', self.snapshot)
+        self.server = _make_server(self.host, self.port, self, self.threads, fd=self.sock.fileno())
+        self.server.serve_forever()
+        # Waits for in-flight requests on the pool
+        self.server.server_close()
+        # os._exit() skips atexit handlers, so write out the queued query log here
+        query_log = self.app.extensions['campus_navigator'].query_log
+        if query_log is not None:
+            query_log.close()
+        return 0
+
+
+class Master:
+    """Preloads the app, forks workers and keeps them running."""
+
+    def __init__(self, app, host: str, port: int, workers: int, threads: int, max_requests: int,
+                 max_requests_jitter: int, reload_interval: float, stats_interval: float,
+                 graceful_timeout: float, backlog: int = 2048):
+        self.app = app
+        self.navigator = app.extensions['campus_navigator']
+        self.host = host
+        self.port = port
+        self.num_workers = max(1, workers)
+        self.threads = max(1, threads)
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.reload_interval = reload_interval
+        self.stats_interval = stats_interval
+        self.graceful_timeout = graceful_timeout
+        self.backlog = backlog
+        self.generation = 0
+        # pid -> generation
+        self.workers: Dict[int, int] = {}
+        self._retiring: Dict[int, float] = {}
+        self._stopping = False
+        self._reload = False
+        self.sock: Optional[socket.socket] = None
+
+    def log(self, message: str):
+        print(f"[master {os.getpid()}] {message}", file=sys.stderr, flush=True)
+
+    def preload(self):
+        started = time.perf_counter()
+        catalog = self.navigator.preload()
+        # Preloaded objects move to the permanent generation: collections in the
+        # workers then don't touch (and un-share) their pages. Unfreeze first, or
+        # the previous snapshot (a cycle through its derived route graph) would
+        # stay frozen and leak on every reload
+        gc.unfreeze()
+        gc.collect()
+        gc.freeze()
+        self.log(f"preloaded catalog {catalog.version} ({len(catalog.buildings)} buildings, "
+                 f"{len(catalog.pois)} POIs) in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    def spawn(self):
+        jitter = random.randint(0, self.max_requests_jitter) if self.max_requests and self.max_requests_jitter else 0
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                code = Worker(self.app, self.sock, self.host, self.port, self.threads,
+                              self.max_requests + jitter if self.max_requests else 0).run()
+            except Exception as e:
+                print(f"[worker {os.getpid()}] crashed: {e}", file=sys.stderr, flush=True)
+            finally:
+                os._exit(code)
+        self.workers[pid] = self.generation
+
+    def reload(self):
+        """Preload the current catalog and replace every worker with a fresh one."""
+        self.preload()
+        self.generation += 1
+        old = [pid for pid, generation in self.workers.items() if generation < self.generation]
+        for _ in range(self.num_workers):
+            self.spawn()
+        for pid in old:
+            self._retire(pid)
+        self.log(f"reloaded: {self.num_workers} new workers, {len(old)} stopping")
+
+    def _retire(self, pid: int):
+        self.workers.pop(pid, None)
+        self._retiring[pid] = time.monotonic()
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            self._retiring.pop(pid, None)
+
+    def _reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            self._retiring.pop(pid, None)
+            if self.workers.pop(pid, None) is not None and not self._stopping:
+                code = os.waitstatus_to_exitcode(status) if hasattr(os, 'waitstatus_to_exitcode') else status
+                self.log(f"worker {pid} exited ({code})")
+        # Old workers that ignore SIGTERM for too long are killed
+        now = time.monotonic()
+        for pid, since in list(self._retiring.items()):
+            if now - since > self.graceful_timeout:
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    self._retiring.pop(pid, None)
+
+    def log_stats(self):
+        total_pss = 0
+        for pid in sorted(self.workers):
+            memory = process_memory(pid)
+            total_pss += memory.get('pss_kb') or 0
+            self.log(f"worker {pid}: rss={memory['rss_kb']} KiB pss={memory['pss_kb']} KiB "
+                     f"shared={memory['shared_kb']} KiB private={memory['private_kb']} KiB")
+        master = process_memory(os.getpid())
+        self.log(f"master rss={master['rss_kb']} KiB; workers total pss={total_pss} KiB")
+
+    def _on_stop(self, *_):
+        self._stopping = True
+
+    def _on_reload(self, *_):
+        self._reload = True
+
+    def run(self):
+        self.sock = socket.socket(socket.AF_INET6 if ':' in self.host else socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.host, self.port))
+        self.sock.listen(self.backlog)
+        self.sock.set_inheritable(True)
+
+        self.preload()
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+        self.log(f"listening on http://{self.host}:{self.port} with {self.num_workers} workers x {self.threads} threads")
+
+        last_check = last_stats = time.monotonic()
+        while not self._stopping:
+            self._reap()
+            while len(self.workers) < self.num_workers and not self._stopping:
+                self.spawn()
+            now = time.monotonic()
+            if self.reload_interval and now - last_check >= self.reload_interval:
+                last_check = now
+                cache = self.navigator.catalog_cache
+                if cache.stale():
+                    catalog = cache.get()
+                    if cache.last_refresh == 'incremental':
+                        self.log(f"applied logged changes up to {catalog.change_version}; workers apply them too")
+                    else:
+                        self.log("database replaced")
+                        self._reload = True
+            if self._reload:
+                self._reload = False
+                self.reload()
+            if self.stats_interval and now - last_stats >= self.stats_interval:
+                last_stats = now
+                self.log_stats()
+            time.sleep(0.5)
+
+        self.log("stopping workers")
+        for pid in list(self.workers):
+            self._retire(pid)
+        deadline = time.monotonic() + self.graceful_timeout
+        while self._retiring and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        for pid in list(self._retiring):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        self.sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Campus Navigator production server")
+    parser.add_argument('--host', default=os.environ.get('CAMPUS_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=_env_int('CAMPUS_PORT', 5000))
+    parser.add_argument('--workers', type=int, default=_env_int('CAMPUS_WORKERS', os.cpu_count() or 1),
+                        help="worker processes (default: CPU count)")
+    parser.add_argument('--threads', type=int, default=_env_int('CAMPUS_THREADS', 8),
+                        help="request threads per worker")
+    parser.add_argument('--max-requests', type=int, default=_env_int('CAMPUS_MAX_REQUESTS', 0),
+                        help="recycle a worker after this many requests (0 = never)")
+    parser.add_argument('--max-requests-jitter', type=int, default=_env_int('CAMPUS_MAX_REQUESTS_JITTER', 0))
+    parser.add_argument('--reload-interval', type=float, default=5.0,
+                        help="seconds between database change checks (0 = only on SIGHUP)")
+    parser.add_argument('--stats-interval', type=float, default=60.0,
+                        help="seconds between worker memory reports (0 = off)")
+    parser.add_argument('--graceful-timeout', type=float, default=30.0)
+    args = parser.parse_args()
+
+    from flask_api import create_app
+    # The LLM client is created per worker on first use, never before the fork
+    app = create_app({'CAMPUS_WARMUP': False})
+
+    if not hasattr(os, 'fork'):
+        print("os.fork is not available; serving with a single process", file=sys.stderr)
+        app.extensions['campus_navigator'].preload()
+        server = _make_server(args.host, args.port, app, args.threads)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return
+
+    Master(app, args.host, args.port, args.workers, args.threads, args.max_requests,
+           args.max_requests_jitter, args.reload_interval, args.stats_interval,
+           args.graceful_timeout).run()
+
+
+if __name__ == "__main__":
+    main()
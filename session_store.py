@@ -0,0 +1,248 @@
+"""
+Per-client conversation state for follow-up questions.
+
+SessionStore keeps a small dict per session id (last building, last origin,
+last query type) so "how do I get there from the library?" can be resolved
+without asking the LLM what "there" means. Memory is bounded three ways:
+    - at most CAMPUS_SESSION_MAX sessions              (default 10000)
+    - at most CAMPUS_SESSION_MAX_BYTES of state        (default 8 MB, JSON size)
+    - sessions idle for CAMPUS_SESSION_TTL_S expire    (default 1800)
+Least recently used sessions are evicted first. With CAMPUS_SESSION_SPILL set
+to a SQLite path, evicted sessions are written there and read back on their
+next request instead of being lost.
+
+resolve_followup() turns a follow-up ("when does it close?", "how do I get
+there from the library?", "what about the gym?") plus the session state into
+the same query_data dict that LLM extraction returns. A question that names
+its own building ("is there a computer lab in the library?") is not a
+follow-up, and existential "is there" / "there are" is not a pronoun.
+
+Session count, bytes, evictions, expirations and spill traffic are published
+as the 'sessions' section of metrics.metrics.
+"""
+
+import re
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from metrics import metrics
+
+
+PRONOUN_RE = re.compile(r"\b(there|it|its|it's|that place|that building|this place|this building)\b", re.IGNORECASE)
+# "is there a ...", "there are ...": nothing to do with the previous answer
+EXISTENTIAL_RE = re.compile(r"\b(?:is|are|was|were|isn't|aren't)\s+there\b|\bthere(?:'s|\s+(?:is|are|was|were)\b)",
+                            re.IGNORECASE)
+WHAT_ABOUT_RE = re.compile(r"^\s*(?:what|how)\s+about\s+(?:the\s+)?(.+?)[?.!]*\s*$", re.IGNORECASE)
+FROM_RE = re.compile(r"\bfrom\s+(?:the\s+)?(.+?)[?.!]*\s*$", re.IGNORECASE)
+DIRECTIONS_WORDS = ('get there', 'get to', 'go there', 'walk', 'directions', 'route', 'how far', 'from ')
+HOURS_WORDS = ('open', 'close', 'hours', 'closing', 'opening')
+
+
+def session_state(query_data: Dict, building: Optional[Dict], from_building: Optional[Dict]) -> Dict:
+    """What a session remembers after a turn."""
+    state = {'query_type': query_data.get('query_type')}
+    if building:
+        state.update(building_id=building.get('id'), building_name=building.get('name'))
+    if from_building:
+        state.update(from_building_id=from_building.get('id'), from_building_name=from_building.get('name'))
+    return state
+
+
+def resolve_followup(query: str, state: Optional[Dict],
+                     named_building: Optional[Callable[[str], Optional[Dict[str, Any]]]] = None) -> Optional[Dict]:
+    """query_data for a follow-up that refers back to the session, or None.
+
+    Only questions that point at the previous turn are resolved: a pronoun
+    ("it", "there", "that building") with a remembered building, or
+    "what about X?" with a remembered query type. `named_building(text)`
+    returns the building a sentence names; a question naming one outside its
+    "from ..." part is left to extraction, unless the origin is the pronoun
+    ("how do I get to the gym from there?").
+    """
+    if not state:
+        return None
+    lowered = query.lower()
+
+    match = WHAT_ABOUT_RE.match(query)
+    if match and state.get('query_type') in ('hours', 'location', 'info', 'directions'):
+        resolved = {'location': match.group(1), 'query_type': state['query_type'], 'confidence': 0.9}
+        if state['query_type'] == 'directions':
+            if not state.get('from_building_name'):
+                return None
+            resolved['from_location'] = state['from_building_name']
+        return resolved
+
+    if not state.get('building_name') or not PRONOUN_RE.search(EXISTENTIAL_RE.sub(' ', query)):
+        return None
+    origin = FROM_RE.search(query)
+    from_pronoun = origin is not None and PRONOUN_RE.fullmatch(origin.group(1).strip()) is not None
+    # The origin can name a building ("get there from the library"); elsewhere a name means a new subject
+    named = named_building(PRONOUN_RE.sub(' ', query[:origin.start()] if origin else query)) \
+        if named_building else None
+    if named and not from_pronoun:
+        return None
+    resolved = {'location': state['building_name'], 'confidence': 0.9}
+    if origin or any(word in lowered for word in DIRECTIONS_WORDS):
+        if not origin:
+            return None
+        if from_pronoun:
+            if not named:
+                return None
+            resolved.update(location=named['name'], query_type='directions', from_location=state['building_name'])
+        else:
+            resolved.update(query_type='directions', from_location=origin.group(1))
+    elif any(word in lowered for word in HOURS_WORDS):
+        resolved['query_type'] = 'hours'
+    else:
+        resolved['query_type'] = 'location'
+    return resolved
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+class SessionStore:
+    """LRU of session states bounded by count, bytes and idle time."""
+
+    def __init__(self, max_sessions: int = 10000, ttl_s: float = 1800.0, max_bytes: int = 8_000_000,
+                 spill_path: Optional[str] = None, clock: Callable[[], float] = time.time):
+        self.max_sessions = max_sessions
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self.spill_path = spill_path
+        self.clock = clock
+        # session id -> (state, size in bytes, last used)
+        self._entries: 'OrderedDict[str, Tuple[Dict, int, float]]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+        self.spilled = 0
+        self.spill_hits = 0
+        # Opened on first use, so a server that forks workers never shares the connection
+        self._spill_conn: Optional[sqlite3.Connection] = None
+        metrics.register_collector('sessions', self.snapshot)
+
+    @classmethod
+    def from_env(cls) -> 'SessionStore':
+        return cls(
+            max_sessions=int(_env_number('CAMPUS_SESSION_MAX', 10000)),
+            ttl_s=_env_number('CAMPUS_SESSION_TTL_S', 1800.0),
+            max_bytes=int(_env_number('CAMPUS_SESSION_MAX_BYTES', 8_000_000)),
+            spill_path=os.environ.get('CAMPUS_SESSION_SPILL') or None,
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        """A copy of the session's state, or None if unknown or expired."""
+        if not session_id:
+            return None
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None and now - entry[2] > self.ttl_s:
+                self._remove(session_id)
+                self.expirations += 1
+                entry = None
+            if entry is None and self.spill_path:
+                state = self._unspill(session_id, now)
+                if state is not None:
+                    self.spill_hits += 1
+                    self._insert(session_id, state, now)
+                    return dict(state)
+                return None
+            if entry is None:
+                return None
+            self._entries[session_id] = (entry[0], entry[1], now)
+            self._entries.move_to_end(session_id)
+            return dict(entry[0])
+
+    def put(self, session_id: str, state: Dict):
+        if not session_id:
+            return
+        now = self.clock()
+        with self._lock:
+            self._insert(session_id, dict(state), now)
+
+    def _insert(self, session_id: str, state: Dict, now: float):
+        if session_id in self._entries:
+            self._remove(session_id)
+        size = len(session_id) + len(json.dumps(state, default=str))
+        self._entries[session_id] = (state, size, now)
+        self._bytes += size
+        self._expire(now)
+        while len(self._entries) > 1 and (len(self._entries) > self.max_sessions or self._bytes > self.max_bytes):
+            evicted_id, (evicted, _, last_used) = next(iter(self._entries.items()))
+            self._remove(evicted_id)
+            self.evictions += 1
+            if self.spill_path:
+                self._write_spill(evicted_id, evicted, last_used, now)
+
+    def _remove(self, session_id: str):
+        _, size, _ = self._entries.pop(session_id)
+        self._bytes -= size
+
+    def _expire(self, now: float):
+        # Entries are kept in last-used order, so expired ones are at the front
+        while self._entries:
+            session_id, (_, _, last_used) = next(iter(self._entries.items()))
+            if now - last_used <= self.ttl_s:
+                break
+            self._remove(session_id)
+            self.expirations += 1
+
+    def _spill(self) -> sqlite3.Connection:
+        if self._spill_conn is None:
+            conn = sqlite3.connect(self.spill_path, check_same_thread=False)
+            conn.execute('CREATE TABLE IF NOT EXISTS sessions '
+                         '(id TEXT PRIMARY KEY, state TEXT NOT NULL, updated_at REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions(updated_at)')
+            conn.commit()
+            self._spill_conn = conn
+        return self._spill_conn
+
+    def _write_spill(self, session_id: str, state: Dict, last_used: float, now: float):
+        conn = self._spill()
+        conn.execute('INSERT OR REPLACE INTO sessions (id, state, updated_at) VALUES (?, ?, ?)',
+                     (session_id, json.dumps(state, default=str), last_used))
+        conn.execute('DELETE FROM sessions WHERE updated_at < ?', (now - self.ttl_s,))
+        conn.commit()
+        self.spilled += 1
+
+    def _unspill(self, session_id: str, now: float) -> Optional[Dict]:
+        conn = self._spill()
+        row = conn.execute('SELECT state, updated_at FROM sessions WHERE id = ?', (session_id,)).fetchone()
+        if row is None:
+            return None
+        conn.execute('DELETE FROM sessions WHERE id = ?', (session_id,))
+        conn.commit()
+        if now - row[1] > self.ttl_s:
+            self.expirations += 1
+            return None
+        return json.loads(row[0])
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                'sessions': len(self._entries),
+                'bytes': self._bytes,
+                'max_sessions': self.max_sessions,
+                'max_bytes': self.max_bytes,
+                'ttl_s': self.ttl_s,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'spill_path': self.spill_path,
+                'spilled': self.spilled,
+                'spill_hits': self.spill_hits,
+            }
@@ -0,0 +1,192 @@
+"""
+Multi-stop tours: the quickest order to visit a set of buildings.
+
+plan_tour() takes building ids, an optional starting building and whether to
+walk back to the start. It computes the walking-minute matrix between the
+stops from the route graph's shortest paths, orders the stops, then stitches
+the legs' waypoints into one polyline.
+
+Ordering is exact (Held-Karp dynamic programming) for up to EXACT_MAX_STOPS
+stops. Larger sets use nearest-neighbour construction improved by 2-opt and
+or-opt moves until no move shortens the tour.
+"""
+
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from metrics import metrics
+from route_graph import RouteGraph
+
+EXACT_MAX_STOPS = 10
+MAX_TOUR_STOPS = 50
+
+INF = float('inf')
+
+
+class TourError(ValueError):
+    """The request can't be planned (unknown buildings, too many stops)."""
+
+
+class UnreachableError(TourError):
+    """Some stop can't be reached from the others over the route graph."""
+
+
+def _cost(order: Sequence[int], m: List[List[float]]) -> float:
+    return sum(m[a][b] for a, b in zip(order, order[1:]))
+
+
+def solve_exact(m: List[List[float]], round_trip: bool) -> List[int]:
+    """Optimal visiting order of matrix indexes, starting at 0 (Held-Karp, O(n^2 2^n))."""
+    n = len(m)
+    if n <= 2:
+        return list(range(n)) + ([0] if round_trip and n > 1 else [])
+    k = n - 1
+    full = (1 << k) - 1
+    # best[mask][j]: cheapest walk from 0 through the stops in mask, ending at stop j + 1
+    best = [[INF] * k for _ in range(1 << k)]
+    parent = [[-1] * k for _ in range(1 << k)]
+    for j in range(k):
+        best[1 << j][j] = m[0][j + 1]
+    for mask in range(1, full + 1):
+        row = best[mask]
+        for j in range(k):
+            cost = row[j]
+            if cost == INF or not mask & (1 << j):
+                continue
+            from_row = m[j + 1]
+            for nxt in range(k):
+                bit = 1 << nxt
+                if mask & bit:
+                    continue
+                candidate = cost + from_row[nxt + 1]
+                if candidate < best[mask | bit][nxt]:
+                    best[mask | bit][nxt] = candidate
+                    parent[mask | bit][nxt] = j
+    last_row = best[full]
+    end = min(range(k), key=lambda j: last_row[j] + (m[j + 1][0] if round_trip else 0))
+    order = []
+    mask, j = full, end
+    while j != -1:
+        order.append(j + 1)
+        mask, j = mask ^ (1 << j), parent[mask][j]
+    order.append(0)
+    order.reverse()
+    return order + ([0] if round_trip else [])
+
+
+def solve_heuristic(m: List[List[float]], round_trip: bool) -> List[int]:
+    """Nearest neighbour from 0, then 2-opt and or-opt until no move improves the tour."""
+    n = len(m)
+    unvisited = set(range(1, n))
+    order = [0]
+    while unvisited:
+        last = m[order[-1]]
+        nxt = min(unvisited, key=lambda j: last[j])
+        order.append(nxt)
+        unvisited.remove(nxt)
+    if round_trip:
+        order.append(0)
+
+    def d(a, b):
+        # Open tours have no edge after the last stop
+        return 0.0 if a is None or b is None else m[a][b]
+
+    # Stops at positions 1..last may move; position 0 (and a closing 0) stay put
+    last = len(order) - (2 if round_trip else 1)
+    improved = True
+    while improved:
+        improved = False
+        # 2-opt: reverse order[i..j]
+        for i in range(1, last):
+            for j in range(i + 1, last + 1):
+                a, b, c = order[i - 1], order[i], order[j]
+                e = order[j + 1] if j + 1 < len(order) else None
+                delta = d(a, c) + d(b, e) - d(a, b) - d(c, e)
+                if delta < -1e-9:
+                    order[i:j + 1] = reversed(order[i:j + 1])
+                    improved = True
+        # or-opt: move a run of 1-3 stops (either way round) elsewhere
+        for length in (1, 2, 3):
+            i = 1
+            while i + length - 1 <= last:
+                segment = order[i:i + length]
+                before = order[i - 1]
+                after = order[i + length] if i + length < len(order) else None
+                gain = d(before, segment[0]) + d(segment[-1], after) - d(before, after)
+                rest = order[:i] + order[i + length:]
+                best_delta, best_at, best_segment = -1e-9, None, None
+                # Insert between rest[p - 1] and rest[p]
+                for p in range(1, len(rest) + (0 if round_trip else 1)):
+                    x = rest[p - 1]
+                    y = rest[p] if p < len(rest) else None
+                    for seg in (segment, segment[::-1]):
+                        delta = d(x, seg[0]) + d(seg[-1], y) - d(x, y) - gain
+                        if delta < best_delta:
+                            best_delta, best_at, best_segment = delta, p, seg
+                if best_at is not None:
+                    order[:] = rest[:best_at] + best_segment + rest[best_at:]
+                    improved = True
+                i += 1
+    return order
+
+
+def plan_tour(graph: RouteGraph, stop_ids: Sequence[int], start_id: Optional[int] = None,
+              round_trip: bool = False) -> Dict:
+    """Visiting order, legs, total walk and stitched waypoints for a set of buildings."""
+    started = time.perf_counter()
+    catalog = graph.catalog
+    stops: List[int] = []
+    for building_id in ([start_id] if start_id is not None else []) + list(stop_ids):
+        if building_id not in stops:
+            stops.append(building_id)
+    unknown = [b for b in stops if catalog.building(b) is None]
+    if unknown:
+        raise TourError(f"Unknown building ids: {unknown}")
+    if len(stops) < 2:
+        raise TourError("A tour needs at least two different buildings")
+    if len(stops) > MAX_TOUR_STOPS:
+        raise TourError(f"A tour can have at most {MAX_TOUR_STOPS} stops")
+
+    m = graph.matrix(stops)
+    unreachable = [stops[j] for j in range(1, len(stops)) if m[0][j] == INF]
+    if unreachable:
+        raise UnreachableError(f"No route connects building {stops[0]} to {unreachable}")
+
+    exact = len(stops) <= EXACT_MAX_STOPS
+    order = solve_exact(m, round_trip) if exact else solve_heuristic(m, round_trip)
+
+    legs: List[Dict] = []
+    edges: List[Tuple] = []
+    elapsed = 0.0
+    distance = 0
+    visits = [{'building_id': stops[0], 'name': catalog.building(stops[0]).name, 'arrival_minutes': 0.0}]
+    for a, b in zip(order, order[1:]):
+        path = graph.path(stops[a], stops[b])
+        leg_distance = sum(route.distance_meters or 0 for _, _, route in path)
+        elapsed += m[a][b]
+        distance += leg_distance
+        edges.extend(path)
+        legs.append({
+            'from_id': stops[a],
+            'to_id': stops[b],
+            'walk_time_minutes': round(m[a][b], 2),
+            'distance_meters': leg_distance,
+            'via': [to for _, to, _ in path[:-1]],
+            'route_ids': [route.id for _, _, route in path],
+        })
+        visits.append({'building_id': stops[b], 'name': catalog.building(stops[b]).name,
+                       'arrival_minutes': round(elapsed, 2)})
+
+    solve_ms = (time.perf_counter() - started) * 1000
+    metrics.observe('tour.solve_ms', solve_ms)
+    return {
+        'order': [stops[i] for i in order],
+        'stops': visits,
+        'legs': legs,
+        'round_trip': round_trip,
+        'total_walk_time_minutes': round(elapsed, 2),
+        'total_distance_meters': distance,
+        'waypoints': graph.stitch(edges),
+        'method': 'exact' if exact else 'heuristic',
+        'solve_ms': round(solve_ms, 2),
+    }